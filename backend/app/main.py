@@ -8,6 +8,9 @@ from dotenv import load_dotenv
 import pathlib
 from fastapi import APIRouter, Depends
 from app.services.database_service import DatabaseService
+from app.services.forecast_executor import start_forecast_executor, shutdown_forecast_executor
+from app.services.job_service import start_job_runner, shutdown_job_runner
+from app.services.model_cache_service import model_cache
 
 from datetime import datetime, timedelta
 
@@ -65,10 +68,14 @@ print("✅ Forecast router loaded")
 # ========== STARTUP/SHUTDOWN ==========
 @app.on_event("startup")
 async def startup():
+    start_forecast_executor()
+    start_job_runner(forecast_routes.run_forecast_job)
     logger.info("✅ ForecastAI Pro API Started")
 
 @app.on_event("shutdown")
 async def shutdown():
+    shutdown_job_runner()
+    shutdown_forecast_executor()
     mongo_client.close()
     logger.info("✅ MongoDB connection closed")
 
@@ -101,7 +108,8 @@ async def system_health():
         "database": {
             "health": db_health,
             "stats": db_stats
-        }
+        },
+        "model_cache": model_cache.stats()
     }
 
 @admin_router.get("/user-activity/{user_id}")
@@ -0,0 +1,226 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.inventory_service import round_half_even
+
+# ============================================================================
+# PRIORITY ACTIONS - table-driven rules over the inventory recommendations
+# Every rule is one row of ACTION_RULES; the first rule whose condition holds
+# decides an item's priority, action, urgency, reason, check frequency and
+# deadline. Conditions are evaluated column-wise (np.select) for the whole
+# inventory at once; reasons and action dicts are formatted only for the
+# items actually returned. New rules are new table rows, not new branches.
+# ============================================================================
+
+PRIORITY_HIGH = "🔴 HIGH"
+PRIORITY_MEDIUM = "🟠 MEDIUM"
+PRIORITY_LOW = "🟢 LOW"
+PRIORITY_ORDER = {PRIORITY_HIGH: 0, PRIORITY_MEDIUM: 1, PRIORITY_LOW: 2}
+
+DATA_SOURCE_ACTUAL = "ACTUAL"         # current stock known: rules on stock percentage
+DATA_SOURCE_ESTIMATE = "ESTIMATE"     # no usable stock data: rules on demand only
+ACTION_CONFIDENCE = 85                # default confidence (frontend can override)
+
+# Columns a condition can use: actual (bool), stock_pct, daily_sales (per day).
+# Reason templates format: stock_pct, current_stock, daily_sales.
+# (condition, priority, action, urgency, reason, check frequency, deadline days)
+ACTION_RULES = (
+    # Current stock known
+    (lambda c: c["actual"] & (c["stock_pct"] <= 20),
+     PRIORITY_HIGH, "🚨 URGENT: Restock Immediately", 100,
+     "CRITICAL: Only {stock_pct:.1f}% stock remaining ({current_stock:.0f} units)", "Daily", 1),
+    (lambda c: c["actual"] & (c["stock_pct"] <= 33) & (c["daily_sales"] >= 5),
+     PRIORITY_HIGH, "⚠️ High Priority: Plan Restock", 85,
+     "Low stock ({stock_pct:.1f}%) + High demand ({daily_sales:.1f}/day)", "2-3x Weekly", 2),
+    (lambda c: c["actual"] & (c["stock_pct"] <= 33),
+     PRIORITY_MEDIUM, "📋 Medium: Schedule Restock", 60,
+     "Low stock ({stock_pct:.1f}%) but stable demand ({daily_sales:.1f}/day)", "Weekly", 5),
+    (lambda c: c["actual"] & (c["stock_pct"] <= 60) & (c["daily_sales"] >= 10),
+     PRIORITY_MEDIUM, "📅 Plan Restock Cycle", 50,
+     "Adequate stock ({stock_pct:.1f}%) but HIGH velocity ({daily_sales:.1f}/day)", "Weekly", 7),
+    (lambda c: c["actual"] & (c["stock_pct"] > 75) & (c["daily_sales"] >= 15),
+     PRIORITY_MEDIUM, "📋 Plan for Frequent Restocks", 45,
+     "Good stock ({stock_pct:.1f}%) but VERY HIGH velocity ({daily_sales:.1f}/day)", "2-3x Weekly", 10),
+    (lambda c: c["actual"],
+     PRIORITY_LOW, "👁️ Monitor Stock (Stable but High Value)", 20,
+     "Healthy stock ({stock_pct:.1f}%) with stable demand ({daily_sales:.1f}/day)", "Bi-weekly", 14),
+    # Estimate only
+    (lambda c: c["daily_sales"] >= 15,
+     PRIORITY_HIGH, "🔴 HIGH DEMAND ITEM", 90,
+     "High demand ({daily_sales:.1f}/day) - no current stock data", "Daily", 1),
+    (lambda c: c["daily_sales"] >= 8,
+     PRIORITY_MEDIUM, "📋 Medium-Priority Item", 55,
+     "Moderate-high demand ({daily_sales:.1f}/day)", "Weekly", 7),
+    (lambda c: np.ones(len(c["actual"]), dtype=bool),
+     PRIORITY_LOW, "👁️ Monitor (Stable but High Value)", 25,
+     "Low demand ({daily_sales:.1f}/day)", "Bi-weekly", 14),
+)
+
+# Stock percentage <= : status (above the last one: Healthy)
+STOCK_STATUS_PCT = ((25, "Critical"), (50, "Low"), (75, "Adequate"))
+
+
+def _column(inventory: list, key: str, default=None, fallback: str = None) -> list:
+    """
+    item.get(key) per item. Items missing a key other items have give None;
+    when no item has it, the fallback key's column or the default is used.
+    """
+    if any(key in item for item in inventory):
+        return [item.get(key) for item in inventory]
+    if fallback is not None:
+        return _column(inventory, fallback, default)
+    return [default] * len(inventory)
+
+
+def _numbers(values: list, default: Optional[float]) -> np.ndarray:
+    """safe_number per value: NaN / inf / None / non-numeric -> default (NaN for None)."""
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=float)
+    return np.where(np.isfinite(numbers), numbers, np.nan if default is None else default)
+
+
+def evaluate_rules(columns: dict) -> np.ndarray:
+    """Index into ACTION_RULES of the first rule matching each item."""
+    with np.errstate(invalid="ignore"):
+        conditions = [condition(columns) for condition, *_ in ACTION_RULES]
+    return np.select(conditions, np.arange(len(ACTION_RULES)), default=len(ACTION_RULES) - 1)
+
+
+def priority_actions(inventory: list, skus: Optional[set] = None) -> list:
+    """
+    Action dicts for the inventory recommendations, HIGH priority first,
+    then by urgency and daily revenue at risk. skus: only these SKUs are
+    returned (and formatted).
+    """
+    sku_list = [str(item.get("sku", f"Unknown_{i}")) for i, item in enumerate(inventory)]
+    has_current_stock = np.array([bool(item.get("has_current_stock", False)) for item in inventory], dtype=bool)
+    current_stock = _numbers(_column(inventory, "current_stock"), None)
+    recommended_7 = _numbers(_column(inventory, "recommended_stock_7_days", 0), 0)
+    recommended_15 = _numbers(_column(inventory, "recommended_stock_15_days", 100, "recommended_stock"), 100)
+    daily_sales = _numbers(_column(inventory, "daily_sales_avg", 0), 0)
+    daily_sales_std = _numbers(_column(inventory, "daily_sales_std", 0), 0)
+    unit_cost = _numbers(_column(inventory, "unit_cost", 100), 100)
+    unit_price = _numbers(_column(inventory, "unit_price", 150), 150)
+    safety_stock = _numbers(_column(inventory, "safety_stock", 10), 10)
+    lead_time_days = _numbers(_column(inventory, "lead_time_days", 3), 3)
+    investment = np.trunc(_numbers(_column(inventory, "investment_required", 0), 0))
+    expected_profit = np.trunc(_numbers(_column(inventory, "expected_profit", 0), 0))
+    expected_revenue = np.trunc(_numbers(_column(inventory, "expected_revenue", 0), 0))
+    roi = _numbers(_column(inventory, "roi_percent", 0, "expected_roi"), 0)
+    profit_margin = _numbers(_column(inventory, "profit_margin_percent", 0), 0)
+
+    # Stock position (only with a current stock figure)
+    with_stock = has_current_stock & ~np.isnan(current_stock)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_remaining = np.where(with_stock & (daily_sales > 0), current_stock / daily_sales, np.nan)
+        stock_pct = np.where(with_stock & (recommended_15 > 0), current_stock / recommended_15 * 100, np.nan)
+    shortage = np.where(np.isnan(stock_pct), np.nan, np.maximum(0, recommended_15 - current_stock))
+    # Stock rules need both the days remaining and the stock percentage
+    actual = ~np.isnan(days_remaining) & ~np.isnan(stock_pct)
+
+    rule = evaluate_rules({"actual": actual, "stock_pct": stock_pct, "daily_sales": daily_sales})
+    priority_rank = np.array([PRIORITY_ORDER.get(r[1], 99) for r in ACTION_RULES])[rule]
+    urgency = np.array([r[3] for r in ACTION_RULES])[rule]
+
+    profit_margin = np.where((profit_margin == 0) & (unit_price > 0), (unit_price - unit_cost) / unit_price * 100, profit_margin)
+    daily_revenue_at_risk = round_half_even(daily_sales * unit_price, 2)
+
+    with np.errstate(invalid="ignore"):
+        reorder_in = np.where(
+            actual & (days_remaining > 0),
+            np.maximum(1, np.trunc(days_remaining - safety_stock / np.where(daily_sales > 0, daily_sales, 1))),
+            np.nan,
+        )
+
+    # Sort the whole inventory, then format only the returned rows
+    order = np.lexsort((-np.array(daily_revenue_at_risk), -urgency, priority_rank))
+    if skus is not None:
+        order = order[np.array([sku_list[i] in skus for i in order.tolist()], dtype=bool)]
+
+    now = datetime.now()
+    deadlines = {}
+    actions = []
+    for i in order.tolist():
+        _, priority, action, urgency_score, reason, check_frequency, deadline = ACTION_RULES[rule[i]]
+        if deadline not in deadlines:
+            deadlines[deadline] = (now + timedelta(days=deadline)).isoformat()
+
+        item = inventory[i]
+        item_name = item.get("item_name") or item.get("itemname", "Unknown")
+        stock = None if np.isnan(current_stock[i]) else float(current_stock[i])
+        pct = None if np.isnan(stock_pct[i]) else float(stock_pct[i])
+        remaining = None if np.isnan(days_remaining[i]) else float(days_remaining[i])
+        avg = float(daily_sales[i])
+        reason = reason.format(stock_pct=pct, current_stock=stock, daily_sales=avg)
+        shortage_units = 0.0 if np.isnan(shortage[i]) else round(float(shortage[i]), 1)
+        stock_status = None
+        if pct is not None:
+            stock_status = next((status for limit, status in STOCK_STATUS_PCT if pct <= limit), "Healthy")
+        item_roi = round(float(roi[i]), 1)
+        source = DATA_SOURCE_ACTUAL if actual[i] else DATA_SOURCE_ESTIMATE
+
+        actions.append({
+            # Priority and action info
+            "priority": priority,
+            "action": action,
+            "urgency_score": urgency_score,
+            "reason": reason,
+            "check_frequency": check_frequency,
+            "action_deadline": deadlines[deadline],
+            "timeline": (
+                f"Reorder within {int(reorder_in[i])} days" if not np.isnan(reorder_in[i])
+                else "Based on forecasted demand only"
+            ),
+            "lead_time_days": int(lead_time_days[i]),
+            "safety_stock": round(float(safety_stock[i]), 1),
+
+            # Item identification
+            "sku": sku_list[i],
+            "item_name": item_name,
+            "itemname": item_name,
+
+            # Stock data
+            "has_current_stock": bool(has_current_stock[i]),
+            "current_stock": round(stock, 1) if stock is not None else None,
+            "recommended_stock_7_days": round(float(recommended_7[i]), 1),
+            "recommended_stock_15_days": round(float(recommended_15[i]), 1),
+            "recommended_stock": round(float(recommended_15[i]), 1),
+            "shortage": shortage_units,
+            "stock_percentage": round(pct, 1) if pct is not None else None,
+            "stock_status": stock_status,
+            "days_remaining": round(remaining, 1) if remaining is not None else None,
+
+            # Demand data (the frontend reads daily_sales)
+            "daily_sales": round(avg, 2),
+            "daily_sales_avg": round(avg, 2),
+            "daily_sales_std": round(float(daily_sales_std[i]), 2),
+            "daily_revenue_at_risk": daily_revenue_at_risk[i],
+            "demand_classification": item.get("demand_classification", "MEDIUM"),
+            "volatility_classification": item.get("volatility_classification", "STABLE"),
+
+            # Financial data (both field spellings the frontend uses)
+            "unit_cost": round(float(unit_cost[i]), 2),
+            "unit_price": round(float(unit_price[i]), 2),
+            "profit_margin_percent": round(float(profit_margin[i]), 1),
+            "investmentrequired": int(investment[i]),
+            "investment_required": int(investment[i]),
+            "expected_revenue": int(expected_revenue[i]),
+            "estimatedrevenueloss": max(0, int(expected_revenue[i]) - int(expected_profit[i])),
+            "expected_profit": int(expected_profit[i]),
+            "expectedroi": item_roi,
+            "expected_roi": item_roi,
+
+            # Data source and confidence
+            "datasource": "Actual current stock" if source == DATA_SOURCE_ACTUAL else "Forecast-based estimate",
+            "data_source": source,
+            "confidence": ACTION_CONFIDENCE,
+
+            # Additional fields the frontend may use
+            "recommendedaction": action,
+            "description": reason,
+            "forecasteddemand": round(avg * 7, 1),
+        })
+
+    return actions
@@ -0,0 +1,718 @@
+import logging
+import os
+import warnings
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.services.demand_matrix_service import SkuDayDemand
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# BATCHED FORECASTS - short-history and intermittent SKUs
+# The forecast SKUs' rows of the upload's SkuDayDemand are densified into one
+# SKU x day matrix; tiers, Holt linear and Croston / SBA / TSB are computed
+# for every row at once.
+# A backtest tournament of cheap models picks each SKU's model; only SKUs
+# no cheap model forecasts well enough go to Prophet, one by one.
+# ============================================================================
+
+MIN_FORECAST_RECORDS = 5          # fewer records: no forecast
+SHORT_HISTORY_RECORDS = 15        # fewer records: Holt linear on observed days
+HISTORY_MAX_DAYS = 180            # Prophet / intermittent use the last 180 selling days
+SPARSE_ZERO_PCT = 50              # > this % zero days in the window ...
+SPARSE_MAX_CV = 1.5               # ... or non-zero demand CV above this: intermittent
+
+TIER_SKIP = "skip"
+TIER_HOLT = "holt"
+TIER_INTERMITTENT = "intermittent"
+TIER_PROPHET = "prophet"
+
+# Holt linear: (alpha, beta) grid, best in-sample one-step SSE per SKU
+HOLT_ALPHAS = (0.1, 0.2, 0.3, 0.5, 0.7, 0.9)
+HOLT_BETAS = (0.01, 0.1, 0.3)
+
+CROSTON_ALPHA = 0.1               # smoothing of demand size and interval (Croston / SBA)
+TSB_ALPHA = 0.1                   # TSB demand size smoothing
+TSB_BETA = 0.1                    # TSB demand probability smoothing
+INTERMITTENT_METHOD = "sba"       # croston | sba | tsb, when no backtest is possible
+
+INTERMITTENT_MODEL_LABELS = {
+    "croston": "Croston (Intermittent Demand)",
+    "sba": "Croston-SBA (Intermittent Demand)",
+    "tsb": "TSB (Intermittent Demand)",
+}
+
+# Model tournament: rolling-origin backtest of cheap models per SKU
+BACKTEST_FOLDS = 3                # origins per SKU, each followed by a test span
+BACKTEST_MAX_HORIZON = 14         # test span cap (days)
+BACKTEST_MIN_TRAIN = 14           # regular SKUs: days before the first origin
+SHORT_HISTORY_MIN_TRAIN = 2       # short-history SKUs: observed days before the first origin
+SEASON_DAYS = 7                   # seasonal naive repeats the same weekday
+MOVING_AVERAGE_WINDOWS = {"moving_average_7": 7, "moving_average_28": 28}
+WEEKDAY_AVERAGE_WEEKS = 4         # weekday average: same weekday over the last 4 weeks
+# Regular SKUs go to Prophet only when the best cheap model's backtest
+# error (WAPE: sum |error| / sum demand; 1.0 = no better than forecasting
+# zero) is above this (env var, or per plan as
+# PLAN_LIMITS["prophet_escalation_error"]). 0.65 is the knee on the bundled
+# POS sample: a third fewer Prophet fits for ~1% more holdout MAE; above it
+# accuracy drops faster. Steady trending SKUs backtest well on cheap models
+# yet still gain from Prophet, so lower it where those dominate. 0 sends
+# every regular SKU to Prophet without a Prophet backtest. Re-check on your
+# data with scripts/benchmark_escalation_threshold.py.
+PROPHET_ESCALATION_ERROR = float(os.getenv("PROPHET_ESCALATION_ERROR", "0.65"))
+
+REGULAR_CANDIDATES = ("naive", "seasonal_naive", "weekday_average", "moving_average_7", "moving_average_28", "holt", "tsb")
+SHORT_HISTORY_CANDIDATES = ("naive", "moving_average_7", "holt")
+INTERMITTENT_CANDIDATES = ("croston", "sba", "tsb")
+
+CHEAP_MODEL_LABELS = {
+    "naive": "Naive (Last Value)",
+    "seasonal_naive": "Seasonal Naive (Same Weekday)",
+    "weekday_average": "Weekday Average (4 Weeks)",
+    "moving_average_7": "Moving Average (7 Days)",
+    "moving_average_28": "Moving Average (28 Days)",
+    "holt": "Holt Linear Trend",
+    **INTERMITTENT_MODEL_LABELS,
+    "tsb": "Exponential Smoothing (TSB)",   # on regular demand TSB is a smoothed level
+}
+SHORT_HISTORY_MODEL_LABELS = {
+    "naive": "Naive (Short History)",
+    "moving_average_7": "Moving Average (Short History)",
+    "holt": "Exponential Smoothing (Short History)",
+}
+
+
+class DemandMatrix:
+    """
+    Daily demand of the requested SKUs on one date grid.
+
+    - values: float (n_skus, n_days), summed quantity per day, 0 where absent
+    - present: bool (n_skus, n_days), the SKU has rows on that day
+    - records: raw line count per SKU (line_count aware)
+    - window_start / last_day: column range of the last HISTORY_MAX_DAYS
+      selling days (the zero-filled history Prophet and Croston see)
+    Rows follow the order of the requested skus; unknown SKUs stay empty.
+    """
+
+    def __init__(self, skus, start_date, values, present, records):
+        self.skus = list(skus)
+        self.start_date = start_date
+        self.values = values
+        self.present = present
+        self.records = records
+
+        n_days = values.shape[1]
+        observed_from_end = np.cumsum(present[:, ::-1], axis=1)[:, ::-1]
+        in_window = present & (observed_from_end <= HISTORY_MAX_DAYS)
+
+        self.has_data = present.any(axis=1)
+        self.window_start = np.where(self.has_data, in_window.argmax(axis=1), 0)
+        self.last_day = np.where(self.has_data, n_days - 1 - present[:, ::-1].argmax(axis=1), -1)
+
+    @property
+    def window_days(self) -> np.ndarray:
+        return np.maximum(self.last_day - self.window_start + 1, 0)
+
+    def window_mask(self, rows: np.ndarray = None) -> np.ndarray:
+        rows = np.arange(len(self.skus)) if rows is None else rows
+        columns = np.arange(self.values.shape[1])
+        return (
+            (columns >= self.window_start[rows, None])
+            & (columns <= self.last_day[rows, None])
+        )
+
+    def window_series(self, rows: np.ndarray) -> tuple:
+        """Zero-filled window of each row, left-aligned: (series, lengths)."""
+        return _left_align(self.values[rows], self.window_mask(rows))
+
+    def window_weekdays(self, rows: np.ndarray) -> np.ndarray:
+        """Weekday (Monday=0) of the first window day of each row."""
+        first_days = (self.start_date - np.datetime64("1970-01-01", "D")).astype(np.int64) + self.window_start[rows]
+        return (first_days + 3) % 7   # 1970-01-01 was a Thursday
+
+    def daily_series(self, row: int) -> pd.DataFrame:
+        """Zero-filled (ds, y) history of one SKU, as Prophet expects it."""
+        start, end = self.window_start[row], self.last_day[row]
+        return pd.DataFrame({
+            "ds": pd.date_range(self.start_date + np.timedelta64(int(start), "D"), periods=end - start + 1, freq="D"),
+            "y": self.values[row, start:end + 1],
+        })
+
+
+def demand_matrix(demand: SkuDayDemand, rows: np.ndarray) -> DemandMatrix:
+    """Dense DemandMatrix of the given SkuDayDemand rows (in that order)."""
+    rows = np.asarray(rows, dtype=np.int64)
+    values, present = demand.dense(rows)
+    return DemandMatrix(
+        [demand.skus[row] for row in rows], demand.start_date, values, present, demand.records[rows]
+    )
+
+
+def classify_demand(matrix: DemandMatrix) -> np.ndarray:
+    """Forecast tier per SKU (TIER_* strings), same rules as the per-SKU path."""
+    window = matrix.window_mask()
+    window_days = np.maximum(matrix.window_days, 1)
+
+    zero_days = (window & (matrix.values == 0)).sum(axis=1)
+    pct_zero = zero_days / window_days * 100
+
+    non_zero = window & (matrix.values > 0)
+    non_zero_count = non_zero.sum(axis=1)
+    demand = np.where(non_zero, matrix.values, 0.0)
+    mean = demand.sum(axis=1) / np.maximum(non_zero_count, 1)
+    variance = (np.where(non_zero, matrix.values - mean[:, None], 0.0) ** 2).sum(axis=1) / np.maximum(non_zero_count, 1)
+    cv = np.where(mean > 0, np.sqrt(variance) / np.where(mean > 0, mean, 1), 0.0)
+
+    sparse = (pct_zero > SPARSE_ZERO_PCT) | (cv > SPARSE_MAX_CV)
+
+    return np.select(
+        [
+            matrix.records < MIN_FORECAST_RECORDS,
+            matrix.records < SHORT_HISTORY_RECORDS,
+            sparse,
+        ],
+        [TIER_SKIP, TIER_HOLT, TIER_INTERMITTENT],
+        default=TIER_PROPHET,
+    )
+
+
+# ============================================================================
+# VECTORIZED MODELS - one row per SKU, rows left-aligned, `lengths` valid
+# ============================================================================
+
+
+def _left_align(values: np.ndarray, mask: np.ndarray) -> tuple:
+    """Pack the masked cells of each row to the left: (matrix, lengths)."""
+    lengths = mask.sum(axis=1)
+    width = max(int(lengths.max()) if len(lengths) else 0, 1)
+    packed = np.zeros((values.shape[0], width))
+    rows, columns = np.nonzero(mask)   # row-major: each row's cells in order
+    row_offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    packed[rows, np.arange(len(rows)) - row_offsets[rows]] = values[rows, columns]
+    return packed, lengths
+
+
+def holt_linear_batch(series: np.ndarray, lengths: np.ndarray, horizon: int,
+                      alphas: Sequence[float] = HOLT_ALPHAS,
+                      betas: Sequence[float] = HOLT_BETAS) -> np.ndarray:
+    """
+    Holt's linear trend for every row, (alpha, beta) picked per row from the
+    grid by one-step-ahead SSE. Rows need >= 2 points. Returns (n, horizon).
+    """
+    grid_alpha, grid_beta = (g.reshape(-1, 1) for g in np.meshgrid(alphas, betas, indexing="ij"))
+
+    # Initial trend: average slope over the series (y1 - y0 alone is too noisy)
+    last = series[np.arange(len(series)), lengths - 1]
+    slope = (last - series[:, 0]) / np.maximum(lengths - 1, 1)
+    level = np.broadcast_to(series[:, 0], (len(grid_alpha), len(series))).copy()
+    trend = np.broadcast_to(slope, level.shape).copy()
+    sse = np.zeros_like(level)
+
+    for t in range(1, series.shape[1]):
+        active = t < lengths
+        y = series[:, t]
+        predicted = level + trend
+        sse += np.where(active, (y - predicted) ** 2, 0.0)
+
+        new_level = grid_alpha * y + (1 - grid_alpha) * predicted
+        new_trend = grid_beta * (new_level - level) + (1 - grid_beta) * trend
+        level = np.where(active, new_level, level)
+        trend = np.where(active, new_trend, trend)
+
+    best = sse.argmin(axis=0)
+    rows = np.arange(len(series))
+    steps = np.arange(1, horizon + 1)
+    return level[best, rows][:, None] + trend[best, rows][:, None] * steps
+
+
+def intermittent_batch(series: np.ndarray, lengths: np.ndarray,
+                       alpha: float = CROSTON_ALPHA,
+                       tsb_alpha: float = TSB_ALPHA,
+                       tsb_beta: float = TSB_BETA) -> dict:
+    """
+    Croston, SBA and TSB per-day demand rates for every row of zero-filled
+    daily series. Returns {"croston", "sba", "tsb"} -> (n,) arrays.
+    """
+    n = len(series)
+    size = np.zeros(n)            # smoothed demand size (Croston / SBA)
+    interval = np.ones(n)         # smoothed inter-demand interval
+    since_demand = np.zeros(n)
+    started = np.zeros(n, dtype=bool)
+    tsb_size = np.zeros(n)
+    tsb_prob = np.zeros(n)
+
+    for t in range(series.shape[1]):
+        active = t < lengths
+        y = series[:, t]
+        demand = active & (y > 0)
+        since_demand += active
+
+        first = demand & ~started
+        update = demand & started
+
+        size = np.where(first, y, np.where(update, size + alpha * (y - size), size))
+        interval = np.where(first, since_demand, np.where(update, interval + alpha * (since_demand - interval), interval))
+
+        tsb_size = np.where(first, y, np.where(update, tsb_size + tsb_alpha * (y - tsb_size), tsb_size))
+        tsb_prob = np.where(
+            first, 1.0 / np.maximum(since_demand, 1),
+            np.where(active & started, tsb_prob + tsb_beta * (demand - tsb_prob), tsb_prob),
+        )
+
+        started |= demand
+        since_demand = np.where(demand, 0, since_demand)
+
+    croston = np.where(started, size / np.maximum(interval, 1e-9), 0.0)
+    return {
+        "croston": croston,
+        "sba": croston * (1 - alpha / 2),
+        "tsb": np.where(started, tsb_prob * tsb_size, 0.0),
+    }
+
+
+# ============================================================================
+# MODEL TOURNAMENT - rolling-origin backtest of cheap models
+# Each SKU is cut at BACKTEST_FOLDS origins near its end; every candidate is
+# fit on the days before an origin and scored on the span after it. Folds
+# are stacked as extra rows, so each candidate runs once per tier. The SKU
+# gets the candidate with the lowest WAPE; its error is the reported accuracy.
+# ============================================================================
+
+
+def cheap_forecasts(series: np.ndarray, lengths: np.ndarray, horizon: int,
+                    models: Sequence[str]) -> dict:
+    """
+    Forecasts of each cheap model from the first `lengths` values of every
+    row: {model: (n, horizon)}, clipped at 0. NaN where a model cannot
+    forecast a row (seasonal naive needs a full week).
+    """
+    n = len(series)
+    rows = np.arange(n)
+    steps = np.arange(horizon)
+    lengths = np.maximum(lengths, 1)
+    cumulative = np.concatenate([np.zeros((n, 1)), np.cumsum(series, axis=1)], axis=1)
+    intermittent = None
+
+    forecasts = {}
+    for model in models:
+        if model == "naive":
+            predicted = np.repeat(series[rows, lengths - 1][:, None], horizon, axis=1)
+        elif model == "seasonal_naive":
+            at = lengths[:, None] - SEASON_DAYS + steps % SEASON_DAYS
+            predicted = np.where(lengths[:, None] >= SEASON_DAYS, series[rows[:, None], np.maximum(at, 0)], np.nan)
+        elif model == "weekday_average":
+            weeks = np.minimum(lengths // SEASON_DAYS, WEEKDAY_AVERAGE_WEEKS)
+            base = lengths[:, None] - SEASON_DAYS + steps % SEASON_DAYS
+            total = np.zeros((n, horizon))
+            for week in range(WEEKDAY_AVERAGE_WEEKS):
+                at = base - week * SEASON_DAYS
+                total += np.where(week < weeks[:, None], series[rows[:, None], np.maximum(at, 0)], 0.0)
+            predicted = np.where(weeks[:, None] > 0, total / np.maximum(weeks, 1)[:, None], np.nan)
+        elif model in MOVING_AVERAGE_WINDOWS:
+            start = np.maximum(lengths - MOVING_AVERAGE_WINDOWS[model], 0)
+            mean = (cumulative[rows, lengths] - cumulative[rows, start]) / (lengths - start)
+            predicted = np.repeat(mean[:, None], horizon, axis=1)
+        elif model == "holt":
+            predicted = holt_linear_batch(series, lengths, horizon)
+        elif model in INTERMITTENT_MODEL_LABELS:
+            intermittent = intermittent or intermittent_batch(series, lengths)
+            predicted = np.repeat(intermittent[model][:, None], horizon, axis=1)
+        else:
+            raise ValueError(f"Unknown cheap model: {model}")
+        forecasts[model] = np.maximum(predicted, 0)
+    return forecasts
+
+
+def select_models(series: np.ndarray, lengths: np.ndarray, forecast_days: int,
+                  candidates: Sequence[str], default: str = None,
+                  min_train: int = BACKTEST_MIN_TRAIN) -> dict:
+    """
+    Backtest `candidates` on every row and forecast with each row's winner.
+
+    Returns:
+        model: (n,) chosen model names (`default`, else the first candidate,
+            where no fold fits)
+        error: (n,) WAPE of the chosen model, NaN without a backtest
+        mae: (n,) mean absolute daily error of the chosen model
+        spread: (n,) 75th percentile absolute daily error (interval half-width)
+        errors: {candidate: (n,) WAPE}
+        validated_days: (n,) test days scored per candidate
+        forecast: (n, forecast_days) forecast of the chosen model
+    """
+    n = len(series)
+    horizon = min(forecast_days, BACKTEST_MAX_HORIZON)
+    span = np.clip((lengths - min_train) // BACKTEST_FOLDS, 1, horizon)
+
+    # Fold f cuts each row at lengths - f * span; stacked fold-major
+    folds = np.arange(1, BACKTEST_FOLDS + 1)[:, None]
+    origins = lengths[None, :] - folds * span[None, :]
+    valid = origins >= min_train
+    in_test = valid[:, :, None] & (np.arange(horizon) < span[None, :, None])
+
+    stacked = np.tile(series, (BACKTEST_FOLDS, 1))
+    predicted = cheap_forecasts(stacked, np.maximum(origins, 1).ravel(), horizon, candidates)
+    test_columns = np.minimum(np.maximum(origins, 0)[:, :, None] + np.arange(horizon), series.shape[1] - 1)
+    actual = np.where(in_test, series[np.arange(n)[None, :, None], test_columns], 0.0)
+
+    validated_days = in_test.sum(axis=(0, 2))
+    demand = np.maximum(actual.sum(axis=(0, 2)), 1.0)
+    tested = validated_days > 0
+
+    errors, abs_errors = {}, {}
+    for model in candidates:
+        forecast = predicted[model].reshape(BACKTEST_FOLDS, n, horizon)
+        abs_error = np.where(in_test, np.abs(forecast - actual), 0.0)
+        unavailable = (in_test & np.isnan(forecast)).any(axis=(0, 2))
+        errors[model] = np.where(tested & ~unavailable, np.nansum(abs_error, axis=(0, 2)) / demand, np.nan)
+        abs_errors[model] = np.where(in_test, abs_error, np.nan)
+
+    # Lowest error wins; ties go to the earlier (simpler) candidate
+    error_table = np.vstack([np.where(np.isnan(errors[m]), np.inf, errors[m]) for m in candidates])
+    best = error_table.argmin(axis=0)
+    no_backtest = ~np.isfinite(error_table.min(axis=0))
+    best[no_backtest] = list(candidates).index(default) if default else 0
+
+    rows = np.arange(n)
+    chosen_abs = np.stack([abs_errors[m] for m in candidates])[best, :, rows]   # (n, folds, horizon)
+    chosen_abs = chosen_abs.reshape(n, -1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # rows without a backtest
+        mae = np.nanmean(chosen_abs, axis=1)
+        spread = np.nanquantile(chosen_abs, 0.75, axis=1)
+
+    final = cheap_forecasts(series, lengths, forecast_days, candidates)
+    final_table = np.stack([final[m] for m in candidates])
+    forecast = np.nan_to_num(final_table[best, rows])
+
+    return {
+        "model": np.asarray(candidates, dtype=object)[best],
+        "error": np.where(no_backtest, np.nan, error_table[best, rows]),
+        "mae": np.where(no_backtest, np.nan, mae),
+        "spread": np.where(no_backtest, np.nan, spread),
+        "errors": errors,
+        "validated_days": validated_days,
+        "forecast": forecast,
+    }
+
+
+def selection_details(selection: dict, i: int, escalated: bool = False) -> dict:
+    """JSON-safe summary of one row's tournament for the forecast dict."""
+    def rounded(value):
+        return None if np.isnan(value) else round(float(value), 3)
+
+    return {
+        'chosen': 'prophet' if escalated else str(selection["model"][i]),
+        'best_cheap_model': str(selection["model"][i]),
+        'backtest_wape': rounded(selection["error"][i]),
+        'candidates': {model: rounded(error[i]) for model, error in selection["errors"].items()},
+        'escalated_to_prophet': escalated,
+        'validated_days': int(selection["validated_days"][i]),
+    }
+
+
+def wape_accuracy(wape: float) -> float:
+    """1 - WAPE, clipped to [0, 1]; None without a measured error."""
+    return None if wape is None or np.isnan(wape) else round(float(np.clip(1 - wape, 0, 1)), 2)
+
+
+def wape_accuracy_details(wape: float, mae: float, validated: int, days: int, notes: str) -> dict:
+    """accuracy_details of any model scored on held-out days (validated of days)."""
+    return {
+        'mape': None,
+        'wape': None if wape is None or np.isnan(wape) else round(float(wape), 3),
+        'mae': None if mae is None or np.isnan(mae) else round(float(mae), 2),
+        'r2_score': None,
+        'validation_window': validated or None,
+        'total_training_days': days,
+        'validation_pct': round(validated / max(days, 1) * 100, 1),
+        'notes': notes,
+    }
+
+
+def backtest_accuracy(selection: dict, i: int) -> float:
+    """1 - WAPE of the chosen model, clipped to [0, 1]; None without a backtest."""
+    return wape_accuracy(selection["error"][i])
+
+
+def backtest_accuracy_details(selection: dict, i: int, days: int, notes: str) -> dict:
+    return wape_accuracy_details(
+        selection["error"][i], selection["mae"][i], int(selection["validated_days"][i]), days, notes
+    )
+
+
+# ============================================================================
+# FORECAST DICTS - emitted for a whole tier at once
+# ============================================================================
+
+
+def horizon_dates(matrix: DemandMatrix, rows: np.ndarray, forecast_days: int,
+                  filter_from_date: str = None, filter_to_date: str = None) -> tuple:
+    """Future dates (n, horizon) as strings and the filter mask."""
+    offsets = matrix.last_day[rows][:, None] + np.arange(1, forecast_days + 1)
+
+    # Few distinct dates: format each once, then index
+    first = int(offsets.min())
+    calendar = matrix.start_date + np.arange(first, int(offsets.max()) + 1).astype("timedelta64[D]")
+    dates = calendar[offsets - first]
+
+    keep = np.ones(dates.shape, dtype=bool)
+    if filter_from_date:
+        keep &= dates >= np.datetime64(pd.to_datetime(filter_from_date).date(), "D")
+    if filter_to_date:
+        keep &= dates <= np.datetime64(pd.to_datetime(filter_to_date).date(), "D")
+
+    return np.datetime_as_string(calendar, unit="D")[offsets - first], keep
+
+
+def forecast_points(date_strings, keep, predicted, lower, upper, confidence: float = 0.50) -> list:
+    """Per-row lists of forecast day dicts, filtered by keep."""
+    return [
+        [
+            {
+                'date': d,
+                'predicted_units': p,
+                'lower_ci': lo,
+                'upper_ci': up,
+                'confidence': confidence,
+            }
+            for d, k, p, lo, up in zip(date_row, keep_row, p_row, lo_row, up_row)
+            if k
+        ]
+        for date_row, keep_row, p_row, lo_row, up_row in zip(
+            date_strings.tolist(), keep.tolist(), predicted.tolist(), lower.tolist(), upper.tolist()
+        )
+    ]
+
+
+def non_zero_quartiles(series: np.ndarray, lengths: np.ndarray) -> tuple:
+    """25th / 75th percentile (linear) of each row's non-zero window values, 0 if none."""
+    in_window = np.arange(series.shape[1]) < lengths[:, None]
+    ordered = np.sort(np.where(in_window & (series > 0), series, np.inf), axis=1)
+    counts = (in_window & (series > 0)).sum(axis=1)
+
+    quartiles = []
+    for q in (0.25, 0.75):
+        position = (np.maximum(counts, 1) - 1) * q
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, np.maximum(counts - 1, 0))
+        rows = np.arange(len(series))
+        low, high = ordered[rows, below], ordered[rows, above]
+        value = low + (high - low) * (position - below)
+        quartiles.append(np.where(counts > 0, value, 0.0))
+    return tuple(quartiles)
+
+
+def risk_categories(hist_mean: np.ndarray, q25: np.ndarray, q75: np.ndarray) -> tuple:
+    """Risk category / recommendation per SKU, same thresholds as the Prophet path."""
+    variance = np.where(hist_mean > 0, ((q75 - q25) / 2) / (hist_mean + 1), 0.5)
+    category = np.select(
+        [(variance < 0.15) & (hist_mean > 100), (variance < 0.35) & (hist_mean > 20)],
+        ["GREEN", "YELLOW"],
+        default="RED",
+    )
+    recommendation = np.select(
+        [category == "GREEN", category == "YELLOW"],
+        [
+            "Stock at forecast + 5%. Stable product, low risk.",
+            "Stock at forecast + safety stock (15%). Monitor weekly.",
+        ],
+        default="Stock conservatively. High volatility detected. Monitor daily.",
+    )
+    return category, recommendation
+
+
+def forecast_short_history(matrix: DemandMatrix, rows: np.ndarray, item_names: Sequence[str],
+                           filter_from_date: str = None, filter_to_date: str = None,
+                           forecast_days: int = 15) -> dict:
+    """
+    Forecasts for short-history SKUs on observed days only (no zero fill):
+    naive, moving average or Holt linear, whichever backtests best.
+    Returns {row: forecast dict}; rows with < 3 days are omitted.
+    """
+    rows = rows[matrix.present[rows].sum(axis=1) >= 3]
+    if len(rows) == 0:
+        return {}
+
+    series, lengths = _left_align(matrix.values[rows], matrix.present[rows])
+    selection = select_models(series, lengths, forecast_days, SHORT_HISTORY_CANDIDATES,
+                              default="holt", min_train=SHORT_HISTORY_MIN_TRAIN)
+
+    predicted = np.round(selection["forecast"]).astype(np.int64)
+    lower = np.round(predicted * 0.5).astype(np.int64)
+    upper = np.round(predicted * 1.5).astype(np.int64)
+    date_strings, keep = horizon_dates(matrix, rows, forecast_days, filter_from_date, filter_to_date)
+    points = forecast_points(date_strings, keep, predicted, lower, upper)
+
+    results = {}
+    for i, (row, days, forecast_data) in enumerate(zip(rows.tolist(), lengths.tolist(), points)):
+        if not forecast_data:
+            continue
+        item_name = item_names[row]
+        model_label = SHORT_HISTORY_MODEL_LABELS[selection["model"][i]]
+        results[row] = {
+            'sku': matrix.skus[row],
+            'itemname': item_name,
+            'item_name': item_name,
+            'forecast': forecast_data,
+            'accuracy': backtest_accuracy(selection, i),
+            'accuracy_details': backtest_accuracy_details(
+                selection, i, days,
+                f'Insufficient historical data ({days} days). Using {model_label.split(" (")[0]}, best of a backtest on the last days. Low confidence forecast.'
+            ),
+            'model': model_label,
+            'model_selection': selection_details(selection, i),
+            'training_days': days,
+            'confidence_interval': '50%',
+            'risk_category': 'RED',
+            'business_recommendation': 'NEW PRODUCT: Very limited history. Use judgement combined with market knowledge. Monitor sales closely.',
+            'forecast_notes': f'Only {days} days of history available. Use forecast with caution.'
+        }
+    return results
+
+
+def forecast_intermittent(matrix: DemandMatrix, rows: np.ndarray, item_names: Sequence[str],
+                          filter_from_date: str = None, filter_to_date: str = None,
+                          forecast_days: int = 15, method: str = None) -> dict:
+    """
+    Intermittent-demand forecasts (flat daily rate) on the zero-filled
+    window: Croston, SBA or TSB, whichever backtests best per SKU (method
+    forces one). Returns {row: forecast dict}; rows with < 2 selling days
+    are omitted.
+    """
+    selling_days = (matrix.window_mask(rows) & (matrix.values[rows] > 0)).sum(axis=1)
+    rows, selling_days = rows[selling_days >= 2], selling_days[selling_days >= 2]
+    if len(rows) == 0:
+        return {}
+
+    series, lengths = matrix.window_series(rows)
+    candidates = (method,) if method else INTERMITTENT_CANDIDATES
+    selection = select_models(series, lengths, forecast_days, candidates,
+                              default=method or INTERMITTENT_METHOD)
+    rate = selection["forecast"][:, 0]
+
+    predicted = np.repeat(np.round(rate).astype(np.int64)[:, None], forecast_days, axis=1)
+    lower = np.repeat(np.round(rate * 0.2).astype(np.int64)[:, None], forecast_days, axis=1)
+    upper = np.repeat(np.round(rate * 2.0).astype(np.int64)[:, None], forecast_days, axis=1)
+    date_strings, keep = horizon_dates(matrix, rows, forecast_days, filter_from_date, filter_to_date)
+    points = forecast_points(date_strings, keep, predicted, lower, upper)
+
+    results = {}
+    for i, (row, days, sold, forecast_data) in enumerate(zip(rows.tolist(), lengths.tolist(), selling_days.tolist(), points)):
+        if not forecast_data:
+            continue
+        item_name = item_names[row]
+        model_label = INTERMITTENT_MODEL_LABELS[selection["model"][i]]
+        frequency = sold / days
+        results[row] = {
+            'sku': matrix.skus[row],
+            'itemname': item_name,
+            'item_name': item_name,
+            'forecast': forecast_data,
+            'accuracy': backtest_accuracy(selection, i),
+            'accuracy_details': backtest_accuracy_details(
+                selection, i, days,
+                f'Sparse/seasonal product ({(1 - frequency) * 100:.0f}% zero days). Using {model_label.split(" (")[0]} intermittent demand model.'
+            ),
+            'model': model_label,
+            'model_selection': selection_details(selection, i),
+            'training_days': days,
+            'confidence_interval': '50%',
+            'risk_category': 'RED',
+            'business_recommendation': 'SEASONAL/SPARSE PRODUCT: Forecast shows average expected demand on selling days. Do NOT stock daily. Review weekly.',
+            'forecast_notes': f'Seasonal/intermittent product. Sold on ~{frequency*100:.0f}% of days. Forecast represents average demand when available.'
+        }
+    return results
+
+
+def forecast_regular(matrix: DemandMatrix, rows: np.ndarray, item_names: Sequence[str],
+                     filter_from_date: str = None, filter_to_date: str = None,
+                     forecast_days: int = 15,
+                     escalation_error: float = PROPHET_ESCALATION_ERROR,
+                     baseline: bool = False) -> tuple:
+    """
+    Backtest tournament for regular (Prophet-tier) SKUs on the zero-filled
+    window. SKUs whose best cheap model has WAPE <= escalation_error are
+    forecast with it; the others are left for Prophet. escalation_error=None
+    forecasts every row with its best cheap model.
+
+    Returns ({row: forecast dict}, {row: model_selection dict}) where the
+    second dict holds the escalated rows. baseline=True also forecasts the
+    escalated rows with their best cheap model (first dict).
+    """
+    if len(rows) == 0:
+        return {}, {}
+
+    series, lengths = matrix.window_series(rows)
+    selection = select_models(series, lengths, forecast_days, REGULAR_CANDIDATES)
+    if escalation_error is None:
+        escalate = np.zeros(len(rows), dtype=bool)
+    else:
+        escalate = ~(selection["error"] <= escalation_error)
+
+    escalated = {
+        row: selection_details(selection, i, escalated=True)
+        for i, row in enumerate(rows.tolist()) if escalate[i]
+    }
+    cheap = np.arange(len(rows)) if baseline else np.flatnonzero(~escalate)
+    if len(cheap) == 0:
+        return {}, escalated
+
+    # 75% interval from the chosen model's backtest errors
+    raw = selection["forecast"][cheap]
+    spread = selection["spread"][cheap][:, None]
+    predicted = np.round(raw).astype(np.int64)
+    lower = np.minimum(np.round(np.maximum(raw - spread, 0)).astype(np.int64), predicted)
+    upper = np.maximum(np.round(raw + spread).astype(np.int64), predicted)
+    date_strings, keep = horizon_dates(matrix, rows[cheap], forecast_days, filter_from_date, filter_to_date)
+    points = forecast_points(date_strings, keep, predicted, lower, upper, confidence=0.75)
+
+    series, lengths = series[cheap], lengths[cheap]
+    n = len(cheap)
+    cumulative = np.cumsum(series, axis=1)
+    hist_mean = cumulative[np.arange(n), lengths - 1] / np.maximum(lengths, 1)
+    q25, q75 = non_zero_quartiles(series, lengths)
+    first_week = cumulative[np.arange(n), np.minimum(lengths - 1, 6)] / np.minimum(lengths, 7)
+    last_week = (cumulative[np.arange(n), lengths - 1] - np.where(
+        lengths > 7, cumulative[np.arange(n), np.maximum(lengths - 8, 0)], 0.0
+    )) / np.minimum(lengths, 7)
+    risk_category, business_recommendation = risk_categories(hist_mean, q25, q75)
+
+    results = {}
+    for j, i in enumerate(cheap.tolist()):
+        if not points[j]:
+            continue
+        row = int(rows[i])
+        days = int(lengths[j])
+        item_name = item_names[row]
+        model = selection["model"][i]
+        results[row] = {
+            'sku': matrix.skus[row],
+            'itemname': item_name,
+            'item_name': item_name,
+            'forecast': points[j],
+            'stock_recommendation': int(round(hist_mean[j] * 1.15)),
+            'expected_daily_range': f"{int(round(q25[j]))}-{int(round(q75[j]))} units",
+            'risk_category': str(risk_category[j]),
+            'why_stock_this': f"Based on {days} days: sales range {int(q25[j])}-{int(round(q75[j]))} units.",
+            'confidence': "medium",
+            'accuracy': backtest_accuracy(selection, i),
+            'accuracy_details': backtest_accuracy_details(
+                selection, i, days,
+                f'{CHEAP_MODEL_LABELS[model]} had the lowest rolling-origin backtest error of {len(REGULAR_CANDIDATES)} cheap models.'
+            ),
+            'model': CHEAP_MODEL_LABELS[model],
+            'model_selection': selection_details(selection, i),
+            'training_days': days,
+            'confidence_interval': "75%",
+            'business_recommendation': str(business_recommendation[j]),
+            'forecast_notes': f'Trained on {days} days of history.',
+            'explanation': {
+                'avg_daily_sales': round(float(hist_mean[j]), 2),
+                'data_points_used': days,
+                'recent_trend': 'increasing' if last_week[j] > first_week[j] else 'stable',
+            },
+        }
+    return results, escalated
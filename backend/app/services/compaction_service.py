@@ -0,0 +1,150 @@
+import pandas as pd
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# COMPACT FRAME - categorical identifiers + downcast measures
+# ============================================================================
+
+# Identifier columns grouped on downstream. As categoricals every groupby /
+# merge / nunique runs on integer codes instead of Python string objects.
+CATEGORICAL_COLUMNS = ["sku", "itemname", "store", "invoice_id"]
+
+# Categories are sorted where groupby(sort=True) output order is user
+# visible; invoice ids only feed counts / sums, so they keep first-seen order
+# and skip sorting hundreds of thousands of strings.
+SORTED_CATEGORY_COLUMNS = {"sku", "itemname", "store"}
+
+# Skip the conversion when a column is (almost) unique per row; the category
+# table would then cost as much as the strings it replaces.
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+# Additive counts: downcast to int32 only when every value is a whole number,
+# so sums stay exact.
+INTEGER_COLUMNS = ["quantity", "line_count"]
+
+# Point-in-time measures ("last" value per SKU, never summed) -> float32.
+# line_revenue stays float64 because revenue totals are summed over every row.
+FLOAT32_COLUMNS = ["unit_price", "unit_cost", "current_stock"]
+
+INT32_MAX = np.iinfo(np.int32).max
+
+
+# Deep memory of object columns is measured on an evenly spaced sample and
+# scaled up; summing getsizeof over millions of strings takes seconds.
+MEMORY_SAMPLE_ROWS = 100_000
+
+
+def frame_memory_mb(df: pd.DataFrame) -> float:
+    """Deep memory usage of a DataFrame in MB (object strings estimated)."""
+    object_cols = [c for c in df.columns if df[c].dtype == object]
+    # Categorical deep usage only walks the (small) category table
+    exact = df.drop(columns=object_cols).memory_usage(index=True, deep=True)
+
+    if not object_cols:
+        return round(float(exact.sum()) / (1024 * 1024), 2)
+
+    if len(df) > MEMORY_SAMPLE_ROWS:
+        step = len(df) // MEMORY_SAMPLE_ROWS
+        sample = df[object_cols].iloc[::step]
+        scale = len(df) / len(sample)
+    else:
+        sample = df[object_cols]
+        scale = 1.0
+
+    object_bytes = float(sample.memory_usage(index=False, deep=True).sum()) * scale
+    total = float(exact.sum()) + object_bytes
+    return round(total / (1024 * 1024), 2)
+
+
+def _is_whole_int32(series: pd.Series) -> bool:
+    if not pd.api.types.is_numeric_dtype(series) or series.isna().any():
+        return False
+
+    values = series.to_numpy()
+    if not len(values):
+        return False
+
+    if pd.api.types.is_float_dtype(series) and not np.array_equal(values, np.floor(values)):
+        return False
+
+    return bool(np.abs(values).max() <= INT32_MAX)
+
+
+def _to_categorical(series: pd.Series, sort: bool):
+    """
+    One hash pass: factorize gives both the uniqueness ratio and the codes.
+    Sorted categories keep groupby(sort=True) order identical to strings.
+    """
+    if not len(series):
+        return None
+
+    codes, uniques = pd.factorize(series, sort=sort)
+    if len(uniques) / len(series) > CATEGORICAL_MAX_UNIQUE_RATIO:
+        return None
+
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=uniques),
+        index=series.index,
+        name=series.name,
+    )
+
+
+def compact_sales_frame(df: pd.DataFrame) -> tuple:
+    """
+    Shrink a normalized sales frame (output of normalize_csv_columns or the
+    streaming rollup). The input frame is left untouched.
+
+    - identifier columns -> category
+    - whole-number counts -> int32
+    - price / stock columns -> float32
+
+    Returns (compact_df, report) where report carries memory before / after
+    and the dtype each column was converted to.
+    """
+    memory_before = frame_memory_mb(df)
+    compact = df.copy()
+    converted = {}
+
+    for col in CATEGORICAL_COLUMNS:
+        if col not in compact.columns or isinstance(compact[col].dtype, pd.CategoricalDtype):
+            continue
+
+        categorical = _to_categorical(compact[col], sort=col in SORTED_CATEGORY_COLUMNS)
+        if categorical is None:
+            continue
+
+        compact[col] = categorical
+        converted[col] = "category"
+
+    for col in INTEGER_COLUMNS:
+        if col in compact.columns and _is_whole_int32(compact[col]):
+            compact[col] = compact[col].astype(np.int32)
+            converted[col] = "int32"
+
+    for col in FLOAT32_COLUMNS:
+        if col in compact.columns and pd.api.types.is_float_dtype(compact[col]):
+            compact[col] = compact[col].astype(np.float32)
+            converted[col] = "float32"
+
+    compact.attrs = dict(df.attrs)
+
+    memory_after = frame_memory_mb(compact)
+    report = {
+        "compact": True,
+        "memory_before_mb": memory_before,
+        "memory_after_mb": memory_after,
+        "reduction_pct": (
+            round((1 - memory_after / memory_before) * 100, 1)
+            if memory_before > 0 else 0.0
+        ),
+        "converted_columns": converted,
+    }
+
+    logger.info(
+        f"✅ Compact frame: {memory_before} MB -> {memory_after} MB "
+        f"({report['reduction_pct']}% smaller)"
+    )
+    return compact, report
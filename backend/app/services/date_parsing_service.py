@@ -0,0 +1,136 @@
+import pandas as pd
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# ✅ DATE PARSING - one parse per distinct date string
+# ============================================================================
+
+# Explicit formats tried before falling back to dateutil (dayfirst).
+# They never overlap (different separators / field order), so the order in
+# which they are tried cannot change the value a string parses to.
+DATE_FORMAT_CASCADE = ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d"]
+
+DATEUTIL_FALLBACK = "dateutil_dayfirst"
+
+
+def infer_date_format(values: pd.Series, min_ratio: float = 0.95):
+    """
+    First explicit format that parses (nearly) every distinct value, else None.
+    """
+    uniques = pd.Series(values.dropna().unique(), dtype=object).astype(str).str.strip()
+    if uniques.empty:
+        return None
+
+    for fmt in DATE_FORMAT_CASCADE:
+        if pd.to_datetime(uniques, format=fmt, errors="coerce").notna().mean() >= min_ratio:
+            return fmt
+
+    return None
+
+
+def _format_order(uniques: pd.Series, preferred_format: str = None) -> list:
+    """
+    Cascade order with the winning format first. The winner is the sniffed
+    format when given, otherwise the explicit format matching most uniques.
+    """
+    winner = preferred_format if preferred_format in DATE_FORMAT_CASCADE else None
+
+    if winner is None and len(uniques):
+        probe = uniques.head(500)
+        hit_counts = {
+            fmt: int(pd.to_datetime(probe, format=fmt, errors="coerce").notna().sum())
+            for fmt in DATE_FORMAT_CASCADE
+        }
+        best = max(hit_counts, key=hit_counts.get)
+        winner = best if hit_counts[best] > 0 else None
+
+    if winner is None:
+        return list(DATE_FORMAT_CASCADE)
+
+    return [winner] + [fmt for fmt in DATE_FORMAT_CASCADE if fmt != winner]
+
+
+def parse_dates_memoized(series: pd.Series, preferred_format: str = None) -> tuple:
+    """
+    Parse a column of date strings in O(unique values).
+
+    1. factorize the column into codes + distinct strings
+    2. order the format cascade by the winning format
+    3. parse each distinct string once (explicit formats, then dateutil)
+    4. broadcast back through the codes
+
+    Returns (parsed_series, report) where report carries per-format row hits.
+    """
+    if pd.api.types.is_datetime64_dtype(series):
+        return series, {
+            "rows": int(len(series)),
+            "unique_values": None,
+            "winning_format": "native",
+            "format_hits": {"native": int(series.notna().sum())},
+            "unparsed": int(series.isna().sum()),
+        }
+
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+
+    # Row weight of every distinct value, for row-level hit counts
+    row_weights = np.bincount(codes[codes >= 0], minlength=len(text))
+
+    formats = _format_order(text, preferred_format)
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    format_hits = {}
+
+    pending = pd.Series(True, index=text.index)
+    for fmt in formats:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(text[pending], format=fmt, errors="coerce")
+        matched = attempt.notna()
+        parsed.loc[attempt.index[matched]] = attempt[matched]
+        format_hits[fmt] = int(row_weights[attempt.index[matched]].sum())
+        pending.loc[attempt.index[matched]] = False
+
+    if pending.any():
+        attempt = pd.to_datetime(text[pending], dayfirst=True, errors="coerce")
+        matched = attempt.notna()
+        if matched.any():
+            parsed.loc[attempt.index[matched]] = attempt[matched]
+        format_hits[DATEUTIL_FALLBACK] = int(row_weights[attempt.index[matched]].sum())
+
+    # Code -1 (missing) picks the trailing NaT
+    values = np.append(parsed.to_numpy(), np.datetime64("NaT", "ns"))
+    result = pd.Series(values[codes], index=series.index, name=series.name)
+
+    report = {
+        "rows": int(len(series)),
+        "unique_values": int(len(text)),
+        "winning_format": formats[0] if format_hits.get(formats[0]) else None,
+        "format_hits": format_hits,
+        "unparsed": int(result.isna().sum()),
+    }
+    return result, report
+
+
+def merge_date_reports(reports: list) -> dict:
+    """Combine per-chunk reports (streaming ingest) into one."""
+    reports = [r for r in reports if r]
+    if not reports:
+        return {}
+
+    format_hits = {}
+    for report in reports:
+        for fmt, hits in report.get("format_hits", {}).items():
+            format_hits[fmt] = format_hits.get(fmt, 0) + hits
+
+    winner = max(format_hits, key=format_hits.get) if format_hits else None
+
+    return {
+        "rows": sum(r.get("rows", 0) for r in reports),
+        "unique_values": max((r.get("unique_values") or 0) for r in reports),
+        "winning_format": winner,
+        "format_hits": format_hits,
+        "unparsed": sum(r.get("unparsed", 0) for r in reports),
+    }
@@ -0,0 +1,215 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.schema_service import normalize_sku
+
+# ============================================================================
+# SKU x DAY DEMAND - a dataset's daily demand, built once per upload
+# CSR layout: row i (one normalized SKU) sells on days[indptr[i]:indptr[i+1]]
+# (day offsets from start_date, ascending) with the summed quantities in the
+# same slice of values. Memory is O(observed SKU-days), not SKUs x calendar,
+# so sparse catalogs stay small. Per-SKU reads are array views; forecasting
+# densifies only the rows it models.
+# ============================================================================
+
+
+class SkuDayDemand:
+    """
+    - skus: normalized SKU per row, in first-seen order; sku_index maps back
+    - item_names: first item name seen for each SKU
+    - start_date (datetime64[D]) and n_days: the dataset's calendar
+    - indptr (int64, n_skus + 1), days (int32), values (float32): CSR cells,
+      one per (SKU, day) with rows (a zero-quantity cell still counts as present)
+    - records: raw line count per SKU (line_count aware)
+    - totals: summed quantity per SKU (float64)
+    """
+
+    def __init__(self, skus, item_names, start_date, n_days, indptr, days, values, records, totals):
+        self.skus = list(skus)
+        self.sku_index = {sku: i for i, sku in enumerate(self.skus)}
+        self.item_names = list(item_names)
+        self.start_date = start_date
+        self.n_days = n_days
+        self.indptr = indptr
+        self.days = days
+        self.values = values
+        self.records = records
+        self.totals = totals
+
+    @property
+    def n_skus(self) -> int:
+        return len(self.skus)
+
+    @property
+    def observed_days(self) -> np.ndarray:
+        """Days with rows per SKU."""
+        return np.diff(self.indptr)
+
+    @property
+    def memory_mb(self) -> float:
+        arrays = (self.indptr, self.days, self.values, self.records, self.totals)
+        return round(sum(a.nbytes for a in arrays) / 1024 / 1024, 3)
+
+    def row(self, sku: str) -> int:
+        """Row of a (normalized) SKU, -1 if it has no rows."""
+        return self.sku_index.get(sku, -1)
+
+    def row_cells(self, row: int) -> tuple:
+        """(days, values) views of one SKU's cells."""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.days[start:end], self.values[start:end]
+
+    def daily_stats(self) -> dict:
+        """Per-SKU stats over the dataset calendar, zeros included (see daily_stats)."""
+        return daily_stats(self.indptr, self.days, self.values, self.n_days)
+
+    def dense(self, rows: np.ndarray) -> tuple:
+        """Zero-filled (values float64, present bool), shape (len(rows), n_days)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = np.repeat(starts, counts) + offsets
+        dense_rows = np.repeat(np.arange(len(rows)), counts)
+
+        values = np.zeros((len(rows), self.n_days))
+        present = np.zeros((len(rows), self.n_days), dtype=bool)
+        values[dense_rows, self.days[cells]] = self.values[cells]
+        present[dense_rows, self.days[cells]] = True
+        return values, present
+
+
+def build_sku_day_demand(df: pd.DataFrame, date_col: str, qty_col: str, sku_col: str,
+                         item_col: Optional[str] = None) -> SkuDayDemand:
+    """One sort over df: quantities summed per (normalized SKU, day) into CSR cells."""
+    codes, uniques = pd.factorize(df[sku_col], sort=False)
+    # Raw SKUs that normalize to the same key share a row
+    unique_rows, skus = pd.factorize(pd.Index([normalize_sku(u) for u in uniques], dtype=object), sort=False)
+    rows = np.where(codes >= 0, unique_rows[codes] if len(unique_rows) else -1, -1)
+    n_rows = len(skus)
+
+    # First item name per SKU, in df order
+    if item_col and item_col in df.columns and n_rows:
+        seen = np.flatnonzero(rows >= 0)
+        _, first = np.unique(rows[seen], return_index=True)
+        item_names = [str(name).strip() for name in df[item_col].to_numpy()[seen[first]]]
+    else:
+        item_names = list(skus)
+
+    days = pd.to_datetime(df[date_col]).to_numpy().astype("datetime64[D]")
+    keep = (rows >= 0) & ~np.isnat(days)
+    rows, days = rows[keep], days[keep]
+    quantity = np.nan_to_num(pd.to_numeric(df[qty_col], errors="coerce").to_numpy(dtype=float)[keep])
+
+    if "line_count" in df.columns:
+        line_counts = df["line_count"].to_numpy(dtype=float)[keep]
+        records = np.bincount(rows, weights=line_counts, minlength=n_rows).astype(np.int64)
+    else:
+        records = np.bincount(rows, minlength=n_rows)
+    totals = np.bincount(rows, weights=quantity, minlength=n_rows)
+
+    if not keep.any():
+        return SkuDayDemand(
+            skus, item_names, np.datetime64("1970-01-01", "D"), 1, np.zeros(n_rows + 1, dtype=np.int64),
+            np.array([], dtype=np.int32), np.array([], dtype=np.float32), records, totals,
+        )
+
+    start_date = days.min()
+    day_index = (days - start_date).astype(np.int64)
+    n_days = int(day_index.max()) + 1
+
+    indptr, cell_days, values = csr_cells(rows, day_index, quantity, n_rows, n_days)
+    return SkuDayDemand(
+        skus, item_names, start_date, n_days, indptr,
+        cell_days, values.astype(np.float32), records, totals,
+    )
+
+
+def csr_cells(rows: np.ndarray, day_index: np.ndarray, quantity: np.ndarray,
+              n_rows: int, n_days: int, compensated: bool = False) -> tuple:
+    """
+    Quantities summed per (row, day): (indptr int64, days int32, values
+    float64), days ascending per row. compensated=True sums like a pandas
+    groupby sum (NaN skipped, Kahan-compensated) at about twice the cost.
+    """
+    keys = rows * n_days + day_index
+    if compensated:
+        cell_sums = pd.Series(quantity).groupby(keys).sum()
+        cells, values = cell_sums.index.to_numpy(dtype=np.int64), cell_sums.to_numpy(dtype=float)
+    else:
+        cells, cell_of = np.unique(keys, return_inverse=True)
+        values = np.bincount(cell_of, weights=quantity, minlength=len(cells))
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells // n_days, minlength=n_rows), out=indptr[1:])
+    return indptr, (cells % n_days).astype(np.int32), values
+
+
+def daily_stats(indptr: np.ndarray, days: np.ndarray, values: np.ndarray, n_days: int) -> dict:
+    """
+    Per-row statistics of the zero-filled n_days series, from the stored
+    cells only (days without a cell count as 0): total, mean, std (ddof=1,
+    NaN for a one-day calendar), min, max and days with sales (> 0).
+
+    Total / mean / std replay pandas' groupby kernels (compensated sum,
+    Welford variance) one calendar day at a time across all rows, so they
+    match a dense zero-filled groupby bit for bit while holding one value
+    per row, never the rows x days grid.
+    """
+    counts = np.diff(indptr)
+    n_rows = len(counts)
+    rows = np.repeat(np.arange(n_rows), counts)
+    values = np.asarray(values, dtype=float)
+    implicit_zeros = n_days - counts
+
+    by_day = np.argsort(days, kind="stable")
+    day_bounds = np.searchsorted(days[by_day], np.arange(n_days + 1))
+    daily = np.zeros(n_rows)
+    total = np.zeros(n_rows)
+    compensation = np.zeros(n_rows)
+    mean = np.zeros(n_rows)
+    squared = np.zeros(n_rows)
+    for day in range(n_days):
+        cells = by_day[day_bounds[day]:day_bounds[day + 1]]
+        daily[:] = 0.0
+        daily[rows[cells]] = values[cells]
+
+        adjusted = daily - compensation
+        running = total + adjusted
+        compensation = running - total - adjusted
+        compensation[np.isnan(compensation)] = 0.0     # +/- inf quantities
+        total = running
+
+        delta = daily - mean
+        mean = mean + delta / (day + 1)
+        squared += (daily - mean) * delta
+
+    std = np.sqrt(squared / (n_days - 1)) if n_days > 1 else np.full(n_rows, np.nan)
+
+    filled = counts > 0
+    starts = indptr[:-1][filled]
+    low = np.zeros(n_rows)
+    high = np.zeros(n_rows)
+    if len(values):
+        low[filled] = np.minimum.reduceat(values, starts)
+        high[filled] = np.maximum.reduceat(values, starts)
+    gaps = implicit_zeros > 0
+    low[gaps] = np.minimum(low[gaps], 0.0)
+    high[gaps] = np.maximum(high[gaps], 0.0)
+
+    return {
+        "total": total,
+        "mean": total / n_days,
+        "std": std,
+        "min": low,
+        "max": high,
+        "days_with_sales": np.bincount(rows, weights=values > 0, minlength=n_rows).astype(np.int64),
+    }
+
+
+def ranked_rows(demand: SkuDayDemand, limit: Optional[int] = None) -> np.ndarray:
+    """Rows with positive total demand, best sellers first (ties: first seen)."""
+    rows = np.flatnonzero(demand.totals > 0)
+    rows = rows[np.argsort(-demand.totals[rows], kind="stable")]
+    return rows if limit is None else rows[:limit]
@@ -0,0 +1,283 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# FORECAST EXECUTOR - long-lived worker processes for per-SKU forecasting
+# Prophet / statsmodels / pandas work is GIL-bound, so threads do not scale;
+# one process per available CPU does. Created at app startup, shared by all
+# requests; each job worker process starts its own (see job_service).
+# ============================================================================
+
+FORECAST_WORKERS_ENV = "FORECAST_WORKERS"   # overrides the detected worker count
+FORECAST_MAX_WORKERS = 32
+FORECAST_TASK_TARGET_ROWS = 2_000           # small SKUs are batched up to this many rows per task
+FORECAST_TASK_MAX_ITEMS = 16                # ... and at most this many SKUs per task
+FORECAST_FALLBACK_THREADS = 4               # in-process fallback when the pool is unavailable
+
+# Native thread pools (BLAS, OpenMP, numexpr) pinned to one thread per worker
+# so N workers do not each start N threads.
+SINGLE_THREAD_ENV = {
+    "OMP_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "VECLIB_MAXIMUM_THREADS": "1",
+    "NUMEXPR_NUM_THREADS": "1",
+}
+
+# map() result for tasks that did not finish before the deadline
+DEADLINE_EXCEEDED = object()
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_count() -> int:
+    """
+    CPUs this process may actually use: the cgroup CPU quota (v2 cpu.max,
+    then v1 cfs quota/period) capped by the scheduler affinity mask.
+    os.cpu_count() reports host cores, which overcommits in containers.
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+
+    quota = None
+    cpu_max = _read_first_line("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        limit, _, period = cpu_max.partition(" ")
+        if limit != "max" and period:
+            quota = int(limit) / int(period)
+    else:
+        limit = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+        period = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if limit and period and int(limit) > 0:
+            quota = int(limit) / int(period)
+
+    if quota is not None:
+        available = min(available, max(1, math.ceil(quota)))
+
+    return max(1, available)
+
+
+def forecast_worker_count() -> int:
+    override = os.getenv(FORECAST_WORKERS_ENV)
+    if override:
+        try:
+            return max(1, int(override))
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid {FORECAST_WORKERS_ENV}={override!r}")
+    return min(cgroup_cpu_count(), FORECAST_MAX_WORKERS)
+
+
+def _init_worker() -> None:
+    """Runs once in each worker before any task."""
+    os.environ.update(SINGLE_THREAD_ENV)
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+    # Warm the heavy imports once per worker, not per task
+    import app.services.forecasting_service  # noqa: F401
+
+
+def _run_batch(fn: Callable, batch: list, wall_deadline: float = None) -> list:
+    """Run a batch in a worker; stops at wall_deadline (time.time()) and returns the finished prefix."""
+    results = []
+    for args in batch:
+        if wall_deadline is not None and time.time() >= wall_deadline:
+            break
+        results.append(fn(*args))
+    return results
+
+
+def batch_tasks(tasks: Sequence[tuple], weights: Sequence[int],
+                target_rows: int = FORECAST_TASK_TARGET_ROWS,
+                max_items: int = FORECAST_TASK_MAX_ITEMS) -> list:
+    """
+    Group task indices so each batch carries about target_rows of data.
+    A task at or above target_rows runs alone; small ones share a batch to
+    amortize pickling and IPC. Returns a list of index lists, largest first.
+    """
+    batches = []
+    current, current_rows = [], 0
+
+    for index in sorted(range(len(tasks)), key=lambda i: weights[i], reverse=True):
+        if weights[index] >= target_rows:
+            batches.append([index])
+            continue
+
+        current.append(index)
+        current_rows += weights[index]
+        if current_rows >= target_rows or len(current) >= max_items:
+            batches.append(current)
+            current, current_rows = [], 0
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+class ForecastExecutor:
+    """
+    Process pool for per-SKU forecast functions.
+
+    map() keeps result order. Functions and arguments must be picklable
+    (module-level functions, DataFrames, plain dicts). When the pool was
+    never started or a worker died, map() runs in threads in-process so a
+    request never fails because of the pool. With a deadline, tasks not
+    finished in time are cancelled and come back as DEADLINE_EXCEEDED.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._pool is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                return
+            if self.max_workers is None:
+                self.max_workers = forecast_worker_count()
+
+            # spawn: the server process holds threads and sockets that must
+            # not be forked into workers
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        logger.info(f"✅ Forecast executor started with {self.max_workers} worker processes")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+            logger.info("✅ Forecast executor stopped")
+
+    def map(self, fn: Callable, tasks: Sequence[tuple], weights: Sequence[int] = None,
+            deadline: float = None) -> list:
+        """
+        Run fn(*task) for every task; results in task order.
+        deadline: time.monotonic() value after which unfinished tasks are
+        cancelled; running ones finish their current SKU and stop.
+        """
+        results = [DEADLINE_EXCEEDED] * len(tasks)
+        for index, result in self.as_completed(fn, tasks, weights, deadline):
+            results[index] = result
+        return results
+
+    def as_completed(self, fn: Callable, tasks: Sequence[tuple], weights: Sequence[int] = None,
+                     deadline: float = None) -> Iterator[tuple]:
+        """
+        Like map(), but yields (task index, result) as batches finish, then
+        (index, DEADLINE_EXCEEDED) for tasks cut off by the deadline. Closing
+        the generator early cancels the queued batches.
+        """
+        done = set()
+        futures = {}
+        pool = self._pool
+        out_of_time = deadline is not None and time.monotonic() >= deadline
+        try:
+            if pool is None and not out_of_time:
+                yield from self._as_completed_in_process(fn, tasks, range(len(tasks)), deadline, done)
+            elif not out_of_time:
+                weights = weights if weights is not None else [1] * len(tasks)
+                # Workers get the deadline as wall-clock time (monotonic clocks are per process)
+                wall_deadline = None if deadline is None else time.time() + deadline - time.monotonic()
+                try:
+                    for batch in batch_tasks(tasks, weights):
+                        futures[pool.submit(_run_batch, fn, [tasks[i] for i in batch], wall_deadline)] = batch
+                    for future, batch in _collect(futures, deadline):
+                        for index, result in zip(batch, future.result()):
+                            done.add(index)
+                            yield index, result
+                except BrokenProcessPool as pool_error:
+                    logger.error(f"❌ Forecast worker pool broke ({pool_error}), restarting; running in-process")
+                    self._restart(pool)
+                    remaining = [index for index in range(len(tasks)) if index not in done]
+                    yield from self._as_completed_in_process(fn, tasks, remaining, deadline, done)
+        finally:
+            # Only still-queued batches cancel (the consumer stopped early)
+            for future in futures:
+                future.cancel()
+
+        for index in range(len(tasks)):
+            if index not in done:
+                yield index, DEADLINE_EXCEEDED
+
+    def _restart(self, broken_pool) -> None:
+        with self._lock:
+            if self._pool is not broken_pool:
+                return
+            self._pool = None
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    @staticmethod
+    def _as_completed_in_process(fn: Callable, tasks: Sequence[tuple], indices: Iterable[int],
+                                 deadline: float, done: set) -> Iterator[tuple]:
+        executor = ThreadPoolExecutor(max_workers=FORECAST_FALLBACK_THREADS)
+        try:
+            futures = {executor.submit(fn, *tasks[index]): index for index in indices}
+            for future, index in _collect(futures, deadline):
+                done.add(index)
+                yield index, future.result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+def _collect(futures: dict, deadline: float = None):
+    """
+    Yield (future, futures[future]) as futures finish. At the deadline the
+    queued ones are cancelled and skipped; running ones are still awaited.
+    """
+    pending = set(futures)
+    while pending:
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future, futures[future]
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+
+    dropped = [future for future in pending if future.cancel()]
+    if dropped:
+        logger.warning(f"⚠️ Forecast deadline reached, {len(dropped)} queued tasks dropped")
+    for future in wait(pending - set(dropped)).done:
+        yield future, futures[future]
+
+
+forecast_executor = ForecastExecutor()
+
+
+def start_forecast_executor() -> None:
+    forecast_executor.start()
+
+
+def shutdown_forecast_executor() -> None:
+    forecast_executor.shutdown()
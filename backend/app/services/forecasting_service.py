@@ -0,0 +1,428 @@
+import logging
+import math
+import os
+import time
+from statistics import NormalDist
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
+
+from app.services.batch_forecast_service import (
+    BACKTEST_FOLDS,
+    BACKTEST_MAX_HORIZON,
+    BACKTEST_MIN_TRAIN,
+    wape_accuracy,
+    wape_accuracy_details,
+)
+from app.services.model_cache_service import (
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_WARM,
+    model_cache,
+    series_extends,
+    series_fingerprint,
+)
+from app.services.schema_service import normalize_sku
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# PER-SKU PROPHET FORECASTS
+# Module-level (no route / db imports) so forecast worker processes can
+# import and run them; see forecast_executor. Short-history and
+# intermittent SKUs are forecast in batch_forecast_service.
+# ============================================================================
+
+# Prophet profiles (PROPHET_PROFILE env var, or per plan as
+# PLAN_LIMITS["prophet_profile"]):
+# - full: predict history + future with 1000 sampled trend paths (default)
+# - fast: predict the future rows only, no sampling, optimizer capped at
+#   max_iter iterations. The interval is a constant +/- z * sigma_obs band
+#   around yhat, so it leaves out trend uncertainty
+PROPHET_PROFILES = {
+    "full": {"uncertainty_samples": 1000, "future_only": False, "max_iter": None},
+    "fast": {"uncertainty_samples": 0, "future_only": True, "max_iter": 300},
+}
+PROPHET_PROFILE = os.getenv("PROPHET_PROFILE", "full")
+PROPHET_CACHE_VERSION = 2   # bump when the Prophet setup above changes (invalidates cached predictions)
+
+
+def safe_number(value, default=0.0):
+    """
+    Safely convert NaN/inf/None to a JSON‑safe float.
+    """
+    try:
+        if isinstance(value, (int, float)):
+            if math.isnan(value) or math.isinf(value):
+                return default
+            return float(value)
+        # Non‑numeric but not None → just return default
+        return default if value is None else float(value)
+    except Exception:
+        return default
+
+
+def record_count(df: pd.DataFrame) -> int:
+    """Raw line count, whether df holds line items or daily rollups."""
+    if "line_count" in df.columns:
+        return int(df["line_count"].sum())
+    return len(df)
+
+
+def _prophet_init(model: Prophet) -> dict:
+    """Fitted parameters in Stan init form (JSON-safe), for warm starts."""
+    return {
+        'k': float(model.params['k'][0][0]),
+        'm': float(model.params['m'][0][0]),
+        'sigma_obs': float(model.params['sigma_obs'][0][0]),
+        'delta': model.params['delta'][0].tolist(),
+        'beta': model.params['beta'][0].tolist(),
+    }
+
+
+def _prophet_warm_start(entry: dict) -> Optional[dict]:
+    """Stan init values from a cache entry (compact init, else the serialized model)."""
+    try:
+        init = entry.get("init") or _prophet_init(model_from_json(entry["model"]))
+        return {
+            'k': init['k'],
+            'm': init['m'],
+            'sigma_obs': init['sigma_obs'],
+            'delta': np.asarray(init['delta'], dtype=float),
+            'beta': np.asarray(init['beta'], dtype=float),
+        }
+    except Exception as cache_error:
+        logger.warning(f"⚠️ Cached Prophet model unusable: {cache_error}")
+        return None
+
+
+def _new_prophet(interval_width: float, settings: dict) -> Prophet:
+    # ✅ SAME PROPHET LOGIC AS BEFORE
+    return Prophet(
+        daily_seasonality=False,
+        weekly_seasonality=True,
+        yearly_seasonality=False,
+        interval_width=interval_width,
+        changepoint_prior_scale=0.05,
+        seasonality_mode='additive',
+        uncertainty_samples=settings["uncertainty_samples"],
+    )
+
+
+def _prophet_backtest(daily_sales: pd.DataFrame, forecast_days: int, settings: dict) -> Optional[dict]:
+    """
+    Score Prophet on the latest fold of the cheap-model tournament
+    (batch_forecast_service.select_models): fit on the days before the
+    origin, predict the span after it. Returns {"wape", "mae", "days"},
+    None when the history is too short for a fold.
+    """
+    n = len(daily_sales)
+    span = int(np.clip((n - BACKTEST_MIN_TRAIN) // BACKTEST_FOLDS, 1, min(forecast_days, BACKTEST_MAX_HORIZON)))
+    origin = n - span
+    if origin < BACKTEST_MIN_TRAIN:
+        return None
+
+    train = daily_sales.iloc[:origin]
+    np.random.seed(42)
+    model = _new_prophet(0.8, {**settings, "uncertainty_samples": 0})   # yhat only
+    # BFGS: up to 3x faster than Prophet's default L-BFGS on short folds,
+    # WAPE within 0.005 (Prophet still retries with Newton on failure)
+    model.fit(train, algorithm="BFGS", **({"iter": settings["max_iter"]} if settings["max_iter"] else {}))
+    yhat = model.predict(daily_sales[['ds']].iloc[origin:])['yhat'].to_numpy()
+
+    # Scored as served: clipped at 0 and at 1.5x the best training day
+    predicted = np.minimum(np.maximum(yhat, 0), train['y'].max() * 1.5)
+    actual = daily_sales['y'].to_numpy(dtype=float)[origin:]
+    abs_error = np.abs(predicted - actual)
+    return {
+        "wape": float(abs_error.sum() / max(actual.sum(), 1.0)),
+        "mae": float(abs_error.mean()),
+        "days": span,
+    }
+
+
+def _fit_predict_prophet(daily_sales: pd.DataFrame, forecast_days: int,
+                         interval_width: float, profile: str,
+                         cache_key: tuple = None, backtest: bool = False) -> tuple:
+    """
+    Fit Prophet on (ds, y) and predict the forecast_days after the last day.
+    With cache_key (tenant, sku) the model cache is consulted first: an
+    identical series reuses the cached prediction, an extended one
+    warm-starts the fit. backtest=True also scores Prophet on the latest
+    tournament fold (_prophet_backtest, cached with the prediction).
+    Returns (future rows with yhat / yhat_lower / yhat_upper,
+    timings in ms + "cache" outcome, backtest scores or None).
+    """
+    settings = PROPHET_PROFILES[profile]
+    started = time.perf_counter()
+
+    entry = model_cache.get(*cache_key) if cache_key else None
+    fingerprint = series_fingerprint(daily_sales, {
+        "version": PROPHET_CACHE_VERSION,
+        "profile": settings,
+        "forecast_days": forecast_days,
+        "interval_width": interval_width,
+    }) if cache_key else None
+
+    if entry and entry.get("fingerprint") == fingerprint:
+        forecast = pd.DataFrame(entry["prediction"])
+        forecast['ds'] = pd.to_datetime(forecast['ds'])
+        loaded = time.perf_counter()
+        scores = entry.get("backtest") if backtest else None
+        if backtest and "backtest" not in entry:
+            # Cached by a request that did not score Prophet
+            scores = _prophet_backtest(daily_sales, forecast_days, settings)
+            model_cache.put(*cache_key, {**entry, "backtest": scores})
+        timings = {
+            "fit_ms": 0.0,
+            "predict_ms": round((loaded - started) * 1000, 1),
+            "backtest_ms": round((time.perf_counter() - loaded) * 1000, 1),
+            "cache": CACHE_HIT,
+        }
+        return forecast, timings, scores
+
+    init = _prophet_warm_start(entry) if entry and series_extends(entry, daily_sales) else None
+
+    np.random.seed(42)
+    model = _new_prophet(interval_width, settings)
+
+    import logging as py_logging
+    py_logging.getLogger('prophet').setLevel(py_logging.ERROR)
+
+    fit_kwargs = {"iter": settings["max_iter"]} if settings["max_iter"] else {}
+    try:
+        model.fit(daily_sales, **fit_kwargs, **({"init": init} if init else {}))
+    except Exception as warm_error:
+        if init is None:
+            raise
+        logger.warning(f"⚠️ Warm start failed ({warm_error}), refitting from scratch")
+        init = None
+        np.random.seed(42)
+        model = _new_prophet(interval_width, settings)
+        model.fit(daily_sales, **fit_kwargs)
+    fitted = time.perf_counter()
+
+    last_date = daily_sales['ds'].max()
+    if settings["future_only"]:
+        future = pd.DataFrame({
+            'ds': pd.date_range(last_date + pd.Timedelta(days=1), periods=forecast_days, freq='D')
+        })
+    else:
+        future = model.make_future_dataframe(periods=forecast_days, freq='D')
+
+    forecast = model.predict(future)
+    forecast = forecast[forecast['ds'] > last_date].reset_index(drop=True)
+
+    if 'yhat_lower' not in forecast.columns:
+        # Analytic interval: fitted observation noise (sigma_obs, in y_scale units)
+        z = NormalDist().inv_cdf(0.5 + interval_width / 2)
+        half_width = z * float(np.ravel(model.params['sigma_obs'])[0]) * model.y_scale
+        forecast['yhat_lower'] = forecast['yhat'] - half_width
+        forecast['yhat_upper'] = forecast['yhat'] + half_width
+
+    forecast = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+    finished = time.perf_counter()
+
+    scores = _prophet_backtest(daily_sales, forecast_days, settings) if backtest else None
+    scored = time.perf_counter()
+
+    if cache_key:
+        model_cache.put(*cache_key, {
+            "fingerprint": fingerprint,
+            "model": model_to_json(model),
+            "init": _prophet_init(model),
+            "series": {
+                "start": str(pd.Timestamp(daily_sales['ds'].iloc[0]).date()),
+                "y": daily_sales['y'].astype(float).tolist(),
+            },
+            "prediction": {
+                "ds": forecast['ds'].dt.strftime('%Y-%m-%d').tolist(),
+                "yhat": forecast['yhat'].tolist(),
+                "yhat_lower": forecast['yhat_lower'].tolist(),
+                "yhat_upper": forecast['yhat_upper'].tolist(),
+            },
+            **({"backtest": scores} if backtest else {}),
+        })
+
+    timings = {
+        "fit_ms": round((fitted - started) * 1000, 1),
+        "predict_ms": round((finished - fitted) * 1000, 1),
+        "backtest_ms": round((scored - finished) * 1000, 1),
+        "cache": (CACHE_WARM if init else CACHE_MISS) if cache_key else None,
+    }
+    return forecast, timings, scores
+
+
+def _clamp_intervals(forecast: pd.DataFrame, hist_max: float, q25: float, q75: float) -> tuple:
+    """
+    Prediction and CI per future day, clamped to the SKU's history:
+    prediction <= 1.5x the best day, CI within the non-zero quartiles and
+    60-140% of the prediction, and always around it.
+    """
+    predicted = np.maximum(forecast['yhat'].to_numpy(), 0)
+    prophet_lower = forecast['yhat_lower'].to_numpy()
+    prophet_upper = forecast['yhat_upper'].to_numpy()
+
+    predicted = np.minimum(predicted, hist_max * 1.5)
+
+    lower_ci = np.maximum(
+        np.round(np.maximum(prophet_lower, q25 * 0.8)),
+        np.round(predicted * 0.6)
+    )
+    upper_ci = np.minimum(
+        np.round(np.minimum(prophet_upper, q75 * 1.5)),
+        np.round(predicted * 1.4)
+    )
+
+    lower_ci = np.where(lower_ci >= predicted, np.round(predicted * 0.8), lower_ci)
+    upper_ci = np.where(upper_ci <= predicted, np.round(predicted * 1.2), upper_ci)
+
+    return (
+        np.round(predicted).astype(np.int64),
+        lower_ci.astype(np.int64),
+        upper_ci.astype(np.int64),
+    )
+
+
+def forecast_product(row_dict, daily_sales, sku_col, item_col,
+                     filter_from_date, filter_to_date, forecast_days,
+                     profile: str = None, tenant: str = None, backtest: bool = False):
+    """
+    Prophet forecast for one SKU from its zero-filled daily history
+    (ds, y), as built by batch_forecast_service.DemandMatrix.daily_series.
+    Short-history and intermittent SKUs are forecast in batch instead.
+    profile: key of PROPHET_PROFILES (default PROPHET_PROFILE).
+    tenant: enables the model cache for (tenant, SKU); the outcome is
+    reported as 'model_cache' (hit / warm / miss) in the result.
+    backtest: also fit Prophet on the latest tournament fold for 'accuracy'
+    (one more fit; the route asks for it on tournament-escalated SKUs).
+
+    Returns the forecast dict, or None when no forecast can be made.
+    """
+    profile = profile or PROPHET_PROFILE
+    try:
+        sku = normalize_sku(row_dict[sku_col])
+        item_name = str(row_dict[item_col]).strip()
+
+        if daily_sales is None or daily_sales.empty:
+            return None
+
+        # Data quality assessment
+        confidence_width = 0.75  # fixed stable confidence
+
+        future_forecast, timings, scores = _fit_predict_prophet(
+            daily_sales, forecast_days, confidence_width, profile,
+            cache_key=(tenant, sku) if tenant else None, backtest=backtest
+        )
+
+        # ------------------------------------------------------------------
+        # LIGHTWEIGHT ACCURACY ESTIMATION
+        confidence_label = "medium"
+
+        if future_forecast.empty:
+            logger.warning(f"⚠️ {item_name}: No full future forecast generated")
+            return None
+
+        hist_max = daily_sales['y'].max()
+        hist_mean = daily_sales['y'].mean()
+
+        q25 = q75 = 0.0
+        non_zero_sales = daily_sales[daily_sales['y'] > 0]['y'].values
+        if len(non_zero_sales) > 0:
+            q25 = np.percentile(non_zero_sales, 25)
+            q75 = np.percentile(non_zero_sales, 75)
+
+        forecast_variance = ((q75 - q25) / 2) / (hist_mean + 1) if hist_mean > 0 else 0.5
+
+        forecast_variance = safe_number(forecast_variance, 0.0)
+        hist_mean = safe_number(hist_mean, 0.0)
+        q25 = safe_number(q25, 0.0)
+        q75 = safe_number(q75, 0.0)
+
+        # ✅ One vectorized CI clamp over the horizon; the date filter only masks it
+        predicted, lower_ci, upper_ci = _clamp_intervals(future_forecast, hist_max, q25, q75)
+
+        keep = np.ones(len(future_forecast), dtype=bool)
+        if filter_from_date:
+            keep &= (future_forecast['ds'] >= pd.to_datetime(filter_from_date)).to_numpy()
+        if filter_to_date:
+            keep &= (future_forecast['ds'] <= pd.to_datetime(filter_to_date)).to_numpy()
+
+        forecast_data = [
+            {
+                'date': date,
+                'predicted_units': p,
+                'lower_ci': lo,
+                'upper_ci': up,
+                'confidence': float(confidence_width),
+            }
+            for date, p, lo, up in zip(
+                future_forecast['ds'][keep].dt.strftime('%Y-%m-%d').tolist(),
+                predicted[keep].tolist(), lower_ci[keep].tolist(), upper_ci[keep].tolist(),
+            )
+        ]
+
+        logger.debug(
+            f"Prophet {sku} ({profile}): fit {timings['fit_ms']} ms, predict {timings['predict_ms']} ms"
+        )
+
+        product_volume = safe_number(hist_mean, 0.0)
+        if scores:
+            accuracy_notes = 'Prophet scored on the latest rolling-origin backtest fold.'
+        elif backtest:
+            accuracy_notes = 'History too short for a backtest fold.'
+        else:
+            accuracy_notes = 'Prophet not backtested for this SKU.'
+        scores = scores or {"wape": None, "mae": None, "days": 0}
+
+        if forecast_variance < 0.15 and product_volume > 100:
+            risk_category = "GREEN"
+            business_recommendation = "Stock at forecast + 5%. Stable product, low risk."
+        elif forecast_variance < 0.35 and product_volume > 20:
+            risk_category = "YELLOW"
+            business_recommendation = "Stock at forecast + safety stock (15%). Monitor weekly."
+        else:
+            risk_category = "RED"
+            business_recommendation = "Stock conservatively. High volatility detected. Monitor daily."
+
+        result = {
+            'sku': sku,
+            'itemname': item_name,
+            'item_name': item_name,
+            'forecast': forecast_data,
+            'stock_recommendation': int(round(hist_mean * 1.15)),
+            'expected_daily_range': f"{int(round(q25))}-{int(round(q75))} units",
+            'risk_category': risk_category,
+            'why_stock_this': f"Based on {len(daily_sales)} days: sales range {int(q25)}-{int(round(q75))} units.",
+            'confidence': confidence_label,
+            'accuracy': wape_accuracy(scores["wape"]),
+            'accuracy_details': wape_accuracy_details(
+                scores["wape"], scores["mae"], scores["days"], len(daily_sales), accuracy_notes
+            ),
+            'model': 'Prophet (Retail Optimized)',
+            'training_days': len(daily_sales),
+            'confidence_interval': f"{int(confidence_width * 100)}%",
+            'variance_ratio': 0.3,
+            'business_recommendation': business_recommendation,
+            'forecast_notes': f'Trained on {len(daily_sales)} days of history.',
+            'explanation': {
+                'avg_daily_sales': round(hist_mean, 2),
+                'data_points_used': len(daily_sales),
+                'recent_trend': (
+                    'increasing'
+                    if daily_sales['y'].tail(7).mean() > daily_sales['y'].head(7).mean()
+                    else 'stable'
+                ),
+            },
+        }
+        if timings["cache"]:
+            result['model_cache'] = timings["cache"]
+        return result
+
+    except Exception as model_error:
+        logger.error(f"Forecast error for row: {row_dict}")
+        logger.error(str(model_error))
+        return None
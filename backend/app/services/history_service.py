@@ -0,0 +1,108 @@
+import numpy as np
+
+from app.services.schema_service import normalize_sku
+
+# ============================================================================
+# HISTORICAL SUMMARY - one row per sales day for the dashboard history chart
+# Daily totals and per-day item sales come from the request's SalesCube
+# (see sales_cube_service); one stable sort then ranks every day's items at
+# once. Cost is linear in cells (plus the sort), independent of how many
+# days the upload spans.
+# ============================================================================
+
+HISTORY_TOP_ITEMS = 5               # top sellers listed per day
+HISTORY_TREND_PCT = 5               # day-over-day growth above +/- this: up / down
+HISTORICAL_RAW_ROWS = 1000          # (date, sku, item, store) rows in historical_raw
+
+
+def _top_items_by_day(cube) -> dict:
+    """{day: [{name, sku, sales}]}, best sellers first; ties keep (sku, item) order."""
+    c = cube.columns
+    items = cube.day_items()
+    item_days = items[c["date"]].to_numpy()
+    sales = items["quantity"].to_numpy()
+
+    # Rows are sorted by (day, sku, item): a stable sort on (day, -sales)
+    # keeps that order among equal sales, like nlargest(keep="first")
+    order = np.lexsort((-sales, item_days.astype(np.int64)))
+    ranked_days = item_days[order]
+    first = np.flatnonzero(np.r_[True, ranked_days[1:] != ranked_days[:-1]]) if len(order) else order
+    rank = np.arange(len(order)) - np.repeat(first, np.diff(np.append(first, len(order))))
+    ranked = items.iloc[order[rank < HISTORY_TOP_ITEMS]]
+
+    top_items = {}
+    for item_day, sku, name, quantity in zip(
+        ranked[c["date"]].to_numpy(), ranked[c["sku"]].to_numpy(),
+        ranked[c["item"]].to_numpy(), ranked["quantity"].to_numpy(dtype=float)
+    ):
+        top_items.setdefault(item_day, []).append({
+            'name': str(name).strip(),
+            'sku': str(sku).strip(),
+            'sales': int(quantity),
+        })
+    return top_items
+
+
+def historical_summary(cube) -> list:
+    """
+    Daily totals, transaction counts (raw lines when the frame is a rollup
+    with line_count), top items (when item and SKU columns exist) and the
+    growth / trend against the previous sales day.
+    """
+    daily = cube.daily
+    if daily.empty:
+        return []
+
+    top_items = _top_items_by_day(cube) if cube.pairs is not None else {}
+
+    # Growth vs the previous sales day (only when it sold something)
+    totals = daily['quantity'].to_numpy(dtype=float)
+    previous = np.concatenate(([np.nan], totals[:-1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(previous > 0, (totals - previous) / previous * 100, np.nan)
+    trend = np.select(
+        [growth > HISTORY_TREND_PCT, growth < -HISTORY_TREND_PCT], ['up', 'down'], default='neutral'
+    )
+
+    dates = daily.index
+    historical_data = []
+    for i, (period_date, iso_date, display_date) in enumerate(zip(
+        dates.to_numpy(), dates.strftime('%Y-%m-%d'), dates.strftime('%b %d, %Y')
+    )):
+        items = top_items.get(period_date, [])
+        transaction_count = int(daily['lines'].iat[i])
+        historical_data.append({
+            'date': iso_date,
+            'displayDate': display_date,
+            'totalSales': float(totals[i]),
+            'totalQuantity': transaction_count,
+            'topItems': items,
+            'itemCount': len(items),
+            'transactionCount': transaction_count,
+            'trend': str(trend[i]),
+            'growthRate': round(float(growth[i]), 2) if not np.isnan(growth[i]) else 0.0,
+        })
+
+    return historical_data
+
+
+def historical_raw(cube, limit: int = HISTORICAL_RAW_ROWS) -> list:
+    """Units per (date, sku, item, store) cell in key order, the first `limit` cells."""
+    c = cube.columns
+    cells = cube.cells.iloc[:limit]
+    index = cells.index
+    stores = index.get_level_values(c["store"]) if c["store"] else [""] * len(cells)
+
+    return [
+        {
+            "date": date.strftime("%Y-%m-%d"),
+            "sku": normalize_sku(sku),
+            "item_name": str(item).strip(),
+            "store": str(store).strip(),
+            "units_sold": float(quantity),
+        }
+        for date, sku, item, store, quantity in zip(
+            index.get_level_values(c["date"]), index.get_level_values(c["sku"]),
+            index.get_level_values(c["item"]), stores, cells["quantity"].to_numpy(),
+        )
+    ]
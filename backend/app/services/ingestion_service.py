@@ -0,0 +1,754 @@
+import pandas as pd
+import numpy as np
+import gzip
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from io import BytesIO
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from app.services.date_parsing_service import infer_date_format, merge_date_reports
+from app.services.schema_service import (
+    _clean_raw_columns,
+    _detect_schema_columns,
+    _standardize_col_key,
+    normalize_csv_columns,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional; read_csv_upload falls back to pandas
+    pa = None
+    pa_csv = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; .zst uploads are rejected without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# ARROW CSV ENGINE - sniff schema on a sample, then parse once with types
+# ============================================================================
+
+CSV_SNIFF_ROWS = 2_000
+
+IDENTIFIER_TARGETS = {"sku", "itemname", "store", "invoice_id"}
+NUMERIC_TARGETS = {"quantity", "unit_price", "unit_cost", "line_revenue", "current_stock"}
+
+
+def sniff_csv_hints(file_bytes: bytes) -> Optional[dict]:
+    """
+    Run schema detection on the header + first CSV_SNIFF_ROWS rows.
+
+    Returns parse hints consumed by read_csv_upload / normalize_csv_columns:
+    - schema: (schema_map, confidence_report) as _detect_schema_columns
+    - date_format: winning explicit date format for the sample, or None
+    - column_types: original header -> "string" | "int64" | "float64"
+    """
+    sample = pd.read_csv(BytesIO(file_bytes), nrows=CSV_SNIFF_ROWS)
+    if sample.empty:
+        return None
+
+    cleaned = _clean_raw_columns(sample)
+    if cleaned.empty:
+        return None
+
+    schema_map, confidence_report = _detect_schema_columns(cleaned)
+    if not schema_map:
+        return None
+
+    clean_to_original = {}
+    for col in sample.columns:
+        clean_to_original.setdefault(_standardize_col_key(col), col)
+
+    column_types = {}
+    date_format = None
+
+    for clean_col, target in schema_map.items():
+        original = clean_to_original.get(clean_col)
+        if original is None:
+            continue
+
+        if target == "date":
+            column_types[original] = "string"
+            date_format = infer_date_format(cleaned[clean_col])
+        elif target in IDENTIFIER_TARGETS:
+            column_types[original] = "string"
+        elif target in NUMERIC_TARGETS:
+            # Clean numbers parse natively; "₹1,234" style values stay text
+            # and are cleaned once in normalize_csv_columns.
+            sample_col = cleaned[clean_col]
+            if pd.api.types.is_integer_dtype(sample_col):
+                column_types[original] = "int64"
+            elif pd.api.types.is_numeric_dtype(sample_col):
+                column_types[original] = "float64"
+            else:
+                column_types[original] = "string"
+
+    return {
+        "schema": (schema_map, confidence_report),
+        "date_format": date_format,
+        "column_types": column_types,
+    }
+
+
+def _read_csv_pyarrow(source, column_types: dict) -> pd.DataFrame:
+    """source: CSV bytes or a binary stream (read block by block)."""
+    arrow_type_map = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string()}
+    arrow_types = {col: arrow_type_map[kind] for col, kind in column_types.items()}
+    table = pa_csv.read_csv(
+        pa.BufferReader(source) if isinstance(source, bytes) else source,
+        convert_options=pa_csv.ConvertOptions(
+            column_types=arrow_types,
+            strings_can_be_null=True,
+        ),
+    )
+    return table.to_pandas()
+
+
+def read_csv_upload(file_bytes: bytes, engine: str = "auto") -> pd.DataFrame:
+    """
+    Parse an uploaded CSV.
+
+    engine:
+    - "auto": sniff + typed pyarrow parse, falling back to pandas on any
+      Arrow error (e.g. a numeric column turns dirty past the sample)
+    - "pyarrow": same, but errors are raised
+    - "c": plain pandas reader, no sniffing (previous behaviour)
+
+    Sniffed hints are attached as df.attrs["parse_hints"] so
+    normalize_csv_columns can skip a second detection pass.
+    """
+    if engine == "c":
+        return pd.read_csv(BytesIO(file_bytes))
+
+    return _parse_csv(lambda: nullcontext(BytesIO(file_bytes)), sniff_csv_hints(file_bytes), engine,
+                      arrow_source=file_bytes)
+
+
+def read_csv_stream(open_stream: Callable, engine: str = "auto") -> pd.DataFrame:
+    """
+    read_csv_upload for a forward-only binary stream (e.g. a decompressor)
+    without reading it whole. open_stream() returns a context manager for
+    a fresh stream: one for the sniffed header + CSV_SNIFF_ROWS lines, one
+    fed straight into the parser (and one more for the pandas fallback).
+    """
+    if engine == "c":
+        with open_stream() as stream:
+            return pd.read_csv(stream)
+
+    with open_stream() as stream:
+        head = b"".join(islice(stream, CSV_SNIFF_ROWS + 1))
+    try:
+        hints = sniff_csv_hints(head)
+    except pd.errors.ParserError:
+        # The sample cut a quoted multi-line field; parse without hints
+        hints = None
+    return _parse_csv(open_stream, hints, engine)
+
+
+def _parse_csv(open_stream: Callable, hints: Optional[dict], engine: str, arrow_source: bytes = None) -> pd.DataFrame:
+    """Typed Arrow parse with the pandas fallback (see read_csv_upload)."""
+    if hints and pa_csv is not None:
+        try:
+            if arrow_source is not None:
+                df = _read_csv_pyarrow(arrow_source, hints["column_types"])
+            else:
+                with open_stream() as stream:
+                    df = _read_csv_pyarrow(stream, hints["column_types"])
+            df.attrs["parse_hints"] = hints
+            return df
+        except DecompressionLimitError:
+            raise
+        except Exception as arrow_error:
+            if engine == "pyarrow":
+                raise
+            logger.warning(f"⚠️ Arrow CSV parse failed, using pandas reader: {arrow_error}")
+    elif engine == "pyarrow":
+        raise ValueError("pyarrow engine unavailable for this file")
+
+    string_columns = {
+        col: str for col, kind in (hints or {}).get("column_types", {}).items()
+        if kind == "string"
+    }
+    with open_stream() as stream:
+        df = pd.read_csv(stream, dtype=string_columns or None)
+    if hints:
+        df.attrs["parse_hints"] = hints
+    return df
+
+
+# ============================================================================
+# STREAMING INGESTION - chunked CSV reading + running daily aggregates
+# ============================================================================
+
+INGEST_CHUNK_ROWS = 200_000          # raw rows parsed per chunk
+ROLLUP_COMPACT_ROWS = 1_000_000      # partial aggregate rows before re-folding
+
+ROLLUP_KEYS = ["date", "sku", "itemname", "store"]
+
+# How each measure is combined when rows (or partial aggregates) are folded.
+# Summed measures stay additive across chunks; "last" measures keep the most
+# recent observation, matching how stock / price are read elsewhere.
+# invoice_count is distinct invoices per row; summed across chunks it is
+# exact unless one invoice's lines for the same SKU-day straddle a chunk.
+ROLLUP_SUM_COLUMNS = ["quantity", "line_revenue", "line_count", "invoice_count"]
+ROLLUP_LAST_COLUMNS = ["unit_price", "unit_cost", "current_stock"]
+
+INVOICE_NULL_VALUES = {"": np.nan, "NAN": np.nan, "NONE": np.nan, "NULL": np.nan}
+
+
+def iter_csv_chunks(fileobj, chunk_rows: int = INGEST_CHUNK_ROWS,
+                    rewind: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    Yield raw DataFrame chunks from a file-like object without reading it whole.
+    rewind=False for forward-only streams (decompressors).
+    """
+    if rewind and hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+
+    reader = pd.read_csv(fileobj, chunksize=chunk_rows)
+    for chunk in reader:
+        if not chunk.empty:
+            yield chunk
+
+
+def _rollup_agg_spec(columns) -> dict:
+    spec = {}
+    for col in ROLLUP_SUM_COLUMNS:
+        if col in columns:
+            spec[col] = "sum"
+    for col in ROLLUP_LAST_COLUMNS:
+        if col in columns:
+            spec[col] = "last"
+    return spec
+
+
+def _fold(frame: pd.DataFrame) -> pd.DataFrame:
+    spec = _rollup_agg_spec(frame.columns)
+    return (
+        frame
+        .groupby(ROLLUP_KEYS, dropna=False, sort=False, observed=True)
+        .agg(spec)
+        .reset_index()
+    )
+
+
+def rollup_sales_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapse normalized line items to one row per (date, sku, itemname, store).
+
+    Expects the output of normalize_csv_columns. Dates are truncated to the
+    day; line_count records how many raw lines each row represents and
+    invoice_count how many distinct invoices (when invoice_id exists).
+    """
+    keep = ROLLUP_KEYS + [
+        c for c in ROLLUP_SUM_COLUMNS + ROLLUP_LAST_COLUMNS
+        if c in df.columns and c not in ("line_count", "invoice_count")
+    ]
+    frame = df[keep].copy()
+    frame["date"] = frame["date"].dt.normalize()
+    frame["line_count"] = 1
+
+    if "invoice_id" in df.columns:
+        # 1 on the first line of each (row key, invoice) pair -> summing
+        # gives distinct invoices per key without a nunique groupby
+        invoice_keys = frame[ROLLUP_KEYS].assign(invoice_id=df["invoice_id"].to_numpy())
+        first_line = ~invoice_keys.duplicated() & invoice_keys["invoice_id"].notna().to_numpy()
+        frame["invoice_count"] = first_line.astype(np.int64)
+
+    return _fold(frame)
+
+
+def rollup_invoices(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    Per-invoice revenue / units / first date for a normalized chunk.
+    Returns None when the chunk carries no usable invoice ids.
+    """
+    if "invoice_id" not in df.columns:
+        return None
+
+    invoice_ids = df["invoice_id"].astype(str).str.strip().str.upper().replace(INVOICE_NULL_VALUES)
+    if not invoice_ids.notna().any():
+        return None
+
+    revenue = (
+        pd.to_numeric(df["line_revenue"], errors="coerce").fillna(0)
+        if "line_revenue" in df.columns
+        else pd.Series(0.0, index=df.index)
+    )
+
+    frame = pd.DataFrame({
+        "invoice_id": invoice_ids,
+        "transaction_revenue": revenue,
+        "transaction_units": pd.to_numeric(df["quantity"], errors="coerce").fillna(0),
+        "transaction_date": df["date"],
+    }).dropna(subset=["invoice_id"])
+
+    return _fold_invoices(frame)
+
+
+def _fold_invoices(frame: pd.DataFrame) -> pd.DataFrame:
+    return (
+        frame
+        .groupby("invoice_id", sort=False)
+        .agg(
+            transaction_revenue=("transaction_revenue", "sum"),
+            transaction_units=("transaction_units", "sum"),
+            transaction_date=("transaction_date", "min"),
+        )
+        .reset_index()
+    )
+
+
+class SalesRollupAccumulator:
+    """
+    Folds normalized chunks into running daily (date, sku, store) aggregates.
+
+    Partial results are re-folded once they exceed ROLLUP_COMPACT_ROWS, so
+    peak memory tracks the number of distinct SKU-days (plus one chunk),
+    not the number of raw rows in the upload.
+    """
+
+    def __init__(self, compact_rows: int = ROLLUP_COMPACT_ROWS):
+        self.compact_rows = compact_rows
+        self._parts = []
+        self._pending_rows = 0
+        self._invoice_parts = []
+        self._invoice_pending_rows = 0
+        self.raw_rows = 0
+        self.chunks = 0
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        if chunk is None or chunk.empty:
+            return
+
+        self.raw_rows += len(chunk)
+        self.chunks += 1
+
+        part = rollup_sales_frame(chunk)
+        self._parts.append(part)
+        self._pending_rows += len(part)
+
+        invoices = rollup_invoices(chunk)
+        if invoices is not None:
+            self._invoice_parts.append(invoices)
+            self._invoice_pending_rows += len(invoices)
+
+        if self._pending_rows > self.compact_rows:
+            self._compact()
+
+        if self._invoice_pending_rows > self.compact_rows:
+            self._compact_invoices()
+
+    def add_rollup(self, daily: pd.DataFrame, invoices: Optional[pd.DataFrame],
+                   raw_rows: int, chunks: int) -> None:
+        """Merge an already-folded rollup (e.g. one Excel sheet from a worker)."""
+        self.raw_rows += raw_rows
+        self.chunks += chunks
+
+        self._parts.append(daily)
+        self._pending_rows += len(daily)
+
+        if invoices is not None:
+            self._invoice_parts.append(invoices)
+            self._invoice_pending_rows += len(invoices)
+
+        if self._pending_rows > self.compact_rows:
+            self._compact()
+
+        if self._invoice_pending_rows > self.compact_rows:
+            self._compact_invoices()
+
+    def _compact(self) -> None:
+        if len(self._parts) > 1:
+            self._parts = [_fold(pd.concat(self._parts, ignore_index=True))]
+        self._pending_rows = sum(len(p) for p in self._parts)
+
+    def _compact_invoices(self) -> None:
+        if len(self._invoice_parts) > 1:
+            self._invoice_parts = [_fold_invoices(pd.concat(self._invoice_parts, ignore_index=True))]
+        self._invoice_pending_rows = sum(len(p) for p in self._invoice_parts)
+
+    def result(self) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+        """
+        Returns (daily_rollup, invoice_summary). invoice_summary is None
+        when the upload had no invoice column.
+        """
+        if not self._parts:
+            raise ValueError("No valid sales rows found in upload")
+
+        self._compact()
+        daily = self._parts[0].sort_values("date").reset_index(drop=True)
+
+        invoice_summary = None
+        if self._invoice_parts:
+            self._compact_invoices()
+            invoice_summary = self._invoice_parts[0]
+
+        return daily, invoice_summary
+
+    def stats(self) -> dict:
+        return {
+            "raw_rows": int(self.raw_rows),
+            "chunks": int(self.chunks),
+            "rollup_rows": int(sum(len(p) for p in self._parts)),
+            "invoice_rows": int(sum(len(p) for p in self._invoice_parts)),
+        }
+
+
+def fold_normalized_chunks(chunks: Iterable[pd.DataFrame], store_tag: str = None) -> tuple:
+    """
+    Normalize raw chunks and fold them into a SalesRollupAccumulator.
+
+    Schema is detected on the first chunk and reused for every following
+    chunk; chunks that no longer match it are skipped. store_tag fills the
+    store column when the source has no store column of its own.
+
+    Returns (accumulator, schema_or_None, skipped_chunks, date_reports).
+    """
+    accumulator = SalesRollupAccumulator()
+    schema = None
+    skipped_chunks = 0
+    date_reports = []
+
+    for chunk in chunks:
+        if schema is None:
+            normalized = normalize_csv_columns(chunk)
+            schema = (
+                normalized.attrs["column_schema_map"],
+                normalized.attrs["column_detection_report"],
+            )
+        else:
+            try:
+                normalized = normalize_csv_columns(chunk, schema=schema)
+            except ValueError as chunk_error:
+                skipped_chunks += 1
+                logger.warning(f"⚠️ Skipping chunk {accumulator.chunks + skipped_chunks}: {chunk_error}")
+                continue
+
+        if store_tag is not None and "store" not in schema[0].values():
+            normalized["store"] = store_tag
+
+        date_reports.append(normalized.attrs.get("date_parse_report"))
+        accumulator.add(normalized)
+
+    return accumulator, schema, skipped_chunks, date_reports
+
+
+# ============================================================================
+# EXCEL STREAMING - read-only row iteration, one worker process per sheet
+# ============================================================================
+
+EXCEL_CHUNK_ROWS = 50_000
+EXCEL_MAX_WORKERS = 4
+
+
+def list_excel_sheets(path: str) -> list:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def iter_excel_chunks(path: str, sheet_name: str = None,
+                      chunk_rows: int = EXCEL_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Yield DataFrame chunks from one worksheet using openpyxl's read-only
+    row streaming; only chunk_rows rows are materialized at a time.
+    The first non-empty row is the header.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        header = None
+        buffer = []
+
+        for row in sheet.iter_rows(values_only=True):
+            if all(value is None or value == "" for value in row):
+                continue
+
+            if header is None:
+                header = [
+                    str(value).strip() if value is not None else f"Unnamed: {i}"
+                    for i, value in enumerate(row)
+                ]
+                continue
+
+            # Read-only rows can be ragged when the sheet has no dimension info
+            row = tuple(row[:len(header)]) + (None,) * (len(header) - len(row))
+            buffer.append(row)
+
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def _rollup_excel_sheet(path: str, sheet_name: str, store_tag: str = None) -> dict:
+    """
+    Worker: fold one sheet into daily aggregates (picklable result).
+    A sheet whose columns are not sales data (e.g. a summary tab) comes
+    back with no rows and the schema error as skipped.
+    """
+    result = {
+        "sheet": sheet_name,
+        "store": store_tag,
+        "schema": None,
+        "skipped_chunks": 0,
+        "date_parsing": {},
+        "raw_rows": 0,
+        "chunks": 0,
+        "daily": None,
+        "invoices": None,
+        "skipped": None,
+    }
+
+    try:
+        accumulator, schema, skipped_chunks, date_reports = fold_normalized_chunks(
+            iter_excel_chunks(path, sheet_name), store_tag=store_tag
+        )
+    except ValueError as sheet_error:
+        result["skipped"] = str(sheet_error)
+        return result
+
+    result.update({
+        "schema": schema,
+        "skipped_chunks": skipped_chunks,
+        "date_parsing": merge_date_reports(date_reports),
+        "raw_rows": accumulator.raw_rows,
+        "chunks": accumulator.chunks,
+    })
+
+    if accumulator.chunks:
+        result["daily"], result["invoices"] = accumulator.result()
+
+    return result
+
+
+def rollup_excel_workbook(path: str, max_workers: int = EXCEL_MAX_WORKERS) -> tuple:
+    """
+    Stream every sheet of an .xlsx workbook into one daily rollup.
+
+    Multi-sheet workbooks are read in parallel worker processes and each
+    sheet name becomes the store value (unless the sheet has its own store
+    column). Returns (daily_rollup_df, invoice_summary_df_or_None, stats).
+    """
+    sheets = list_excel_sheets(path)
+    if not sheets:
+        raise ValueError("Workbook has no sheets")
+
+    multi_sheet = len(sheets) > 1
+    jobs = [(path, sheet, sheet.strip() if multi_sheet else None) for sheet in sheets]
+    workers = min(len(jobs), max_workers, os.cpu_count() or 1)
+
+    if workers > 1:
+        # spawn: forking would copy the server process (event loop, forecast
+        # pool threads, job runner) into every worker
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            sheet_results = list(executor.map(_rollup_excel_sheet, *zip(*jobs)))
+    else:
+        sheet_results = [_rollup_excel_sheet(*job) for job in jobs]
+
+    accumulator = SalesRollupAccumulator()
+    schema = None
+    for sheet_result in sheet_results:
+        if sheet_result["daily"] is None:
+            continue
+        schema = schema or sheet_result["schema"]
+        accumulator.add_rollup(
+            sheet_result["daily"],
+            sheet_result["invoices"],
+            sheet_result["raw_rows"],
+            sheet_result["chunks"],
+        )
+
+    for sheet_result in sheet_results:
+        if sheet_result["skipped"]:
+            logger.warning(f"⚠️ Skipping sheet '{sheet_result['sheet']}': {sheet_result['skipped']}")
+
+    if schema is None:
+        skipped = [r["skipped"] for r in sheet_results if r["skipped"]]
+        raise ValueError(skipped[0] if skipped else "Uploaded file is empty")
+
+    daily, invoice_summary = accumulator.result()
+    daily.attrs["column_schema_map"], daily.attrs["column_detection_report"] = schema
+
+    stats = {
+        "mode": "stream",
+        **accumulator.stats(),
+        "skipped_chunks": sum(r["skipped_chunks"] for r in sheet_results),
+        "date_parsing": merge_date_reports([r["date_parsing"] for r in sheet_results]),
+        "workers": workers,
+        "sheets": [
+            {"sheet": r["sheet"], "store": r["store"], "raw_rows": int(r["raw_rows"]),
+             **({"skipped": r["skipped"]} if r["skipped"] else {})}
+            for r in sheet_results
+        ],
+    }
+    return daily, invoice_summary, stats
+
+
+def rollup_excel_upload(fileobj) -> tuple:
+    """
+    Spool an uploaded workbook to a temp file (workers open it by path)
+    and stream it with rollup_excel_workbook.
+    """
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp)
+        path = tmp.name
+
+    try:
+        return rollup_excel_workbook(path)
+    finally:
+        os.remove(path)
+
+
+# ============================================================================
+# COMPRESSED UPLOADS - .csv.gz / .zip / .zst inflated as a stream
+# ============================================================================
+
+COMPRESSED_CSV_SUFFIXES = (".csv.gz", ".zip", ".zst")
+
+# Zip-bomb guard: inflated bytes allowed per uploaded (compressed) byte
+# (POS CSV exports compress ~8-10x), and at most MAX_INFLATED_MB per upload
+# whatever its size.
+MAX_DECOMPRESSION_RATIO = 100
+MAX_INFLATED_MB = int(os.getenv("MAX_INFLATED_MB", "8192"))
+
+
+class DecompressionLimitError(ValueError):
+    """A compressed upload inflates beyond the decompression limits."""
+
+
+def is_compressed_csv(filename: str) -> bool:
+    return filename.lower().endswith(COMPRESSED_CSV_SUFFIXES)
+
+
+class _BoundedReader(io.RawIOBase):
+    """Forward-only reader that fails once more than max_bytes were inflated."""
+
+    def __init__(self, stream, max_bytes: int, name: str):
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self._remaining = max_bytes
+        self._name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        self._remaining -= len(data)
+        if self._remaining < 0:
+            raise DecompressionLimitError(
+                f"{self._name} inflates beyond {self._max_bytes:,} bytes "
+                f"({MAX_DECOMPRESSION_RATIO}x its upload size, at most {MAX_INFLATED_MB} MB)"
+            )
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_csv_streams(fileobj, filename: str) -> Iterator[Tuple[str, io.BufferedReader]]:
+    """
+    Yield (member_name, binary_stream) for every CSV inside a compressed
+    upload. Streams decompress on read; nothing is inflated up front.
+    A .zip may hold several CSVs (macOS metadata entries are ignored).
+    """
+    fileobj.seek(0)
+    max_bytes = min(max(upload_size_bytes(fileobj), 1) * MAX_DECOMPRESSION_RATIO, MAX_INFLATED_MB * 1024 * 1024)
+    name = filename.lower()
+
+    if name.endswith(".gz"):
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as stream:
+            yield filename[:-3], io.BufferedReader(_BoundedReader(stream, max_bytes, filename))
+
+    elif name.endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and info.filename.lower().endswith(".csv")
+                and not info.filename.startswith("__MACOSX/")
+            ]
+            if not members:
+                raise ValueError("Zip archive contains no CSV files")
+
+            for info in members:
+                with archive.open(info) as stream:
+                    yield info.filename, io.BufferedReader(
+                        _BoundedReader(stream, max_bytes, info.filename)
+                    )
+                max_bytes -= info.file_size
+
+    elif name.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError(".zst uploads need the zstandard package")
+        with zstandard.ZstdDecompressor().stream_reader(fileobj) as stream:
+            yield filename[:-4], io.BufferedReader(_BoundedReader(stream, max_bytes, filename))
+
+    else:
+        raise ValueError(f"Unsupported compressed file: {filename}")
+
+
+def iter_compressed_csv_chunks(fileobj, filename: str,
+                               chunk_rows: int = INGEST_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Raw chunks of every CSV in a compressed upload, decompressed on the fly."""
+    for _, stream in open_csv_streams(fileobj, filename):
+        yield from iter_csv_chunks(stream, chunk_rows, rewind=False)
+
+
+@contextmanager
+def _open_csv_member(file_bytes: bytes, filename: str, index: int):
+    """Fresh decompressing stream of the index-th CSV in a compressed upload."""
+    streams = open_csv_streams(BytesIO(file_bytes), filename)
+    try:
+        yield next(islice(streams, index, None))[1]
+    finally:
+        streams.close()
+
+
+def read_compressed_csv(file_bytes: bytes, filename: str) -> pd.DataFrame:
+    """
+    Full (non-streaming) read of a compressed upload. Each member is
+    decompressed straight into read_csv_stream (never inflated whole);
+    several CSVs in one zip are concatenated.
+    """
+    members = [name for name, _ in open_csv_streams(BytesIO(file_bytes), filename)]
+    frames = [
+        read_csv_stream(partial(_open_csv_member, file_bytes, filename, index))
+        for index in range(len(members))
+    ]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def upload_size_bytes(fileobj) -> int:
+    """Size of a spooled upload without reading it into memory."""
+    position = fileobj.tell()
+    fileobj.seek(0, 2)
+    size = fileobj.tell()
+    fileobj.seek(position)
+    return size
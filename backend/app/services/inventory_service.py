@@ -0,0 +1,328 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.schema_service import normalize_sku
+
+# ============================================================================
+# INVENTORY RECOMMENDATIONS - columnar safety-stock kernel
+# One row per product of product_stats. Price / cost / stock / lead-time
+# lookups and the forecast aggregates (7 / 15-day totals, CI spread over the
+# lead time) become arrays once; z-scores, safety stock, caps, reorder points
+# and financials are computed for every product at once. Rows turn into
+# dicts only when the response is built.
+# ============================================================================
+
+SERVICE_LEVEL_Z = {"CRITICAL": 2.05, "HIGH": 1.65, "MEDIUM": 1.28}   # ~98% / ~95% / ~90%
+DEFAULT_SERVICE_LEVEL_Z = 0.84                                        # ~80%
+DEFAULT_UNIT_COST = 100.0
+DEFAULT_UNIT_PRICE = 150.0
+DEFAULT_LEAD_TIME_DAYS = 3
+LEAD_TIME_STD_PCT = 0.3             # lead time variability when unknown (min 1 day)
+SAFETY_STOCK_CAP_DAYS = 5           # safety stock at most 5 days of demand ...
+SAFETY_STOCK_FLOOR_DAYS = 0.5       # ... and at least half a day (min 1 unit)
+SHORT_HORIZON_DAYS = 7
+LONG_HORIZON_DAYS = 15
+STOCKOUT_RISK_DAYS = ((2, "CRITICAL"), (5, "HIGH"), (10, "MEDIUM"))   # days remaining <= : risk, else LOW
+STOCKOUT_LOSS_DAYS = 7              # lost sales counted for SKUs already out of stock
+SAFETY_STOCK_METHOD = "Z-score + demand variability + lead time variability"
+
+
+def _lookup(skus: list, mapping: Optional[dict]) -> tuple:
+    """(present bool, numeric float64 with NaN for missing / None / non-numeric)."""
+    if not mapping:
+        return np.zeros(len(skus), dtype=bool), np.full(len(skus), np.nan)
+    present = np.fromiter((sku in mapping for sku in skus), dtype=bool, count=len(skus))
+    values = pd.to_numeric(pd.Series([mapping.get(sku) for sku in skus], dtype=object), errors="coerce")
+    return present, values.to_numpy(dtype=float)
+
+
+def round_half_even(values: np.ndarray, digits: int) -> list:
+    """
+    [round(v, digits) for v in values] without a Python call per value.
+    np.round scales by 10**digits first, which can tip values sitting on a
+    half-way point; only those go through round().
+    """
+    values = np.asarray(values, dtype=float)
+    scaled = values * 10.0 ** digits
+    rounded = np.round(values, digits).tolist()
+    with np.errstate(invalid="ignore"):
+        near_half = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) <= 1e-9 * np.maximum(1.0, np.abs(scaled))
+    for i in np.flatnonzero(near_half).tolist():
+        rounded[i] = round(float(values[i]), digits)
+    return rounded
+
+
+def forecast_aggregates(forecasts_list: Optional[list], skus: list, lead_times: np.ndarray) -> dict:
+    """
+    Per product: has_forecast, total_7 / total_15 (predicted units over the
+    first 7 / 15 forecast days) and lead_spread (mean upper - lower CI
+    spread, floored at 0, over the first lead-time days). A SKU listed twice
+    uses its last forecast; days are taken in date order.
+    """
+    n = len(skus)
+    result = {
+        "has_forecast": np.zeros(n, dtype=bool),
+        "total_7": np.full(n, np.nan),
+        "total_15": np.full(n, np.nan),
+        "lead_spread": np.zeros(n),
+    }
+    if not forecasts_list or not n:
+        return result
+
+    forecast_rows = {normalize_sku(f["sku"]): i for i, f in enumerate(forecasts_list)}
+    rows = np.array([forecast_rows.get(sku, -1) for sku in skus], dtype=np.int64)
+    windows = np.maximum(1, lead_times)
+    horizon = max(LONG_HORIZON_DAYS, int(windows.max()))
+
+    # First `horizon` days of every forecast, zero padded
+    lengths = np.zeros(len(forecasts_list), dtype=np.int64)
+    predicted = np.zeros((len(forecasts_list), horizon))
+    spreads = np.zeros((len(forecasts_list), horizon))
+    for i in np.unique(rows[rows >= 0]):
+        forecast = forecasts_list[i]
+        days = forecast.get("forecast_full") or forecast.get("forecast") or []
+        days = sorted(days, key=lambda day: day.get("date", ""))[:horizon]
+        lengths[i] = len(days)
+        if days:
+            predicted[i, :len(days)] = [day.get("predicted_units", 0) for day in days]
+            spreads[i, :len(days)] = [
+                float(day.get("upper_ci", 0)) - float(day.get("lower_ci", 0)) for day in days
+            ]
+    spreads = np.where(spreads > 0, spreads, 0.0)
+
+    has_forecast = rows >= 0
+    has_forecast[has_forecast] = lengths[rows[has_forecast]] > 0
+    forecast_rows = rows[has_forecast]
+    # cumsum adds day by day, like the sequential sums it replaces
+    totals = np.cumsum(predicted[forecast_rows], axis=1)
+    result["has_forecast"] = has_forecast
+    result["total_7"][has_forecast] = totals[:, SHORT_HORIZON_DAYS - 1]
+    result["total_15"][has_forecast] = totals[:, LONG_HORIZON_DAYS - 1]
+
+    # Mean spread over min(lead window, forecast days), one reduction per window length
+    spans = np.minimum(windows[has_forecast], lengths[forecast_rows])
+    lead_spread = np.zeros(len(forecast_rows))
+    for span in np.unique(spans):
+        members = spans == span
+        lead_spread[members] = np.ascontiguousarray(spreads[forecast_rows[members], :span]).mean(axis=1)
+    result["lead_spread"][has_forecast] = lead_spread
+    return result
+
+
+def recommendation_arrays(product_stats: pd.DataFrame, forecasts_list: list = None,
+                          unit_cost_dict: dict = None, unit_price_dict: dict = None,
+                          current_stock_dict: dict = None, lead_time_dict: dict = None) -> dict:
+    """
+    The kernel: per-product columns (skus, lead_times, unit_cost / price,
+    safety_stock, recommended_stock_7 / 15_days, reorder_point, financials,
+    current stock fields) for product_stats (columns sku, daily_avg,
+    std_daily, priority_category, csv_unit_price), in row order.
+    """
+    codes, raw_skus = pd.factorize(product_stats["sku"], use_na_sentinel=False)
+    skus = np.array([normalize_sku(sku) for sku in raw_skus], dtype=object)[codes].tolist()
+    daily_avg = product_stats["daily_avg"].to_numpy(dtype=float)
+    std_daily = product_stats["std_daily"].to_numpy(dtype=float)
+    priority = product_stats["priority_category"].to_numpy(dtype=object)
+
+    # Pricing: dict values first (a listed SKU never falls back to the CSV price)
+    _, unit_cost = _lookup(skus, unit_cost_dict)
+    unit_cost = np.where(np.isfinite(unit_cost), unit_cost, DEFAULT_UNIT_COST)
+    unit_cost = np.where(unit_cost < 0, 0.0, unit_cost)
+    price_listed, unit_price = _lookup(skus, unit_price_dict)
+    unit_price = np.where(price_listed, unit_price, product_stats["csv_unit_price"].to_numpy(dtype=float))
+    unit_price = np.where(np.isfinite(unit_price) & (unit_price > 0), unit_price, DEFAULT_UNIT_PRICE)
+
+    lead_listed, lead_times = _lookup(skus, lead_time_dict)
+    lead_times = np.where(lead_listed & np.isfinite(lead_times), np.trunc(lead_times), DEFAULT_LEAD_TIME_DAYS).astype(np.int64)
+
+    forecasts = forecast_aggregates(forecasts_list, skus, lead_times)
+
+    # ================================================================
+    # SAFETY STOCK - service level z x sqrt(demand variance over the lead
+    # time + lead time variance), raised to the forecast CI spread when
+    # that is wider, then capped and floored by daily demand
+    # ================================================================
+    z_score = np.select(
+        [priority == level for level in SERVICE_LEVEL_Z], list(SERVICE_LEVEL_Z.values()),
+        default=DEFAULT_SERVICE_LEVEL_Z,
+    )
+    lead_time_std = np.maximum(1, lead_times * LEAD_TIME_STD_PCT)
+    demand_variance = std_daily ** 2 * np.maximum(lead_times, 1)
+    lead_time_variance = daily_avg ** 2 * lead_time_std ** 2
+    safety_stock = np.rint(z_score * np.sqrt(demand_variance + lead_time_variance))
+
+    lead_spread = forecasts["lead_spread"]
+    safety_stock = np.where(lead_spread > 0, np.maximum(safety_stock, np.rint(z_score * lead_spread)), safety_stock)
+    safety_stock = np.maximum(1, safety_stock)
+    safety_stock = np.minimum(safety_stock, np.trunc(daily_avg * SAFETY_STOCK_CAP_DAYS))
+    safety_stock = np.maximum(safety_stock, np.trunc(np.maximum(1, daily_avg * SAFETY_STOCK_FLOOR_DAYS)))
+    safety_stock_7_days = np.rint(safety_stock * (SHORT_HORIZON_DAYS / LONG_HORIZON_DAYS))
+
+    # Forecast totals when there is a forecast, else the historical daily rate
+    has_forecast = forecasts["has_forecast"]
+    demand_7 = np.trunc(np.where(has_forecast, forecasts["total_7"], daily_avg * SHORT_HORIZON_DAYS))
+    demand_15 = np.trunc(np.where(has_forecast, forecasts["total_15"], daily_avg * LONG_HORIZON_DAYS))
+    recommended_stock_7_days = (demand_7 + safety_stock_7_days).astype(np.int64)
+    recommended_stock_15_days = (demand_15 + safety_stock).astype(np.int64)
+    reorder_point = (safety_stock + np.trunc(daily_avg * lead_times)).astype(np.int64)
+    safety_stock = safety_stock.astype(np.int64)
+
+    # Financials (stock valued at the selling price)
+    investment_required = recommended_stock_15_days * unit_price
+    expected_revenue = recommended_stock_15_days * unit_price
+    expected_profit = expected_revenue - investment_required
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roi_percent = np.where(investment_required > 0, expected_profit / investment_required * 100, 0.0)
+    profit_margin_percent = (unit_price - unit_cost) / unit_price * 100
+
+    # Current stock (optional layer)
+    has_current_stock, current_stock = _lookup(skus, current_stock_dict)
+    current_stock = np.where(has_current_stock, np.trunc(np.nan_to_num(current_stock)), 0).astype(np.int64)
+    shortage = np.maximum(0, recommended_stock_15_days - current_stock)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_remaining = np.where(daily_avg > 0, current_stock / daily_avg, np.inf)
+    stockout_risk = np.select(
+        [days_remaining <= days for days, _ in STOCKOUT_RISK_DAYS], [risk for _, risk in STOCKOUT_RISK_DAYS],
+        default="LOW",
+    )
+
+    return {
+        "skus": skus,
+        "lead_times": lead_times,
+        "unit_cost": unit_cost,
+        "unit_price": unit_price,
+        "safety_stock": safety_stock,
+        "recommended_stock_7_days": recommended_stock_7_days,
+        "recommended_stock_15_days": recommended_stock_15_days,
+        "reorder_point": reorder_point,
+        "investment_required": investment_required,
+        "expected_revenue": expected_revenue,
+        "expected_profit": expected_profit,
+        "roi_percent": roi_percent,
+        "profit_margin_percent": profit_margin_percent,
+        "has_current_stock": has_current_stock,
+        "current_stock": current_stock,
+        "shortage": shortage,
+        "days_remaining": days_remaining,
+        "stockout_risk": stockout_risk,
+    }
+
+
+def inventory_recommendations(product_stats: pd.DataFrame, forecasts_list: list = None,
+                              unit_cost_dict: dict = None, unit_price_dict: dict = None,
+                              current_stock_dict: dict = None, lead_time_dict: dict = None) -> list:
+    """
+    Recommendation dicts, one per product_stats row, in row order.
+    product_stats columns: sku, itemname, daily_avg, std_daily, cv,
+    demand_percentile, volatility_percentile, combined_risk_percentile,
+    demand_class, volatility_class, priority_category, csv_unit_price,
+    total_qty, transaction_count, days_span.
+    """
+    arrays = recommendation_arrays(
+        product_stats, forecasts_list, unit_cost_dict, unit_price_dict, current_stock_dict, lead_time_dict
+    )
+    has_current_stock = arrays["has_current_stock"]
+
+    # Rounding and int conversion per column, then one dict per row
+    shows_stock = has_current_stock.tolist()
+    finite_remaining = has_current_stock & np.isfinite(arrays["days_remaining"])
+    days_remaining = [
+        value if finite else None
+        for value, finite in zip(round_half_even(arrays["days_remaining"], 1), finite_remaining.tolist())
+    ]
+    columns = zip(
+        arrays["skus"], [str(name).strip() for name in product_stats["itemname"].tolist()],
+        round_half_even(product_stats["daily_avg"], 2), round_half_even(product_stats["std_daily"], 2),
+        round_half_even(product_stats["cv"], 3), round_half_even(product_stats["demand_percentile"], 1),
+        round_half_even(product_stats["volatility_percentile"], 1),
+        round_half_even(product_stats["combined_risk_percentile"], 1),
+        product_stats["demand_class"].tolist(), product_stats["volatility_class"].tolist(),
+        product_stats["priority_category"].tolist(),
+        arrays["recommended_stock_7_days"].tolist(), arrays["recommended_stock_15_days"].tolist(),
+        arrays["safety_stock"].tolist(), arrays["reorder_point"].tolist(),
+        round_half_even(arrays["unit_cost"], 2), round_half_even(arrays["unit_price"], 2),
+        np.rint(arrays["investment_required"]).astype(np.int64).tolist(),
+        np.rint(arrays["expected_revenue"]).astype(np.int64).tolist(),
+        np.rint(arrays["expected_profit"]).astype(np.int64).tolist(),
+        round_half_even(arrays["roi_percent"], 1), round_half_even(arrays["profit_margin_percent"], 1),
+        shows_stock, arrays["current_stock"].tolist(), arrays["shortage"].tolist(),
+        days_remaining, arrays["stockout_risk"].tolist(),
+        np.trunc(product_stats["total_qty"].to_numpy(dtype=float)).astype(np.int64).tolist(),
+        product_stats["transaction_count"].astype(np.int64).tolist(),
+        product_stats["days_span"].astype(np.int64).tolist(), arrays["lead_times"].tolist(),
+    )
+
+    recommendations = []
+    for (sku, item_name, avg, std, cv, demand_pct, volatility_pct, risk_pct, demand_class, volatility_class,
+         priority_category, stock_7, stock_15, safety, reorder, cost, price, investment, revenue, profit,
+         roi, margin, has_stock, stock, short, remaining, risk, total_sold, transactions, days_span,
+         lead_time) in columns:
+        recommendations.append({
+            # Product info
+            "sku": sku,
+            "item_name": item_name,
+            "itemname": item_name,
+
+            # DEMAND METRICS
+            "daily_sales_avg": avg,
+            "daily_sales_std": std,
+            "coefficient_of_variation": cv,
+
+            # PERCENTILE-BASED FIELDS
+            "demand_percentile": demand_pct,
+            "volatility_percentile": volatility_pct,
+            "combined_risk_percentile": risk_pct,
+
+            # CLASSIFICATIONS BASED ON PERCENTILES
+            "demand_classification": demand_class,
+            "volatility_classification": volatility_class,
+            "priority_category": priority_category,
+            "safety_stock_method": SAFETY_STOCK_METHOD,
+
+            # Stock calculations
+            "recommended_stock_7_days": stock_7,
+            "recommended_stock_15_days": stock_15,
+            "recommended_stock": stock_15,
+            "safety_stock": safety,
+            "reorder_point": reorder,
+
+            # Financial
+            "unit_cost": cost,
+            "unit_price": price,
+            "investment_required": investment,
+            "expected_revenue": revenue,
+            "expected_profit": profit,
+            "roi_percent": roi,
+            "profit_margin_percent": margin,
+
+            # Current stock
+            "has_current_stock": has_stock,
+            "current_stock": stock if has_stock else None,
+            "shortage": short if has_stock else None,
+            "days_remaining": remaining,
+            "stockout_risk": risk if has_stock else None,
+
+            # Metadata
+            "total_sold": total_sold,
+            "transactions": transactions,
+            "days_analyzed": days_span,
+            "lead_time_days": lead_time,
+        })
+
+    return recommendations
+
+
+def stockout_loss(inventory: list, unit_price_dict: dict) -> float:
+    """Revenue lost over STOCKOUT_LOSS_DAYS by recommendations whose current stock is already <= 0."""
+    stock = np.array([item.get("current_stock") for item in inventory], dtype=float)
+    out_of_stock = np.flatnonzero(stock <= 0)
+
+    loss = 0
+    for i in out_of_stock.tolist():
+        item = inventory[i]
+        daily_demand = float(item.get("daily_sales_avg") or 0)
+        unit_price = float(unit_price_dict.get(normalize_sku(item.get("sku"))) or 0)
+        loss += daily_demand * unit_price * STOCKOUT_LOSS_DAYS
+    return loss
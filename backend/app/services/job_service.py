@@ -0,0 +1,510 @@
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from pymongo import ReturnDocument
+
+from app.services.forecast_executor import forecast_executor, forecast_worker_count
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# FORECAST JOBS - queued upload processing with persisted state
+# POST creates a job (its input saved under JOB_DIR) and returns at once;
+# local worker processes claim queued jobs, run the pipeline stage by stage
+# and store the response. State lives in MongoDB, or SQLite as a local
+# stand-in, so jobs outlive the API process: a running job whose heartbeat
+# stops is claimed again by the next worker, or ends cancelled when a cancel
+# was requested meanwhile.
+# ============================================================================
+
+JOB_STORE = os.getenv("JOB_STORE", "mongo")                # mongo | sqlite
+JOB_SQLITE_PATH = os.getenv("JOB_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "aptstock_jobs.sqlite3"))
+JOB_DIR = os.getenv("JOB_DIR", os.path.join(tempfile.gettempdir(), "aptstock_jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))           # worker processes per API process
+JOB_POLL_SECONDS = 1.0              # idle workers look for queued jobs this often
+JOB_HEARTBEAT_SECONDS = 10          # running jobs refresh heartbeat_at this often
+JOB_STALE_SECONDS = 120             # no heartbeat for this long: worker is gone, job is claimable
+JOB_MAX_ATTEMPTS = 2                # claims per job before it is failed
+JOB_RETENTION_SECONDS = 7 * 24 * 3600   # finished jobs (and results) kept this long
+JOB_COLLECTION = "forecast_jobs"
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_FINISHED = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised from the progress callback when the job was cancelled (or taken over)."""
+
+
+def new_job(user: str, params: dict, job_id: str = None) -> dict:
+    return {
+        "job_id": job_id or uuid.uuid4().hex,
+        "user": user,
+        "status": JOB_QUEUED,
+        "stage": JOB_QUEUED,
+        "progress": 0,
+        "params": params,
+        "created_at": time.time(),
+        "started_at": None,
+        "heartbeat_at": None,
+        "finished_at": None,
+        "attempts": 0,
+        "worker": None,
+        "error": None,
+        "cancel_requested": False,
+    }
+
+
+def job_input_dir(job_id: str) -> str:
+    return os.path.join(JOB_DIR, job_id)
+
+
+def encode_result(result: dict) -> bytes:
+    """Responses can be several MB of JSON; stored gzip-compressed."""
+    return gzip.compress(json.dumps(result).encode(), compresslevel=5)
+
+
+def decode_result(payload: bytes) -> dict:
+    return json.loads(gzip.decompress(payload))
+
+
+# ============================================================================
+# STORES - same interface, MongoDB or SQLite
+# ============================================================================
+
+
+class MongoJobStore:
+    """Jobs in the forecast_jobs collection (_id = job_id)."""
+
+    def __init__(self):
+        from app.services.database_service import db
+
+        self.collection = db[JOB_COLLECTION]
+        self.collection.create_index([("status", 1), ("created_at", 1)])
+        self.collection.create_index("user")
+
+    @staticmethod
+    def _job(doc: Optional[dict]) -> Optional[dict]:
+        if doc is None:
+            return None
+        doc = dict(doc)
+        doc["job_id"] = doc.pop("_id")
+        if doc.get("result") is not None:
+            doc["result"] = bytes(doc["result"])
+        return doc
+
+    def create(self, job: dict) -> None:
+        doc = dict(job)
+        doc["_id"] = doc.pop("job_id")
+        self.collection.insert_one(doc)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self._job(self.collection.find_one({"_id": job_id}))
+
+    def sweep(self) -> list:
+        """Finish stale running jobs that must not be claimed again; returns their ids."""
+        now = time.time()
+        stale = {"status": JOB_RUNNING, "heartbeat_at": {"$lt": now - JOB_STALE_SECONDS}}
+        final = {"$or": [{"cancel_requested": True}, {"attempts": {"$gte": JOB_MAX_ATTEMPTS}}]}
+        job_ids = [doc["_id"] for doc in self.collection.find({**stale, **final}, projection={"_id": 1})]
+        if not job_ids:
+            return []
+        self.collection.update_many(
+            {**stale, "_id": {"$in": job_ids}, "cancel_requested": True},
+            {"$set": {"status": JOB_CANCELLED, "stage": JOB_CANCELLED, "finished_at": now}},
+        )
+        self.collection.update_many(
+            {**stale, "_id": {"$in": job_ids}, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+            {"$set": {"status": JOB_FAILED, "stage": JOB_FAILED, "error": "Worker lost too many times", "finished_at": now}},
+        )
+        # Only the jobs this sweep finished (a worker may have heartbeated in between)
+        return [doc["_id"] for doc in self.collection.find(
+            {"_id": {"$in": job_ids}, "status": {"$in": [JOB_CANCELLED, JOB_FAILED]}, "finished_at": now},
+            projection={"_id": 1},
+        )]
+
+    def claim(self, worker: str) -> Optional[dict]:
+        now = time.time()
+        stale = {
+            "status": JOB_RUNNING,
+            "heartbeat_at": {"$lt": now - JOB_STALE_SECONDS},
+            "attempts": {"$lt": JOB_MAX_ATTEMPTS},
+        }
+        return self._job(self.collection.find_one_and_update(
+            {"$or": [{"status": JOB_QUEUED}, stale], "cancel_requested": False},
+            {
+                "$set": {"status": JOB_RUNNING, "worker": worker, "started_at": now, "heartbeat_at": now},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        ))
+
+    def heartbeat(self, job_id: str, worker: str, stage: str = None, progress: int = None) -> Optional[bool]:
+        """Refresh a running job; returns cancel_requested, None if the job is no longer ours."""
+        update = {"heartbeat_at": time.time()}
+        if stage is not None:
+            update.update({"stage": stage, "progress": progress})
+        doc = self.collection.find_one_and_update(
+            {"_id": job_id, "worker": worker, "status": JOB_RUNNING},
+            {"$set": update},
+            projection={"cancel_requested": 1},
+        )
+        return None if doc is None else bool(doc.get("cancel_requested"))
+
+    def finish(self, job_id: str, worker: str, status: str, result: bytes = None, error: str = None) -> bool:
+        outcome = self.collection.update_one(
+            {"_id": job_id, "worker": worker, "status": JOB_RUNNING},
+            {"$set": {
+                "status": status,
+                "stage": status,
+                "progress": 100 if status == JOB_SUCCEEDED else None,
+                "result": result,
+                "error": error,
+                "finished_at": time.time(),
+            }},
+        )
+        return outcome.modified_count == 1
+
+    def cancel(self, job_id: str, user: str) -> Optional[dict]:
+        now = time.time()
+        self.collection.update_one(
+            {"_id": job_id, "user": user, "status": JOB_QUEUED},
+            {"$set": {"status": JOB_CANCELLED, "stage": JOB_CANCELLED, "finished_at": now}},
+        )
+        return self._job(self.collection.find_one_and_update(
+            {"_id": job_id, "user": user},
+            {"$set": {"cancel_requested": True}},
+            projection={"result": 0},
+            return_document=ReturnDocument.AFTER,
+        ))
+
+    def purge(self, before: float) -> int:
+        return self.collection.delete_many(
+            {"status": {"$in": list(JOB_FINISHED)}, "finished_at": {"$lt": before}}
+        ).deleted_count
+
+
+class SQLiteJobStore:
+    """Local stand-in: one table in JOB_SQLITE_PATH, safe across processes."""
+
+    COLUMNS = (
+        "job_id", "user", "status", "stage", "progress", "params", "created_at", "started_at",
+        "heartbeat_at", "finished_at", "attempts", "worker", "error", "cancel_requested", "result",
+    )
+
+    def __init__(self, path: str = JOB_SQLITE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, user TEXT, status TEXT, stage TEXT, progress REAL, "
+                "params TEXT, created_at REAL, started_at REAL, heartbeat_at REAL, finished_at REAL, "
+                "attempts INTEGER, worker TEXT, error TEXT, cancel_requested INTEGER, result BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _job(row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job.get("params") else {}
+        job["cancel_requested"] = bool(job.get("cancel_requested"))
+        return job
+
+    def create(self, job: dict) -> None:
+        row = {**job, "params": json.dumps(job["params"]), "cancel_requested": int(job["cancel_requested"]), "result": None}
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                [row.get(column) for column in self.COLUMNS],
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            return self._job(conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+    def sweep(self) -> list:
+        now = time.time()
+        stale = "status = ? AND heartbeat_at < ?"
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            job_ids = [row["job_id"] for row in conn.execute(
+                f"SELECT job_id FROM jobs WHERE {stale} AND (cancel_requested = 1 OR attempts >= ?)",
+                (JOB_RUNNING, now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS),
+            )]
+            conn.execute(
+                f"UPDATE jobs SET status = ?, stage = ?, finished_at = ? WHERE {stale} AND cancel_requested = 1",
+                (JOB_CANCELLED, JOB_CANCELLED, now, JOB_RUNNING, now - JOB_STALE_SECONDS),
+            )
+            conn.execute(
+                f"UPDATE jobs SET status = ?, stage = ?, error = ?, finished_at = ? WHERE {stale} AND attempts >= ?",
+                (JOB_FAILED, JOB_FAILED, "Worker lost too many times", now, JOB_RUNNING, now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return job_ids
+
+    def claim(self, worker: str) -> Optional[dict]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE cancel_requested = 0 "
+                "AND (status = ? OR (status = ? AND heartbeat_at < ? AND attempts < ?)) "
+                "ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED, JOB_RUNNING, now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1 WHERE job_id = ?",
+                    (JOB_RUNNING, worker, now, now, row["job_id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return None if row is None else self.get(row["job_id"])
+
+    def heartbeat(self, job_id: str, worker: str, stage: str = None, progress: int = None) -> Optional[bool]:
+        with self._connect() as conn:
+            if stage is not None:
+                updated = conn.execute(
+                    "UPDATE jobs SET heartbeat_at = ?, stage = ?, progress = ? "
+                    "WHERE job_id = ? AND worker = ? AND status = ?",
+                    (time.time(), stage, progress, job_id, worker, JOB_RUNNING),
+                ).rowcount
+            else:
+                updated = conn.execute(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND worker = ? AND status = ?",
+                    (time.time(), job_id, worker, JOB_RUNNING),
+                ).rowcount
+            if not updated:
+                return None
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return bool(row["cancel_requested"])
+
+    def finish(self, job_id: str, worker: str, status: str, result: bytes = None, error: str = None) -> bool:
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, progress = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE job_id = ? AND worker = ? AND status = ?",
+                (status, status, 100 if status == JOB_SUCCEEDED else None, result, error, time.time(),
+                 job_id, worker, JOB_RUNNING),
+            ).rowcount == 1
+
+    def cancel(self, job_id: str, user: str) -> Optional[dict]:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, finished_at = ? WHERE job_id = ? AND user = ? AND status = ?",
+                (JOB_CANCELLED, JOB_CANCELLED, time.time(), job_id, user, JOB_QUEUED),
+            )
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND user = ?", (job_id, user))
+        job = self.get(job_id)
+        return job if job is not None and job["user"] == user else None
+
+    def purge(self, before: float) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(JOB_FINISHED))}) AND finished_at < ?",
+                (*JOB_FINISHED, before),
+            ).rowcount
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def job_store():
+    """Process-wide store for JOB_STORE, created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteJobStore() if JOB_STORE == "sqlite" else MongoJobStore()
+        return _store
+
+
+# ============================================================================
+# WORKERS - spawned processes polling the store
+# ============================================================================
+
+
+def _run_job(store, job: dict, handler: Callable, worker: str) -> None:
+    job_id = job["job_id"]
+    lost = threading.Event()
+
+    def progress(stage: str, percent: int) -> None:
+        cancel_requested = store.heartbeat(job_id, worker, stage, percent)
+        if cancel_requested is None:
+            raise JobCancelled("Job was taken over by another worker")
+        if cancel_requested or lost.is_set():
+            raise JobCancelled("Job cancelled")
+
+    def keep_alive(stop: threading.Event) -> None:
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            if store.heartbeat(job_id, worker) is None:
+                lost.set()
+                return
+
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(target=keep_alive, args=(stop_heartbeat,), daemon=True)
+    heartbeat.start()
+    started = time.monotonic()
+    # Only the worker that records the outcome owns the input; a job taken
+    # over by another worker keeps it for the new owner
+    finished = False
+    try:
+        result = handler(job, progress)
+        finished = store.finish(job_id, worker, JOB_SUCCEEDED, result=encode_result(result))
+        logger.info(f"✅ Job {job_id} done in {time.monotonic() - started:.1f}s")
+    except JobCancelled as cancelled:
+        finished = store.finish(job_id, worker, JOB_CANCELLED, error=str(cancelled))
+        logger.info(f"⚠️ Job {job_id} cancelled")
+    except Exception as job_error:
+        error = getattr(job_error, "detail", None) or str(job_error)
+        finished = store.finish(job_id, worker, JOB_FAILED, error=str(error))
+        logger.error(f"❌ Job {job_id} failed: {error}")
+    finally:
+        stop_heartbeat.set()
+        if finished:
+            shutil.rmtree(job_input_dir(job_id), ignore_errors=True)
+        else:
+            logger.warning(f"⚠️ Job {job_id} not finished by {worker}; input left in place")
+
+
+def job_forecast_workers(job_workers: int = JOB_WORKERS) -> int:
+    """Forecast processes per job worker: the job workers share the usable CPUs."""
+    return max(1, forecast_worker_count() // max(job_workers, 1))
+
+
+def _exit_on_sigterm(signum, frame) -> None:
+    raise SystemExit(0)
+
+
+def _worker_main(handler: Callable, stop_event, worker: str, forecast_workers: int) -> None:
+    logging.basicConfig(level=logging.INFO)
+    # JobRunner.shutdown terminates slow workers: unwind so the forecast pool stops with us
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    # Jobs carry the largest uploads; their SKUs run on this worker's own process pool
+    forecast_executor.max_workers = forecast_workers
+    forecast_executor.start()
+    try:
+        _poll_jobs(handler, stop_event, worker)
+    finally:
+        forecast_executor.shutdown()
+
+
+def _poll_jobs(handler: Callable, stop_event, worker: str) -> None:
+    store = job_store()
+    last_purge = 0.0
+
+    while not stop_event.is_set():
+        try:
+            if time.monotonic() - last_purge > 3600:
+                store.purge(time.time() - JOB_RETENTION_SECONDS)
+                last_purge = time.monotonic()
+
+            # Stale jobs that were cancelled or lost too often end here, with their input
+            for job_id in store.sweep():
+                shutil.rmtree(job_input_dir(job_id), ignore_errors=True)
+            job = store.claim(worker)
+        except Exception as store_error:
+            logger.error(f"❌ Job store unavailable: {store_error}")
+            job = None
+
+        if job is None:
+            stop_event.wait(JOB_POLL_SECONDS)
+            continue
+
+        logger.info(f"✅ Job {job['job_id']} claimed by {worker} (attempt {job['attempts']})")
+        _run_job(store, job, handler, worker)
+
+
+class JobRunner:
+    """
+    Worker processes for forecast jobs.
+
+    handler(job, progress) runs one job and returns its JSON-safe result;
+    it must be a module-level function (it is pickled by reference) and
+    call progress(stage, percent) between stages, which raises
+    JobCancelled once the job is cancelled. Each worker starts its own
+    forecast pool (job_forecast_workers processes) for the jobs it runs.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._processes = []
+        self._stop = None
+
+    def start(self, handler: Callable) -> None:
+        if self._processes or self.workers <= 0:
+            return
+        context = multiprocessing.get_context("spawn")
+        self._stop = context.Event()
+        host = socket.gethostname()
+        forecast_workers = job_forecast_workers(self.workers)
+        for index in range(self.workers):
+            worker = f"{host}:{os.getpid()}:{index}"
+            process = context.Process(
+                target=_worker_main, args=(handler, self._stop, worker, forecast_workers),
+                name=f"job-worker-{index}",
+            )
+            process.start()
+            self._processes.append(process)
+        logger.info(f"✅ Job runner started with {self.workers} worker processes "
+                    f"({forecast_workers} forecast processes each)")
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """Stop polling; jobs still running after timeout are re-claimed after restart."""
+        if not self._processes:
+            return
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        logger.info("✅ Job runner stopped")
+
+
+job_runner = JobRunner()
+
+
+def start_job_runner(handler: Callable) -> None:
+    job_runner.start(handler)
+
+
+def shutdown_job_runner() -> None:
+    job_runner.shutdown()
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# MODEL CACHE - fitted forecast models on local disk, keyed by tenant + SKU
+# Users re-upload nearly the same file daily. An identical training series
+# reuses the cached prediction; a series that only grew by a few days
+# warm-starts the fit from the cached parameters. Files are shared by the
+# server and forecast worker processes; least recently used entries are
+# deleted once the directory exceeds its size budget.
+# ============================================================================
+
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "aptstock_model_cache"))
+MODEL_CACHE_MAX_MB = float(os.getenv("MODEL_CACHE_MAX_MB", "256"))
+MODEL_CACHE_EVICT_TO = 0.9          # evict down to this share of the budget
+WARM_START_MAX_NEW_DAYS = 14        # longer gaps refit from scratch
+
+CACHE_HIT = "hit"                   # identical series, prediction reused
+CACHE_WARM = "warm"                 # series extended, fit warm-started
+CACHE_MISS = "miss"                 # no usable entry, cold fit
+
+
+def series_fingerprint(daily_sales: pd.DataFrame, settings: dict) -> str:
+    """Hash of the training series (start date + values) and the model settings."""
+    digest = hashlib.sha256()
+    digest.update(str(pd.Timestamp(daily_sales['ds'].iloc[0]).date()).encode())
+    digest.update(np.ascontiguousarray(daily_sales['y'].to_numpy(dtype=np.float64)).tobytes())
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def series_extends(entry: dict, daily_sales: pd.DataFrame) -> bool:
+    """
+    True when daily_sales repeats the cached series on every day they share
+    and adds at most WARM_START_MAX_NEW_DAYS new days at the end.
+    """
+    cached = entry.get("series")
+    if not cached:
+        return False
+
+    cached_start = pd.Timestamp(cached["start"])
+    cached_y = np.asarray(cached["y"], dtype=float)
+    cached_end = cached_start + pd.Timedelta(days=len(cached_y) - 1)
+
+    new_start = pd.Timestamp(daily_sales['ds'].iloc[0])
+    new_end = pd.Timestamp(daily_sales['ds'].iloc[-1])
+    new_days = (new_end - cached_end).days
+    if new_days < 0 or new_days > WARM_START_MAX_NEW_DAYS or new_start > cached_end:
+        return False
+
+    overlap_start = max(cached_start, new_start)
+    cached_part = cached_y[(overlap_start - cached_start).days:]
+    new_offset = (overlap_start - new_start).days
+    new_part = daily_sales['y'].to_numpy(dtype=float)[new_offset:new_offset + len(cached_part)]
+    return len(new_part) == len(cached_part) and np.array_equal(new_part, cached_part)
+
+
+class ModelCache:
+    """
+    One JSON file per (tenant, SKU) under `root`.
+
+    get() marks an entry as recently used (mtime); put() writes atomically
+    and evicts the least recently used files when the directory grows past
+    max_mb. Hit / warm / miss counters are kept per process: the request
+    process records the outcomes reported by forecasts (record()).
+    """
+
+    def __init__(self, root: str = MODEL_CACHE_DIR, max_mb: float = MODEL_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._size_bytes = None       # approximate, rescanned when over budget
+        self._outcomes = Counter()
+        self._lock = threading.Lock()
+
+    def _path(self, tenant: str, sku: str) -> str:
+        name = hashlib.sha256(f"{tenant}\0{sku}".encode()).hexdigest()
+        return os.path.join(self.root, f"{name}.json")
+
+    def get(self, tenant: str, sku: str) -> Optional[dict]:
+        path = self._path(tenant, sku)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as cache_error:
+            logger.warning(f"⚠️ Model cache entry unreadable, ignoring: {cache_error}")
+            return None
+
+    def put(self, tenant: str, sku: str, entry: dict) -> None:
+        path = self._path(tenant, sku)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            payload = json.dumps(entry)
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as cache_error:
+            logger.warning(f"⚠️ Model cache write failed: {cache_error}")
+            return
+
+        with self._lock:
+            if self._size_bytes is None:
+                self._size_bytes = self._scan_size()
+            else:
+                self._size_bytes += len(payload)
+            over_budget = self._size_bytes > self.max_bytes
+
+        if over_budget:
+            self.evict()
+
+    def evict(self) -> int:
+        """Delete least recently used entries down to MODEL_CACHE_EVICT_TO of the budget."""
+        files = []
+        for item in os.scandir(self.root):
+            if item.name.endswith(".json"):
+                try:
+                    stat = item.stat()
+                    files.append((stat.st_mtime, stat.st_size, item.path))
+                except FileNotFoundError:
+                    continue
+
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * MODEL_CACHE_EVICT_TO
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        with self._lock:
+            self._size_bytes = total
+        if removed:
+            logger.info(f"✅ Model cache evicted {removed} entries ({total / 1024 / 1024:.1f} MB left)")
+        return removed
+
+    def _scan_size(self) -> int:
+        try:
+            return sum(item.stat().st_size for item in os.scandir(self.root) if item.name.endswith(".json"))
+        except FileNotFoundError:
+            return 0
+
+    def record(self, outcomes: Counter) -> None:
+        with self._lock:
+            self._outcomes.update(outcomes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            outcomes = dict(self._outcomes)
+        lookups = sum(outcomes.values())
+        return {
+            "hits": outcomes.get(CACHE_HIT, 0),
+            "warm_starts": outcomes.get(CACHE_WARM, 0),
+            "misses": outcomes.get(CACHE_MISS, 0),
+            "lookups": lookups,
+            "hit_rate": round(outcomes.get(CACHE_HIT, 0) / lookups, 3) if lookups else None,
+            "reuse_rate": round((outcomes.get(CACHE_HIT, 0) + outcomes.get(CACHE_WARM, 0)) / lookups, 3) if lookups else None,
+            "size_mb": round(self._scan_size() / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+        }
+
+
+model_cache = ModelCache()
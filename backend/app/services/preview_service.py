@@ -0,0 +1,259 @@
+import pandas as pd
+import numpy as np
+import logging
+from io import BytesIO
+from typing import Iterable, Iterator, Optional, Tuple
+
+from app.services.schema_service import normalize_csv_columns
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# FAST PREVIEW - head + strided byte samples, constant work per file
+# ============================================================================
+
+PREVIEW_HEAD_BYTES = 1024 * 1024     # contiguous head (schema detection + samples)
+PREVIEW_SAMPLE_BLOCKS = 32           # strided blocks between head and tail
+PREVIEW_BLOCK_BYTES = 64 * 1024      # bytes read per block (incl. the tail block)
+PREVIEW_TOP_K = 5
+PREVIEW_TRACKED_SKUS = 2_000         # bounded counter capacity for top-K
+PREVIEW_HEAD_ROWS = 5_000            # rows kept from a streamed preview
+
+
+class TopKCounter:
+    """
+    Bounded-memory heavy hitters (Misra-Gries). Keeps at most `capacity`
+    keys; when full, every count is decreased by the smallest one and
+    zeroed keys are dropped, so large totals survive while the long tail
+    is forgotten. Counts are lower bounds of the true totals.
+    """
+
+    def __init__(self, capacity: int = PREVIEW_TRACKED_SKUS):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, totals: pd.Series) -> None:
+        for key, value in totals.items():
+            self.counts[key] = self.counts.get(key, 0.0) + float(value)
+
+        if len(self.counts) > self.capacity:
+            floor = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {
+                key: value - floor
+                for key, value in self.counts.items()
+                if value > floor
+            }
+
+    def top(self, k: int) -> list:
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+
+class PreviewAccumulator:
+    """Running date range, row count and top products over normalized chunks."""
+
+    def __init__(self, capacity: int = PREVIEW_TRACKED_SKUS):
+        self.min_date = None
+        self.max_date = None
+        self.rows = 0
+        self.top_products = TopKCounter(capacity)
+        self.names = {}
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        if chunk is None or chunk.empty:
+            return
+
+        self.rows += len(chunk)
+
+        chunk_min, chunk_max = chunk["date"].min(), chunk["date"].max()
+        if pd.notna(chunk_min):
+            self.min_date = chunk_min if self.min_date is None else min(self.min_date, chunk_min)
+            self.max_date = chunk_max if self.max_date is None else max(self.max_date, chunk_max)
+
+        totals = chunk.groupby("sku", sort=False, observed=True)["quantity"].sum()
+        self.top_products.add(totals)
+
+        for sku, name in chunk.groupby("sku", sort=False, observed=True)["itemname"].first().items():
+            if sku in self.top_products.counts:
+                self.names.setdefault(sku, name)
+        self.names = {sku: n for sku, n in self.names.items() if sku in self.top_products.counts}
+
+    def result(self, scale: float = 1.0, k: int = PREVIEW_TOP_K) -> dict:
+        return {
+            "date_min": self.min_date,
+            "date_max": self.max_date,
+            "top_products": [
+                {
+                    "name": str(self.names.get(sku, sku)),
+                    "sales": round(total * scale, 0),
+                    "sku": str(sku),
+                }
+                for sku, total in self.top_products.top(k)
+            ],
+        }
+
+
+def _complete_lines(block: bytes, at_file_start: bool, at_file_end: bool) -> bytes:
+    """Drop the partial first / last line of a block read at a byte offset."""
+    if not at_file_start:
+        newline = block.find(b"\n")
+        block = block[newline + 1:] if newline >= 0 else b""
+    if not at_file_end:
+        newline = block.rfind(b"\n")
+        block = block[:newline + 1] if newline >= 0 else b""
+    return block
+
+
+def iter_csv_sample_blocks(fileobj, size_bytes: int) -> Iterator[Tuple[bytes, int, bool]]:
+    """
+    Yield (csv_bytes, header_bytes, is_head) for the head,
+    PREVIEW_SAMPLE_BLOCKS strided blocks and the tail. Every non-head block
+    is prefixed with the header line (header_bytes long). Bytes read are
+    bounded regardless of file size.
+    """
+    fileobj.seek(0)
+    head = fileobj.read(PREVIEW_HEAD_BYTES)
+    head_end = len(head)
+    head = _complete_lines(head, True, head_end >= size_bytes)
+
+    header_end = head.find(b"\n")
+    header = head[:header_end + 1] if header_end >= 0 else head
+    yield head, len(header), True
+
+    if head_end >= size_bytes:
+        return
+
+    offsets = np.linspace(
+        head_end,
+        max(head_end, size_bytes - PREVIEW_BLOCK_BYTES),
+        PREVIEW_SAMPLE_BLOCKS + 1,
+    ).astype(int)
+
+    last_end = head_end
+    for offset in sorted(set(offsets.tolist())):
+        offset = max(offset, last_end)
+        if offset >= size_bytes:
+            break
+
+        fileobj.seek(offset)
+        block = fileobj.read(PREVIEW_BLOCK_BYTES)
+        last_end = offset + len(block)
+
+        lines = _complete_lines(block, False, last_end >= size_bytes)
+        if lines:
+            yield header + lines, len(header), False
+
+
+def sample_csv_preview(fileobj, size_bytes: int) -> Optional[dict]:
+    """
+    Fast preview of a CSV upload without reading the whole file.
+
+    Returns None when the head cannot be read or normalized (caller falls
+    back to the full preview, which reports the error). Otherwise:
+    - head: normalized head rows (samples + schema)
+    - estimated_records: data lines estimated from bytes per sampled line
+    - sampled_rows, bytes_read, date range and top products (scaled
+      to the estimated record count)
+    """
+    accumulator = PreviewAccumulator()
+    head_df = None
+    schema = None
+    header_size = 0
+    sampled_lines = 0
+    sampled_bytes = 0
+
+    for csv_bytes, block_header_size, is_head in iter_csv_sample_blocks(fileobj, size_bytes):
+        try:
+            raw = pd.read_csv(BytesIO(csv_bytes), on_bad_lines="skip")
+        except Exception as block_error:
+            if is_head:
+                logger.warning(f"⚠️ Fast preview head unreadable: {block_error}")
+                return None
+            continue
+
+        if raw.empty:
+            continue
+
+        try:
+            if schema is None:
+                normalized = normalize_csv_columns(raw)
+                schema = (
+                    normalized.attrs["column_schema_map"],
+                    normalized.attrs["column_detection_report"],
+                )
+            else:
+                normalized = normalize_csv_columns(raw, schema=schema)
+        except ValueError as block_error:
+            if is_head:
+                return None
+            logger.warning(f"⚠️ Fast preview block skipped: {block_error}")
+            continue
+
+        if is_head:
+            head_df = normalized
+            header_size = block_header_size
+
+        sampled_lines += len(raw)
+        sampled_bytes += len(csv_bytes) - block_header_size
+        accumulator.add(normalized)
+
+    if head_df is None:
+        return None
+
+    bytes_per_line = sampled_bytes / max(sampled_lines, 1)
+    estimated_records = int(round((size_bytes - header_size) / max(bytes_per_line, 1)))
+    estimated_records = max(estimated_records, sampled_lines)
+
+    return {
+        "head": head_df,
+        "estimated_records": estimated_records,
+        "sampled_rows": int(sampled_lines),
+        "bytes_read": int(sampled_bytes + header_size),
+        **accumulator.result(scale=estimated_records / max(sampled_lines, 1)),
+    }
+
+
+def stream_csv_preview(chunks: Iterable[pd.DataFrame]) -> Optional[dict]:
+    """
+    Preview from one pass over raw chunks (compressed uploads, which cannot
+    be sampled by byte offset). Memory is bounded by one chunk: only the
+    head rows, date range and top-K counter are kept. Record count is exact.
+    Same result keys as sample_csv_preview.
+    """
+    accumulator = PreviewAccumulator()
+    head_df = None
+    schema = None
+    raw_rows = 0
+
+    for raw in chunks:
+        if schema is None:
+            try:
+                normalized = normalize_csv_columns(raw)
+            except ValueError:
+                return None
+            schema = (
+                normalized.attrs["column_schema_map"],
+                normalized.attrs["column_detection_report"],
+            )
+            head_df = normalized.head(PREVIEW_HEAD_ROWS).copy()
+            head_df.attrs = dict(normalized.attrs)
+        else:
+            try:
+                normalized = normalize_csv_columns(raw, schema=schema)
+            except ValueError as chunk_error:
+                logger.warning(f"⚠️ Preview chunk skipped: {chunk_error}")
+                continue
+
+        raw_rows += len(raw)
+        accumulator.add(normalized)
+
+    if head_df is None:
+        return None
+
+    return {
+        "head": head_df,
+        "estimated_records": int(raw_rows),
+        "exact": True,
+        "sampled_rows": int(raw_rows),
+        "bytes_read": None,
+        **accumulator.result(),
+    }
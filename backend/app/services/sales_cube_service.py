@@ -0,0 +1,294 @@
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.demand_matrix_service import SkuDayDemand, build_sku_day_demand
+from app.services.ingestion_service import INVOICE_NULL_VALUES
+
+# ============================================================================
+# SALES CUBE - one request's sales aggregates, built once, read by every stage
+# Two groupbys over the analytics frame: per day (summary, history) and per
+# (day, sku, itemname, store) cell (sorted keys, NaN keys last). Everything
+# else - per-day items, (SKU, item) demand cells, product revenue, raw
+# history rows - is derived from the sorted cells with NumPy. Line items
+# (full ingest) add one more groupby, per invoice, only when they carry ids.
+# No stage copies or regroups the frame.
+# ============================================================================
+
+
+class SalesCube:
+    """
+    - frame / lines: the analytics frame and the line items for revenue and
+      invoice metrics (the same frame unless the route passes raw lines)
+    - first_date / last_date: min / max date of frame; calendar: every day
+      from the first to the last sales day (normalized)
+    - daily: per sales day quantity, lines (raw line count) and revenue
+    - cells: the same measures per (day, sku, itemname[, store]) in groupby
+      order; cell_day: day offset into calendar per cell
+    - pairs: (sku, itemname) pairs in groupby order (NaN last); cell_pair
+    - revenue / revenue_source: per-line revenue of lines and its column
+    - invoices: per-invoice transaction_revenue / transaction_units /
+      transaction_date, or None without invoice ids
+    - last_unit_price: {sku: last known unit price}, None without unit_price
+    - groupbys: pandas groupbys run for this cube
+    """
+
+    def __init__(self, frame, lines, columns, daily, cells, calendar, cell_day, pairs, cell_pair,
+                 revenue, revenue_source, cell_revenue_source, invoices, last_unit_price, groupbys):
+        self.frame = frame
+        self.lines = lines
+        self.columns = columns
+        self.first_date = frame[columns["date"]].min()
+        self.last_date = frame[columns["date"]].max()
+        self.total_quantity = frame[columns["quantity"]].sum()
+        self.daily = daily
+        self.cells = cells
+        self.calendar = calendar
+        self.cell_day = cell_day
+        self.pairs = pairs
+        self.cell_pair = cell_pair
+        self.revenue = revenue
+        self.revenue_source = revenue_source
+        self.cell_revenue_source = cell_revenue_source
+        self.invoices = invoices
+        self.last_unit_price = last_unit_price
+        self.groupbys = groupbys
+        self.build_ms = 0.0
+        self._sku_days = None
+
+    @property
+    def n_days(self) -> int:
+        return len(self.calendar)
+
+    @property
+    def sku_days(self) -> SkuDayDemand:
+        """SKU x day demand (normalized SKUs) for forecasting, built on first use."""
+        if self._sku_days is None:
+            c = self.columns
+            self._sku_days = build_sku_day_demand(self.frame, c["date"], c["quantity"], c["sku"], c["item"])
+        return self._sku_days
+
+    def stats(self) -> dict:
+        return {
+            "rows": len(self.frame),
+            "line_rows": len(self.lines),
+            "cells": len(self.cells),
+            "days": len(self.daily),
+            "pairs": len(self.pairs) if self.pairs is not None else 0,
+            "invoices": len(self.invoices) if self.invoices is not None else 0,
+            "groupbys": self.groupbys,
+            "build_ms": round(self.build_ms, 1),
+        }
+
+    def _key_cells(self, level_count: int) -> tuple:
+        """Start and size of each run of cells sharing the first level_count index keys."""
+        codes = self.cells.index.codes
+        change = np.zeros(len(self.cells), dtype=bool)
+        if len(change):
+            change[0] = True
+        for level in range(level_count):
+            change[1:] |= codes[level][1:] != codes[level][:-1]
+        starts = np.flatnonzero(change)
+        return starts, np.diff(np.append(starts, len(self.cells)))
+
+    def day_items(self) -> pd.DataFrame:
+        """Quantity per (day, sku, itemname), stores summed, sorted; NaN SKUs / items left out."""
+        c = self.columns
+        starts, counts = self._key_cells(3)
+        index = self.cells.index
+        quantity = segment_sums(self.cells["quantity"].to_numpy(dtype=float), counts)
+        items = pd.DataFrame({
+            **{c[key]: index.get_level_values(c[key])[starts] for key in ("date", "sku", "item")},
+            "quantity": quantity,
+        })
+        return items[items[c["sku"]].notna().to_numpy() & items[c["item"]].notna().to_numpy()]
+
+    def pair_day_cells(self) -> tuple:
+        """
+        (indptr, days, values) CSR of pairs x calendar: quantity per pair per
+        day (stores summed), pair-major in pairs order, days ascending.
+        """
+        starts, counts = self._key_cells(3)
+        values = segment_sums(self.cells["quantity"].to_numpy(dtype=float), counts)
+        pair, day = self.cell_pair[starts], self.cell_day[starts]
+
+        order = np.lexsort((day, pair))
+        indptr = np.zeros(len(self.pairs) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair, minlength=len(self.pairs)), out=indptr[1:])
+        return indptr, day[order].astype(np.int32), values[order]
+
+    def product_revenue(self) -> pd.Series:
+        """Revenue per (sku, itemname) in groupby order; NaN SKUs / items left out."""
+        c = self.columns
+        if self.cell_revenue_source != self.revenue_source:
+            # Rollup revenue does not match the line items' (e.g. an empty
+            # line_revenue column next to unit_price): group the lines
+            self.groupbys += 1
+            return self.revenue.groupby([self.lines[c["sku"]], self.lines[c["item"]]], observed=True).sum()
+
+        order = np.argsort(self.cell_pair, kind="stable")
+        revenue = segment_sums(
+            self.cells["revenue"].to_numpy(dtype=float)[order],
+            np.bincount(self.cell_pair, minlength=len(self.pairs)),
+        )
+        products = pd.Series(revenue, index=self.pairs)
+        known = self.pairs.get_level_values(0).notna() & self.pairs.get_level_values(1).notna()
+        return products[known]
+
+
+def segment_sums(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Sum of each run of counts[i] consecutive values, NaN skipped,
+    compensated in order like a pandas groupby sum. Vectorized across runs;
+    loops once per position, so it is meant for short runs (stores per
+    SKU-day, days per product).
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    if len(values) == len(counts) and (counts == 1).all():
+        # One value per run (single-store data): 0 + value, NaN as 0
+        return np.where(np.isnan(values), 0.0, 0.0 + values)
+
+    starts = np.cumsum(counts) - counts
+    total = np.zeros(len(counts))
+    compensation = np.zeros(len(counts))
+    for position in range(int(counts.max(initial=0))):
+        runs = np.flatnonzero(counts > position)
+        value = values[starts[runs] + position]
+        known = ~np.isnan(value)
+        runs, value = runs[known], value[known]
+
+        adjusted = value - compensation[runs]
+        running = total[runs] + adjusted
+        step = running - total[runs] - adjusted
+        step[np.isnan(step)] = 0.0     # +/- inf values
+        compensation[runs] = step
+        total[runs] = running
+    return total
+
+
+def line_revenue(frame: pd.DataFrame, qty_col: str) -> tuple:
+    """
+    (revenue per row, source): line_revenue when any is known, else
+    quantity x unit_price, else zeros ("none").
+    """
+    if "line_revenue" in frame.columns and frame["line_revenue"].notna().any():
+        return pd.to_numeric(frame["line_revenue"], errors="coerce").fillna(0), "line_revenue"
+    if "unit_price" in frame.columns and frame["unit_price"].notna().any():
+        unit_price = pd.to_numeric(frame["unit_price"], errors="coerce").fillna(0)
+        return frame[qty_col].fillna(0) * unit_price, "unit_price_x_quantity"
+    return pd.Series(0.0, index=frame.index), "none"
+
+
+def _line_invoices(lines: pd.DataFrame, revenue: pd.Series, qty_col: str, date_col: str) -> Optional[pd.DataFrame]:
+    """Per-invoice revenue / units / first date of the line items; None without usable ids."""
+    if "invoice_id" not in lines.columns:
+        return None
+    # Strip / upper-case each distinct id once (lines repeat their invoice's id)
+    codes, uniques = pd.factorize(lines["invoice_id"].astype(str))
+    cleaned = pd.Series(uniques, dtype=object).str.strip().str.upper().replace(INVOICE_NULL_VALUES)
+    if not cleaned.notna().any():
+        return None
+    invoice_ids = pd.Series(cleaned.to_numpy(dtype=object)[codes], index=lines.index)
+
+    return (
+        pd.DataFrame({
+            "invoice_id_clean": invoice_ids,
+            "computed_revenue": revenue,
+            "quantity_clean": pd.to_numeric(lines[qty_col], errors="coerce").fillna(0),
+            "date": lines[date_col],
+        })
+        .dropna(subset=["invoice_id_clean"])
+        .groupby("invoice_id_clean", dropna=False)
+        .agg(
+            transaction_revenue=("computed_revenue", "sum"),
+            transaction_units=("quantity_clean", "sum"),
+            transaction_date=("date", "min"),
+        )
+        .reset_index()
+    )
+
+
+def _last_known(values: pd.Series, row_keys: np.ndarray, keys: pd.Index) -> dict:
+    """{key: last non-NaN value in row order}, NaN keys left out (groupby(...).last() without the groupby)."""
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    rows = np.flatnonzero(~np.isnan(numbers) & ~keys.isna()[row_keys])
+    if not len(rows):
+        return {}
+    reverse = rows[::-1]
+    found, last = np.unique(row_keys[reverse], return_index=True)
+    return dict(zip(keys.take(found), numbers[reverse[last]].tolist()))
+
+
+def build_sales_cube(df: pd.DataFrame, lines: Optional[pd.DataFrame] = None,
+                     invoice_summary: Optional[pd.DataFrame] = None, date_col: str = "date",
+                     qty_col: str = "quantity", sku_col: Optional[str] = "sku",
+                     item_col: Optional[str] = "itemname", store_col: Optional[str] = "store") -> SalesCube:
+    """
+    Aggregates of df (the daily rollup in the upload route). lines: the raw
+    line items of the same days for revenue / invoice metrics (default df).
+    invoice_summary: pre-aggregated invoices (streaming ingest), used when
+    lines carry no invoice ids. Key columns missing from df are skipped.
+    """
+    started = time.perf_counter()
+    if df[date_col].isna().any():
+        df = df[df[date_col].notna()]
+    lines = df if lines is None else lines
+    sku_col = sku_col if sku_col in df.columns else None
+    item_col = item_col if item_col in df.columns else None
+    store_col = store_col if store_col in df.columns else None
+    columns = {"date": date_col, "quantity": qty_col, "sku": sku_col, "item": item_col, "store": store_col}
+
+    day = df[date_col].dt.normalize()
+    cell_revenue, cell_revenue_source = line_revenue(df, qty_col)
+    measures = pd.DataFrame({
+        "quantity": df[qty_col],
+        "lines": df["line_count"] if "line_count" in df.columns else df[qty_col].notna().astype(np.int64),
+        "revenue": cell_revenue,
+    })
+
+    # The two groupbys of the analytics frame
+    daily = measures.groupby(day).sum()
+    grouped = measures.groupby(
+        [day] + [df[col] for col in (sku_col, item_col, store_col) if col],
+        dropna=False, observed=True,
+    )
+    cells = grouped.sum()
+    if not isinstance(cells.index, pd.MultiIndex):
+        cells.index = pd.MultiIndex.from_arrays([cells.index])
+
+    calendar = pd.date_range(daily.index.min(), daily.index.max(), freq="D") if len(daily) else pd.DatetimeIndex([])
+    cell_day = (
+        ((cells.index.get_level_values(0) - calendar[0]) // pd.Timedelta(days=1)).to_numpy().astype(np.int64)
+        if len(cells) else np.zeros(0, dtype=np.int64)
+    )
+
+    # (SKU, item) pairs: level codes follow the groupby order, NaN last
+    pairs, cell_pair, last_unit_price = None, None, None
+    if sku_col and item_col:
+        sku_codes, item_codes = cells.index.codes[1], cells.index.codes[2]
+        item_levels = len(cells.index.levels[2])
+        found, cell_pair = np.unique(sku_codes.astype(np.int64) * item_levels + item_codes, return_inverse=True)
+        pairs = pd.MultiIndex.from_arrays(
+            [cells.index.levels[1].take(found // item_levels), cells.index.levels[2].take(found % item_levels)],
+            names=[sku_col, item_col],
+        )
+        if "unit_price" in df.columns:
+            row_sku = np.asarray(sku_codes)[grouped.ngroup().to_numpy()]
+            last_unit_price = _last_known(df["unit_price"], row_sku, cells.index.levels[1])
+
+    revenue, revenue_source = (cell_revenue, cell_revenue_source) if lines is df else line_revenue(lines, qty_col)
+    groupbys = 2
+    invoices = _line_invoices(lines, revenue, qty_col, date_col)
+    if invoices is not None:
+        groupbys += 1
+    elif invoice_summary is not None and not invoice_summary.empty:
+        invoices = invoice_summary
+
+    cube = SalesCube(
+        df, lines, columns, daily, cells, calendar, cell_day, pairs, cell_pair,
+        revenue, revenue_source, cell_revenue_source, invoices, last_unit_price, groupbys,
+    )
+    cube.build_ms = (time.perf_counter() - started) * 1000
+    return cube
@@ -0,0 +1,508 @@
+import pandas as pd
+import numpy as np
+import logging
+import re
+from scipy.optimize import linear_sum_assignment
+
+from app.services.date_parsing_service import parse_dates_memoized
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# ✅ SCHEMA DETECTION + NORMALIZATION (shared by routes and ingestion)
+# ============================================================================
+
+def normalize_sku(sku):
+    return str(sku).strip().upper()
+
+
+def _parse_flexible_dates(series: pd.Series, preferred_format: str = None) -> pd.Series:
+    """
+    Common Indian/export formats first, dateutil (dayfirst) last.
+    Parsing is memoized per distinct string (see date_parsing_service).
+    """
+    parsed, _ = parse_dates_memoized(series, preferred_format)
+    return parsed
+
+def _map_unique(series: pd.Series, transform) -> pd.Series:
+    """
+    Apply a Series -> Series transform once per distinct value (NaN included)
+    and broadcast the result back through the factorized codes.
+
+    POS exports repeat a few thousand SKUs / item names / invoice ids across
+    millions of lines, so string cleanup runs on the uniques only.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    mapped = transform(pd.Series(uniques, dtype=object))
+    return pd.Series(mapped.to_numpy()[codes], index=series.index, name=series.name)
+
+def _coerce_numeric(series: pd.Series) -> pd.Series:
+    """
+    Strip thousands separators / rupee symbols and convert to numbers.
+    Columns the parser already typed as numeric are returned untouched.
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series
+
+    cleaned = (
+        series
+        .astype(str)
+        .str.replace(",", "", regex=False)
+        .str.replace("₹", "", regex=False)
+        .str.strip()
+    )
+    return pd.to_numeric(cleaned, errors="coerce")
+
+# ============================================================================
+# ✅ CSV COLUMN NORMALIZATION - Handles Different CSV Formats
+# ============================================================================
+
+def _clean_col_name(col: str) -> str:
+    return (
+        str(col)
+        .strip()
+        .lower()
+        .replace("\n", " ")
+        .replace("\r", " ")
+    )
+
+def _normalize_col_key(col: str) -> str:
+    return (
+        _clean_col_name(col)
+        .replace("%", " percent ")
+        .replace("&", " and ")
+        .replace("@", " at ")
+    )
+
+def _standardize_col_key(col: str) -> str:
+    return (
+        _normalize_col_key(col)
+        .strip()
+        .replace("/", "_")
+        .replace("-", "_")
+        .replace(".", "_")
+        .replace(" ", "_")
+    )
+
+def _char_ngrams(text: str, n: int = 2) -> frozenset:
+    padded = f" {text} "
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+def _ngram_similarity(a_grams: frozenset, b_grams: frozenset) -> float:
+    """Dice coefficient over character bigrams (0..1)."""
+    if not a_grams or not b_grams:
+        return 0.0
+    return 2 * len(a_grams & b_grams) / (len(a_grams) + len(b_grams))
+
+STANDARD_COLUMNS = [
+    "date", "sku", "itemname", "quantity",
+    "unit_price", "unit_cost", "line_revenue",
+    "current_stock", "store", "invoice_id"
+]
+
+COLUMN_DETECTION_RULES = {
+    "date": {
+        "aliases": ["date", "transaction_date", "sales_date", "sale_date", "bill_date", "invoice_date", "order_date", "created_on", "voucher_date", "doc_date"],
+        "positive": ["date", "dt", "created", "invoice", "bill", "order", "voucher", "transaction"],
+        "negative": ["amount", "qty", "quantity", "price", "rate", "stock", "sku", "code"],
+    },
+    "sku": {
+        "aliases": ["plu_code", "sku", "sku_code", "skucode", "product_id", "productid", "item_code", "itemcode", "product_code", "barcode", "ean", "plu", "hsn_code", "material_code", "article_code"],
+        "positive": ["sku", "code", "barcode", "ean", "plu", "hsn", "item_code", "product_code", "material_code", "article_code"],
+        "negative": ["name", "description", "desc", "date", "qty", "quantity", "amount", "price", "rate", "stock"],
+    },
+    "itemname": {
+        "aliases": ["sku_desc", "product", "product_name", "productname", "item", "item_name", "itemname", "description", "item_description", "particulars", "material_name", "article_name", "goods", "name", "sku_desc", "sku_description"],
+        "positive": ["item", "product", "name", "description", "desc", "material", "article", "goods", "particular"],
+        "negative": ["code", "id", "sku", "date", "qty", "quantity", "amount", "price", "rate", "stock"],
+    },
+    "quantity": {
+        "aliases": ["qty", "quantity", "qnty", "qty_sold", "sold_qty", "sale_qty", "sales_qty", "quantity_sold", "units", "units_sold", "pcs", "pieces", "nos", "count", "billed_qty", "net_qty"],
+        "positive": ["qty", "quantity", "qnty", "units", "sold", "pcs", "pieces", "nos", "count"],
+        "negative": ["price", "rate", "amount", "value", "date", "stock", "cost"],
+    },
+    "unit_price": {
+        "aliases": ["unit_price", "unitprice", "price", "selling_price", "sale_price", "sales_price", "mrp", "retail_price", "selling_rate", "rate", "price_per_unit", "net_rate"],
+        "positive": ["price", "rate", "mrp", "selling", "sale", "retail"],
+        "negative": ["cost", "purchase", "amount", "total", "qty", "quantity"],
+    },
+    "unit_cost": {
+        "aliases": ["cost_price", "unit_cost", "unitcost", "cost", "cost_price", "buying_price", "buy_price", "purchase_price", "purchase_rate", "landed_cost", "vendor_price", "supplier_price", "wholesale_price"],
+        "positive": ["cost", "purchase", "buy", "buying", "vendor", "supplier", "landed", "wholesale"],
+        "negative": ["sale", "selling", "mrp", "amount", "total", "revenue"],
+    },
+    "line_revenue": {
+        "aliases": [
+    "net_sales_amount",
+    "gross_sales_value",
+    "sales_amount",
+    "line_revenue",
+    "line_total",
+    "total_amount",
+    "final_amount",
+    "net_amount",
+    "gross_amount",
+    "invoice_amount",
+    "subtotal",
+    "taxable_value",
+    "net_value",
+    "amount",
+    "total",
+    "revenue",
+    "value"
+],
+        "positive": ["amount", "total", "value", "revenue", "subtotal", "net", "gross", "taxable"],
+        "negative": ["qty", "quantity", "stock", "cost_value", "gross_cost", "net_cost", "cost", "rate", "price"],
+    },
+    "current_stock": {
+        "aliases": ["current_stock", "stock", "stock_on_hand", "stockinhand", "on_hand", "inventory", "closing_stock", "available_stock", "qty_in_hand", "opening_stock", "balance_qty"],
+        "positive": ["stock", "inventory", "hand", "closing", "available", "balance"],
+        "negative": ["sold", "sales", "amount", "price", "date", "revenue"],
+    },
+    "store": {
+        "aliases": ["store", "store_name", "store_id", "location", "branch", "branch_name", "outlet", "shop", "warehouse", "godown"],
+        "positive": ["store", "branch", "location", "outlet", "shop", "warehouse", "godown"],
+        "negative": ["item", "qty", "amount", "price"],
+    },
+    "invoice_id": {
+        "aliases": ["invoice_no", "invoice_number", "invoice", "bill_no", "bill_number", "receipt_no", "transaction_id", "txn_id", "order_id", "voucher_no", "document_no"],
+        "positive": ["invoice", "bill", "receipt", "txn", "transaction", "order", "voucher", "document"],
+        "negative": ["date", "amount", "qty", "price", "rate"],
+    },
+}
+
+def _profile_column(series: pd.Series) -> dict:
+    sample = series.dropna().head(200)
+
+    if sample.empty:
+        return {
+            "valid_ratio": 0,
+            "numeric_ratio": 0,
+            "date_ratio": 0,
+            "text_avg_len": 0,
+            "unique_ratio": 0,
+            "positive_numeric_ratio": 0,
+        }
+
+    as_text = sample.astype(str).str.strip()
+    numeric = pd.to_numeric(
+        as_text.str.replace(",", "", regex=False).str.replace("₹", "", regex=False),
+        errors="coerce"
+    )
+
+    parsed_dates = _parse_flexible_dates(as_text)
+
+    return {
+        "valid_ratio": len(sample) / max(len(series), 1),
+        "numeric_ratio": float(numeric.notna().mean()),
+        "date_ratio": float(parsed_dates.notna().mean()),
+        "text_avg_len": float(as_text.str.len().mean()),
+        "unique_ratio": float(as_text.nunique() / max(len(as_text), 1)),
+        "positive_numeric_ratio": float((numeric > 0).mean()),
+        "median_numeric": float(numeric.median()) if numeric.notna().any() else None,
+    }
+
+
+# ----------------------------------------------------------------------------
+# Detection index, built once at import
+# ----------------------------------------------------------------------------
+
+# Required columns need stronger confidence
+TARGET_MIN_SCORES = {
+    target: 65 if target in ["date", "quantity"] else 45 if target in ["sku", "itemname"] else 40
+    for target in STANDARD_COLUMNS
+}
+
+_DETECTION_INDEX = {
+    target: {
+        "aliases": frozenset(rules["aliases"]),
+        "alias_tokens": [frozenset(alias.split("_")) for alias in rules["aliases"]],
+        "alias_ngrams": [_char_ngrams(alias) for alias in rules["aliases"]],
+        "positive": rules["positive"],
+        "negative": rules["negative"],
+    }
+    for target, rules in COLUMN_DETECTION_RULES.items()
+}
+
+# Value-profile scoring as a linear model: score += features @ weights.
+# Rows are profile features, columns follow STANDARD_COLUMNS.
+_PROFILE_FEATURES = [
+    "const", "date_ratio", "numeric_ratio", "positive_numeric_ratio",
+    "unique_ratio", "text_len_capped", "small_median", "short_text",
+]
+
+_PROFILE_WEIGHTS = pd.DataFrame(0.0, index=_PROFILE_FEATURES, columns=STANDARD_COLUMNS)
+_PROFILE_WEIGHTS.loc[["date_ratio", "numeric_ratio"], "date"] = [80, -10]
+_PROFILE_WEIGHTS.loc[["numeric_ratio", "positive_numeric_ratio", "small_median"], "quantity"] = [45, 25, 15]
+for _target in ["unit_price", "unit_cost", "line_revenue", "current_stock"]:
+    _PROFILE_WEIGHTS.loc[["numeric_ratio", "positive_numeric_ratio"], _target] = [40, 20]
+_PROFILE_WEIGHTS.loc[["unique_ratio", "short_text", "date_ratio"], "sku"] = [35, 10, -60]
+_PROFILE_WEIGHTS.loc[["const", "numeric_ratio", "text_len_capped", "date_ratio"], "itemname"] = [35, -35, 0.6, -60]
+_PROFILE_WEIGHTS = _PROFILE_WEIGHTS.to_numpy()
+
+
+def _name_score(key: str, target: str) -> float:
+    """Header-name evidence for one (standardized column key, target) pair."""
+    index = _DETECTION_INDEX[target]
+    tokens = set(key.split("_"))
+
+    score = 0.0
+
+    # 1) Exact alias match
+    if key in index["aliases"]:
+        score += 100
+
+    # 2) Token-level alias match
+    score += 35 * sum(1 for alias_tokens in index["alias_tokens"] if alias_tokens <= tokens)
+
+    # 3) Positive keyword match
+    score += 18 * sum(1 for word in index["positive"] if word in key)
+
+    # 4) Negative keyword penalty
+    score -= 35 * sum(1 for word in index["negative"] if word in key)
+
+    # 5) Fuzzy similarity
+    key_grams = _char_ngrams(key)
+    best_similarity = max(
+        (_ngram_similarity(key_grams, alias_grams) for alias_grams in index["alias_ngrams"]),
+        default=0,
+    )
+    score += best_similarity * 25
+
+    return score
+
+
+def _profile_features(profile: dict) -> list:
+    median = profile.get("median_numeric")
+    return [
+        1.0,
+        profile["date_ratio"],
+        profile["numeric_ratio"],
+        profile["positive_numeric_ratio"],
+        profile["unique_ratio"],
+        min(profile["text_avg_len"], 50),
+        1.0 if median is not None and median <= 500 else 0.0,
+        1.0 if profile["text_avg_len"] <= 40 else 0.0,
+    ]
+
+
+def _score_matrix(df: pd.DataFrame) -> np.ndarray:
+    """
+    columns x STANDARD_COLUMNS score matrix.
+    Each column is profiled exactly once; name scores use the prebuilt index.
+    """
+    profiles = np.array([_profile_features(_profile_column(df[col])) for col in df.columns])
+    value_scores = profiles @ _PROFILE_WEIGHTS
+
+    name_scores = np.array([
+        [_name_score(_standardize_col_key(col), target) for target in STANDARD_COLUMNS]
+        for col in df.columns
+    ])
+
+    return name_scores + value_scores
+
+
+def _detect_schema_columns(df: pd.DataFrame) -> tuple[dict, dict]:
+    """
+    Returns:
+    - mapping: original_cleaned_col -> standard_col
+    - confidence_report: standard_col -> detection details
+
+    Assignment is solved optimally (max total score, one target per column,
+    one column per target) over the pairs that clear TARGET_MIN_SCORES.
+    """
+    columns = list(df.columns)
+    if not columns:
+        return {}, {}
+
+    scores = _score_matrix(df)
+    min_scores = np.array([TARGET_MIN_SCORES[t] for t in STANDARD_COLUMNS])
+    eligible = scores >= min_scores
+
+    # Ineligible pairs get zero weight; every eligible score is >= 40, so the
+    # solver only picks them when nothing better is available (dropped below).
+    weights = np.where(eligible, scores, 0.0)
+    col_idx, target_idx = linear_sum_assignment(weights, maximize=True)
+
+    assigned = [
+        (columns[c], STANDARD_COLUMNS[t], float(scores[c, t]))
+        for c, t in zip(col_idx, target_idx)
+        if eligible[c, t]
+    ]
+    assigned.sort(key=lambda item: item[2], reverse=True)
+
+    mapping = {}
+    confidence_report = {}
+
+    for col, target, score in assigned:
+        mapping[col] = target
+        confidence_report[target] = {
+            "source_column": col,
+            "score": round(score, 2),
+        }
+
+    return mapping, confidence_report
+
+def _clean_raw_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Standardize header keys and drop unusable columns before detection.
+    """
+    original_to_clean = {
+        col: _standardize_col_key(col)
+        for col in df.columns
+    }
+
+    df = df.rename(columns=original_to_clean)
+
+    # Remove empty unnamed Excel columns early
+    df = df.loc[:, ~df.columns.astype(str).str.match(r"^unnamed")]
+    df = df.dropna(axis=1, how="all")
+
+    # Remove duplicate cleaned columns
+    return df.loc[:, ~df.columns.duplicated()].copy()
+
+def normalize_csv_columns(df: pd.DataFrame, schema: tuple = None) -> pd.DataFrame:
+    """
+    Robust backend-only schema normalization.
+
+    Converts messy user files into:
+    date, sku, itemname, quantity, unit_price, unit_cost,
+    line_revenue, current_stock, store, invoice_id.
+
+    schema: optional (schema_map, confidence_report) from an earlier call.
+    When given, detection is skipped (used by the streaming reader for
+    every chunk after the first). Parsers may also attach
+    df.attrs["parse_hints"] with a sniffed schema and date format.
+
+    Frontend response shape remains unchanged.
+    """
+
+    if df is None or df.empty:
+        raise ValueError("Uploaded file is empty")
+
+    parse_hints = df.attrs.get("parse_hints") or {}
+    log_detection = schema is None
+
+    if schema is None:
+        schema = parse_hints.get("schema")
+
+    if schema is not None:
+        schema_map, confidence_report = schema
+
+        df = df.rename(columns={col: _standardize_col_key(col) for col in df.columns})
+        df = df.loc[:, ~df.columns.astype(str).str.match(r"^unnamed")]
+        df = df.loc[:, ~df.columns.duplicated()]
+
+        # Same column set the detection path would keep
+        empty_cols = [c for c in df.columns if c not in schema_map and df[c].isna().all()]
+        df = df.drop(columns=empty_cols)
+
+        for col in schema_map:
+            if col not in df.columns:
+                df[col] = np.nan
+    else:
+        df = _clean_raw_columns(df)
+
+        if df.empty or len(df.columns) == 0:
+            raise ValueError("Uploaded file has no usable columns")
+
+        schema_map, confidence_report = _detect_schema_columns(df)
+
+    if not schema_map:
+        raise ValueError(
+            f"Could not detect usable columns. Available columns: {list(df.columns)}"
+        )
+
+    df = df.rename(columns=schema_map)
+    df = df.loc[:, ~df.columns.duplicated()].copy()
+
+    # Required detection
+    required = ["date", "quantity"]
+    missing_required = [c for c in required if c not in df.columns]
+
+    if missing_required:
+        raise ValueError(
+            f"Missing required columns after detection: {missing_required}. "
+            f"Detected: {confidence_report}. "
+            f"Available columns: {list(df.columns)}"
+        )
+
+    # Date parsing
+    df["date"], date_parse_report = parse_dates_memoized(df["date"], parse_hints.get("date_format"))
+    invalid_dates = int(df["date"].isna().sum())
+
+    if invalid_dates > 0:
+        logger.warning(f"⚠️ {invalid_dates} rows with invalid dates dropped")
+        df = df.dropna(subset=["date"])
+
+    if df.empty:
+        raise ValueError("No valid rows after date parsing")
+
+    # Quantity cleanup
+    df["quantity"] = _coerce_numeric(df["quantity"])
+    df = df.dropna(subset=["quantity"])
+    df = df[df["quantity"] > 0]
+
+    if df.empty:
+        raise ValueError("No valid sales rows found after quantity cleaning")
+
+    # Product name fallback
+    if "itemname" not in df.columns:
+        if "sku" in df.columns:
+            df["itemname"] = df["sku"].astype(str)
+        else:
+            df["itemname"] = "Unknown Item"
+
+    df["itemname"] = _map_unique(
+        df["itemname"],
+        lambda names: names.astype(str).str.strip().replace(
+            {"": "Unknown Item", "nan": "Unknown Item", "None": "Unknown Item"}
+        ),
+    )
+
+    # SKU fallback
+    if "sku" not in df.columns:
+        df["sku"] = df["itemname"].apply(
+            lambda x: re.sub(r"[^a-zA-Z0-9]", "", str(x)).upper()[:40]
+        )
+
+    df["sku"] = _map_unique(
+        df["sku"],
+        lambda skus: skus.map(normalize_sku).replace({"": np.nan, "NAN": np.nan, "NONE": np.nan}),
+    )
+    df = df.dropna(subset=["sku"])
+
+    if df.empty:
+        raise ValueError("No valid SKU/product rows found")
+
+    # Numeric optional fields
+    for col in ["unit_price", "unit_cost", "line_revenue", "current_stock"]:
+        if col in df.columns:
+            df[col] = _coerce_numeric(df[col])
+
+    # Revenue fallback
+    if "line_revenue" not in df.columns and "unit_price" in df.columns:
+        df["line_revenue"] = df["quantity"] * df["unit_price"].fillna(0)
+
+    # Store fallback
+    if "store" not in df.columns:
+        df["store"] = "Store A"
+
+    # Invoice cleanup
+    if "invoice_id" in df.columns:
+        df["invoice_id"] = _map_unique(
+            df["invoice_id"],
+            lambda ids: ids.astype(str).str.strip().str.upper(),
+        )
+
+    # Attach debug info without changing dataframe output structure
+    df.attrs["column_detection_report"] = confidence_report
+    df.attrs["column_schema_map"] = schema_map
+    df.attrs["date_parse_report"] = date_parse_report
+
+    if log_detection:
+        logger.info(f"✅ Column detection map: {schema_map}")
+        logger.info(f"✅ Column detection confidence: {confidence_report}")
+        logger.info(f"✅ Final normalized columns: {list(df.columns)}")
+
+    return df
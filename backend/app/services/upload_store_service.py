@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Optional
+
+import pandas as pd
+
+from app.services.compaction_service import frame_memory_mb
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# UPLOAD HANDOFF STORE - normalized frames kept between /preview and
+# /upload-and-process so the same file is not uploaded and parsed twice
+# ============================================================================
+
+UPLOAD_TTL_SECONDS = 15 * 60        # idle time before an upload_id expires
+UPLOAD_USER_QUOTA_MB = 512          # normalized frames held per user
+UPLOAD_STORE_QUOTA_MB = 4096        # all users, whole process
+
+
+class UploadStore:
+    """
+    In-process store of normalized upload frames keyed by upload_id.
+
+    - entries expire UPLOAD_TTL_SECONDS after their last use
+    - each user holds at most user_quota_mb; their oldest entries are
+      evicted first, and a frame larger than the quota is not stored
+    - frames are shared, callers must not modify them in place
+
+    The store lives in the worker process, so with several server workers
+    an upload_id may miss; callers then ask for the file again.
+    """
+
+    def __init__(self, ttl_seconds: int = UPLOAD_TTL_SECONDS,
+                 user_quota_mb: float = UPLOAD_USER_QUOTA_MB,
+                 total_quota_mb: float = UPLOAD_STORE_QUOTA_MB):
+        self.ttl_seconds = ttl_seconds
+        self.user_quota_mb = user_quota_mb
+        self.total_quota_mb = total_quota_mb
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, owner: str, df: pd.DataFrame, filename: str) -> Optional[str]:
+        """Store a normalized frame; returns its upload_id, or None if it does not fit."""
+        size_mb = frame_memory_mb(df)
+        if size_mb > self.user_quota_mb:
+            logger.warning(f"⚠️ Upload {filename} ({size_mb} MB) exceeds handoff quota, not stored")
+            return None
+
+        upload_id = uuid.uuid4().hex
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            self._evict(lambda e: e["owner"] == owner, self.user_quota_mb - size_mb)
+            self._evict(lambda e: True, self.total_quota_mb - size_mb)
+
+            self._entries[upload_id] = {
+                "owner": owner,
+                "df": df,
+                "filename": filename,
+                "size_mb": size_mb,
+                "last_used": now,
+            }
+
+        return upload_id
+
+    def get(self, upload_id: str, owner: str) -> Optional[dict]:
+        """Entry {df, filename, size_mb} for the owner, or None if unknown / expired."""
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(upload_id)
+            if entry is None or entry["owner"] != owner:
+                return None
+
+            entry["last_used"] = now
+            return {k: entry[k] for k in ("df", "filename", "size_mb")}
+
+    def discard(self, upload_id: str) -> None:
+        with self._lock:
+            self._entries.pop(upload_id, None)
+
+    def usage_mb(self, owner: str = None) -> float:
+        with self._lock:
+            return round(sum(
+                e["size_mb"] for e in self._entries.values()
+                if owner is None or e["owner"] == owner
+            ), 2)
+
+    def _expire(self, now: float) -> None:
+        expired = [
+            upload_id for upload_id, entry in self._entries.items()
+            if now - entry["last_used"] > self.ttl_seconds
+        ]
+        for upload_id in expired:
+            del self._entries[upload_id]
+
+    def _evict(self, matches, budget_mb: float) -> None:
+        """Drop least recently used matching entries until they fit budget_mb."""
+        candidates = sorted(
+            (e["last_used"], upload_id) for upload_id, e in self._entries.items() if matches(e)
+        )
+        used = sum(self._entries[upload_id]["size_mb"] for _, upload_id in candidates)
+
+        for _, upload_id in candidates:
+            if used <= budget_mb:
+                break
+            used -= self._entries.pop(upload_id)["size_mb"]
+
+
+upload_store = UploadStore()
@@ -0,0 +1,85 @@
+"""
+Benchmark: batched short-history / intermittent forecasts
+Run: python scripts/benchmark_batch_forecast.py [skus]
+
+Builds a synthetic catalog (default 10,000 SKUs over 180 days; a third
+short-history, the rest intermittent) and times the batch engine end to end:
+SKU x day demand and dense matrix, tier classification, Holt / Croston / SBA / TSB fits and
+forecast dict emission.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.batch_forecast_service import (
+    TIER_HOLT,
+    TIER_INTERMITTENT,
+    classify_demand,
+    demand_matrix,
+    forecast_intermittent,
+    forecast_short_history,
+)
+from app.services.demand_matrix_service import build_sku_day_demand
+
+
+def build_frame(skus: int, days: int = 180, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D")
+    frames = []
+
+    short = skus // 3
+    # short history: 5-14 selling days at the end of the range
+    for i in range(short):
+        n = int(rng.integers(6, 14))
+        frames.append((f"SKU{i:05d}", dates[-n:], rng.integers(1, 20, n)))
+    # intermittent: sells on ~20% of days
+    for i in range(short, skus):
+        sold = dates[rng.random(days) < 0.2]
+        frames.append((f"SKU{i:05d}", sold, rng.integers(1, 6, len(sold))))
+
+    return pd.DataFrame({
+        "sku": np.concatenate([np.repeat(sku, len(d)) for sku, d, _ in frames]),
+        "date": np.concatenate([d.values for _, d, _ in frames]),
+        "quantity": np.concatenate([q for _, _, q in frames]).astype(float),
+        "itemname": np.concatenate([np.repeat(f"ITEM {sku}", len(d)) for sku, d, _ in frames]),
+    })
+
+
+def main():
+    n_skus = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    df = build_frame(n_skus)
+    skus = sorted(df["sku"].unique())
+    names = [f"ITEM {sku}" for sku in skus]
+
+    timings = {}
+    start = time.perf_counter()
+    sku_days = build_sku_day_demand(df, "date", "quantity", "sku", "itemname")
+    matrix = demand_matrix(sku_days, [sku_days.row(sku) for sku in skus])
+    timings["demand matrix"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tiers = classify_demand(matrix)
+    timings["classify"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    short = forecast_short_history(matrix, np.flatnonzero(tiers == TIER_HOLT), names)
+    timings["holt + dicts"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sparse = forecast_intermittent(matrix, np.flatnonzero(tiers == TIER_INTERMITTENT), names)
+    timings["croston/sba/tsb + dicts"] = time.perf_counter() - start
+
+    print(f"\n{n_skus:,} SKUs, {len(df):,} rows -> {len(short):,} Holt + {len(sparse):,} intermittent forecasts")
+    for label, seconds in timings.items():
+        print(f"  {label:<24} {seconds * 1000:8.1f} ms")
+    print(f"  {'total':<24} {sum(timings.values()) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: downstream groupbys on the normalized frame, object vs compact
+Run: python scripts/benchmark_compact_groupby.py [rows]
+
+Builds a synthetic normalized POS frame (default 2,000,000 line items) and
+times the groupby shapes /upload-and-process runs after normalization, first
+on object-string identifiers, then on compact_sales_frame output
+(categorical identifiers, int32 quantities, float32 prices).
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.compaction_service import compact_sales_frame, frame_memory_mb
+
+
+def build_frame(rows: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=180, freq="D")
+    sku_ids = rng.integers(0, 5_000, rows)
+    qty = rng.integers(1, 12, rows).astype(float)
+    price = np.round(rng.uniform(10, 900, 5_000), 2)[sku_ids]
+
+    return pd.DataFrame({
+        "invoice_id": pd.Series(rng.integers(100_000, 700_000, rows)).astype(str).to_numpy(),
+        "date": dates[rng.integers(0, len(dates), rows)],
+        "itemname": np.array([f"PRODUCT {i}" for i in range(5_000)], dtype=object)[sku_ids],
+        "sku": np.array([f"SKU{i:05d}" for i in range(5_000)], dtype=object)[sku_ids],
+        "quantity": qty,
+        "unit_price": price,
+        "line_revenue": np.round(qty * price, 2),
+        "store": rng.choice(np.array(["AMEERPET", "KUKATPALLY", "GACHIBOWLI"], dtype=object), rows),
+    })
+
+
+# Same groupby shapes as the upload pipeline (observed=True throughout)
+WORKLOADS = {
+    "grouped product map (sku)": lambda df: {
+        k: len(g) for k, g in df.groupby("sku", sort=False, observed=True)
+    },
+    "historical top items": lambda df: df.groupby(
+        ["sku", "itemname"], observed=True
+    )["quantity"].sum(),
+    "inventory daily sku sales": lambda df: df.groupby(
+        ["date", "sku", "itemname"], dropna=False, observed=True
+    )["quantity"].sum(),
+    "historical_raw rows": lambda df: df.groupby(
+        ["date", "sku", "itemname", "store"], dropna=False, observed=True
+    )["quantity"].sum(),
+    "top products revenue": lambda df: df.groupby(
+        ["sku", "itemname"], observed=True
+    )["line_revenue"].sum(),
+    "invoice summary": lambda df: df.groupby(
+        "invoice_id", observed=True
+    ).agg(revenue=("line_revenue", "sum"), units=("quantity", "sum")),
+    "sku nunique": lambda df: df["sku"].nunique(),
+}
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+
+    df = build_frame(rows)
+    start = time.perf_counter()
+    compact_df, report = compact_sales_frame(df)
+    compact_t = time.perf_counter() - start
+
+    print(f"\n{rows:,} rows")
+    print(f"  memory: {frame_memory_mb(df):.1f} MB -> {report['memory_after_mb']:.1f} MB "
+          f"({report['reduction_pct']}% smaller, conversion {compact_t:.2f}s)")
+    print(f"  converted: {report['converted_columns']}\n")
+    print(f"  {'workload':<28} {'object':>8} {'compact':>8} {'speedup':>8}")
+
+    total_base = total_fast = 0.0
+    for label, fn in WORKLOADS.items():
+        base_t = timed(lambda: fn(df))
+        fast_t = timed(lambda: fn(compact_df))
+        total_base += base_t
+        total_fast += fast_t
+        print(f"  {label:<28} {base_t:7.2f}s {fast_t:7.2f}s {base_t / fast_t:7.1f}x")
+
+    print(f"  {'total':<28} {total_base:7.2f}s {total_fast:7.2f}s {total_base / total_fast:7.1f}x")
+    print(f"  total incl. conversion: {total_base / (total_fast + compact_t):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: PROPHET_ESCALATION_ERROR holdout accuracy vs Prophet time
+Run: python scripts/benchmark_escalation_threshold.py [sales.csv] [horizon]
+
+Holds out the last `horizon` days (default 15) of a sales CSV (default:
+synthetic daily histories, 12 SKUs x 150 days, trend + weekly pattern +
+Poisson noise), runs the cheap-model tournament and a full-profile Prophet
+fit on every regular SKU of the training part, and reports per threshold how
+many SKUs stay on the cheap model, the Prophet time left (fit + predict,
+plus the backtest fit escalated SKUs get for their accuracy when the
+threshold is above 0) and the holdout MAE (units per SKU-day) of the mix.
+"""
+
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.batch_forecast_service import (
+    REGULAR_CANDIDATES,
+    TIER_PROPHET,
+    classify_demand,
+    demand_matrix,
+    select_models,
+)
+from app.services.demand_matrix_service import build_sku_day_demand, ranked_rows
+from app.services.forecasting_service import _fit_predict_prophet
+from app.services.schema_service import normalize_csv_columns
+
+logging.disable(logging.WARNING)
+
+THRESHOLDS = (0.0, 0.2, 0.4, 0.5, 0.6, 0.65, 0.7, 0.8, 1.0)
+
+
+def build_frame(skus: int = 12, days: int = 150, seed: int = 5) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-03-01", periods=days, freq="D")
+    frames = []
+    for i in range(skus):
+        base = rng.uniform(5, 80)
+        trend = rng.uniform(-0.2, 0.4) * base / 50
+        weekly = np.array([1, 1, 1, 1, 1.2, 1.6, 1.4]) ** (rng.uniform(0, 0.6) * 3)
+        mean = np.maximum(base + trend * np.arange(days), 1) * weekly[dates.dayofweek]
+        frames.append(pd.DataFrame({
+            "date": dates, "sku": f"SKU{i:03d}", "itemname": f"PRODUCT {i}",
+            "quantity": rng.poisson(mean).astype(float),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def holdout_errors(df: pd.DataFrame, horizon: int) -> tuple:
+    """Per regular SKU: best cheap WAPE, cheap MAE, Prophet MAE, Prophet ms, backtest ms."""
+    cutoff = df["date"].max().normalize() - pd.Timedelta(days=horizon - 1)
+    train = build_sku_day_demand(df[df["date"] < cutoff], "date", "quantity", "sku", "itemname")
+    full = build_sku_day_demand(df, "date", "quantity", "sku", "itemname")
+
+    matrix = demand_matrix(train, ranked_rows(train))
+    regular = np.flatnonzero(classify_demand(matrix) == TIER_PROPHET)
+    full_rows = {sku: row for row, sku in enumerate(full.skus)}
+    actual = demand_matrix(full, [full_rows[matrix.skus[row]] for row in regular])
+    shift = int((train.start_date - full.start_date) // np.timedelta64(1, "D"))
+
+    series, lengths = matrix.window_series(regular)
+    selection = select_models(series, lengths, horizon, REGULAR_CANDIDATES)
+
+    cheap_mae, prophet_mae, prophet_ms, backtest_ms = [], [], [], []
+    for i, row in enumerate(regular.tolist()):
+        start = matrix.last_day[row] + 1 + shift
+        held_out = np.zeros(horizon)
+        observed = actual.values[i, start:start + horizon]
+        held_out[:len(observed)] = observed
+
+        forecast, timings, _ = _fit_predict_prophet(matrix.daily_series(row), horizon, 0.75, "full", backtest=True)
+        cheap_mae.append(np.abs(selection["forecast"][i] - held_out).mean())
+        prophet_mae.append(np.abs(np.maximum(forecast["yhat"].to_numpy(), 0) - held_out).mean())
+        prophet_ms.append(timings["fit_ms"] + timings["predict_ms"])
+        backtest_ms.append(timings["backtest_ms"])
+
+    return (selection["error"], np.array(cheap_mae), np.array(prophet_mae),
+            np.array(prophet_ms), np.array(backtest_ms))
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else None
+    horizon = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+    df = normalize_csv_columns(pd.read_csv(source)) if source else build_frame()
+    df["date"] = pd.to_datetime(df["date"])
+    error, cheap_mae, prophet_mae, prophet_ms, backtest_ms = holdout_errors(df, horizon)
+
+    print(f"\n  {source or 'synthetic'}: {len(error)} regular SKUs, last {horizon} days held out")
+    print(f"  best cheap WAPE quantiles (0/25/50/75/100%): {np.round(np.nanquantile(error, [0, .25, .5, .75, 1]), 2)}")
+    print(f"\n  {'threshold':>9} {'cheap':>7} {'prophet':>8} {'prophet ms':>11} {'holdout MAE':>12}")
+    for threshold in THRESHOLDS:
+        escalate = ~(error <= threshold)
+        mae = np.where(escalate, prophet_mae, cheap_mae).mean()
+        spent = prophet_ms[escalate].sum() + (backtest_ms[escalate].sum() if threshold > 0 else 0)
+        print(f"  {threshold:9.2f} {int((~escalate).sum()):7} {int(escalate.sum()):8} "
+              f"{spent:11.0f} {mae:12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: single-pass historical summary
+Run: python scripts/benchmark_historical_summary.py [max_rows]
+
+Builds synthetic normalized POS frames of doubling size (up to 4,000,000
+line items by default, 180 days, 5,000 SKUs) and times building the
+request's SalesCube plus history_service.historical_summary on each (the
+summary alone reads the cube's per-day and per-cell aggregates, so the cube
+build is where the rows are scanned). Time per row should stay flat
+as rows double (linear scaling); the 365-day run shows the cost does not
+grow with the number of days.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.history_service import historical_summary
+from app.services.sales_cube_service import build_sales_cube
+
+
+def build_frame(rows: int, days: int = 180, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D")
+    sku_ids = rng.integers(0, 5_000, rows)
+
+    return pd.DataFrame({
+        "date": dates[rng.integers(0, days, rows)],
+        "itemname": np.array([f"PRODUCT {i}" for i in range(5_000)], dtype=object)[sku_ids],
+        "sku": np.array([f"SKU{i:05d}" for i in range(5_000)], dtype=object)[sku_ids],
+        "quantity": rng.integers(1, 12, rows).astype(float),
+    })
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 4_000_000
+
+    print(f"\n  {'rows':>10} {'days':>5} {'seconds':>8} {'ns/row':>7}")
+    rows = 250_000
+    runs = []
+    while rows <= max_rows:
+        runs.append((rows, 180))
+        rows *= 2
+    runs.append((runs[-1][0], 365))
+
+    for rows, days in runs:
+        df = build_frame(rows, days)
+        seconds = timed(lambda: historical_summary(build_sales_cube(df)))
+        print(f"  {rows:>10,} {days:>5} {seconds:8.3f} {seconds / rows * 1e9:7.0f}")
+
+
+if __name__ == "__main__":
+    main()
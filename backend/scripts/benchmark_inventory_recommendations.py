@@ -0,0 +1,111 @@
+"""
+Benchmark: columnar inventory recommendation kernel
+Run: python scripts/benchmark_inventory_recommendations.py [skus]
+
+Builds a synthetic product_stats frame (default 50,000 SKUs, the columns
+generate_inventory_real_from_file passes on) plus 30-day forecasts for 80%
+of the SKUs, price / cost / stock / lead-time dicts for part of the
+catalog, and times inventory_service.forecast_aggregates (parsing the
+forecast dicts), recommendation_arrays (the NumPy kernel) and
+inventory_recommendations (kernel + serialization to response dicts).
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.inventory_service import forecast_aggregates, inventory_recommendations, recommendation_arrays
+
+
+def build_frame(skus: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    daily_avg = rng.gamma(1.5, 4.0, skus)
+    std_daily = daily_avg * rng.uniform(0.2, 1.5, skus)
+    cv = std_daily / daily_avg
+    demand_percentile = pd.Series(daily_avg).rank(pct=True).to_numpy() * 100
+    volatility_percentile = pd.Series(cv).rank(pct=True).to_numpy() * 100
+    combined = (demand_percentile + (100 - volatility_percentile)) / 2
+
+    return pd.DataFrame({
+        "sku": [f"SKU{i:05d}" for i in range(skus)],
+        "itemname": [f"PRODUCT {i}" for i in range(skus)],
+        "daily_avg": daily_avg,
+        "std_daily": std_daily,
+        "cv": cv,
+        "demand_percentile": demand_percentile,
+        "volatility_percentile": volatility_percentile,
+        "combined_risk_percentile": combined,
+        "demand_class": np.select([demand_percentile >= 75, demand_percentile >= 50], ["FAST", "MEDIUM"], "SLOW"),
+        "volatility_class": np.select([volatility_percentile <= 25, volatility_percentile <= 75], ["STABLE", "VARIABLE"], "HIGH-RISK"),
+        "priority_category": np.select([combined >= 75, combined >= 60, combined >= 25], ["CRITICAL", "HIGH", "MEDIUM"], "LOW"),
+        "csv_unit_price": np.round(rng.uniform(10, 900, skus), 2),
+        "total_qty": np.round(daily_avg * 180),
+        "transaction_count": rng.integers(1, 180, skus),
+        "days_span": 180,
+    })
+
+
+def build_forecasts(skus: int, days: int = 30, seed: int = 7) -> list:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-07-01", periods=days, freq="D").strftime("%Y-%m-%d").tolist()
+    forecasts = []
+    for i in range(skus):
+        if i % 5 == 4:
+            continue
+        predicted = rng.gamma(1.5, 4.0, days)
+        spread = rng.uniform(0.5, 6.0, days)
+        forecasts.append({
+            "sku": f"SKU{i:05d}",
+            "forecast": [
+                {"date": date, "predicted_units": p, "lower_ci": max(0.0, p - s), "upper_ci": p + s}
+                for date, p, s in zip(dates, predicted.tolist(), spread.tolist())
+            ],
+        })
+    return forecasts
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    skus = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+
+    product_stats = build_frame(skus)
+    forecasts = build_forecasts(skus)
+    rng = np.random.default_rng(11)
+    sku_list = product_stats["sku"].tolist()
+    dicts = {
+        "unit_cost_dict": {sku: float(rng.uniform(5, 600)) for sku in sku_list[::2]},
+        "unit_price_dict": {sku: float(rng.uniform(10, 900)) for sku in sku_list[::3]},
+        "current_stock_dict": {sku: int(rng.integers(0, 300)) for sku in sku_list[::2]},
+        "lead_time_dict": {sku: int(rng.integers(1, 15)) for sku in sku_list[::4]},
+    }
+    lead_times = np.full(skus, 3)
+
+    print(f"\n  {skus:,} SKUs, {len(forecasts):,} forecasts\n")
+    runs = [
+        ("forecast aggregates", lambda: forecast_aggregates(forecasts, sku_list, lead_times)),
+        ("kernel, no forecasts", lambda: recommendation_arrays(product_stats, **dicts)),
+        ("kernel + forecasts", lambda: recommendation_arrays(product_stats, forecasts, **dicts)),
+        ("dicts, no forecasts", lambda: inventory_recommendations(product_stats, **dicts)),
+        ("dicts + forecasts", lambda: inventory_recommendations(product_stats, forecasts, **dicts)),
+    ]
+    for name, fn in runs:
+        seconds = timed(fn)
+        print(f"  {name:<22} {seconds * 1000:8.1f} ms {seconds / skus * 1e6:6.2f} us/SKU")
+
+
+if __name__ == "__main__":
+    main()
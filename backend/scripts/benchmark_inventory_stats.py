@@ -0,0 +1,116 @@
+"""
+Benchmark: per-product daily demand stats for the inventory recommendations
+Run: python scripts/benchmark_inventory_stats.py [skus] [days]
+
+Builds a sparse synthetic POS frame (default 20,000 SKUs x 180 days, each
+SKU selling on ~10% of days) and computes the zero-filled daily stats of
+generate_inventory_real_from_file two ways: the SKU x calendar cross join
+with a groupby (previous implementation) and the sparse CSR path
+(csr_cells + daily_stats). Reports time, peak traced memory and whether the
+results are identical.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.demand_matrix_service import csr_cells, daily_stats
+
+
+def build_frame(skus: int, days: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D")
+    rows = skus * days // 10
+    sku_ids = rng.integers(0, skus, rows)
+
+    return pd.DataFrame({
+        "date": dates[rng.integers(0, days, rows)],
+        "sku": np.array([f"SKU{i:05d}" for i in range(skus)], dtype=object)[sku_ids],
+        "itemname": np.array([f"PRODUCT {i}" for i in range(skus)], dtype=object)[sku_ids],
+        "quantity": np.round(rng.gamma(2.0, 3.0, rows), 2),
+    })
+
+
+def cross_join_stats(df: pd.DataFrame) -> pd.DataFrame:
+    daily = (
+        df.groupby(["date", "sku", "itemname"], dropna=False, observed=True)["quantity"]
+        .sum().reset_index().rename(columns={"quantity": "daily_units"})
+    )
+    pairs = df[["sku", "itemname"]].drop_duplicates().copy()
+    pairs["_tmp_key"] = 1
+    calendar = pd.DataFrame({"date": pd.date_range(df["date"].min(), df["date"].max(), freq="D")})
+    calendar["_tmp_key"] = 1
+
+    full = (
+        pairs.merge(calendar, on="_tmp_key").drop(columns="_tmp_key")
+        .merge(daily, on=["date", "sku", "itemname"], how="left")
+    )
+    full["daily_units"] = full["daily_units"].fillna(0.0)
+    return full.groupby(["sku", "itemname"], dropna=False, observed=True).agg(
+        total=("daily_units", "sum"),
+        mean=("daily_units", "mean"),
+        std=("daily_units", "std"),
+        min=("daily_units", "min"),
+        max=("daily_units", "max"),
+        days_with_sales=("daily_units", lambda s: int((s > 0).sum())),
+    )
+
+
+def sparse_stats(df: pd.DataFrame) -> pd.DataFrame:
+    start = df["date"].min()
+    n_days = len(pd.date_range(start, df["date"].max(), freq="D"))
+    groups = df.groupby(["sku", "itemname"], dropna=False, observed=True)
+    index = groups.size().index
+
+    offset = (df["date"] - start).to_numpy()
+    indptr, days, values = csr_cells(
+        groups.ngroup().to_numpy(), (offset // np.timedelta64(1, "D")).astype(np.int64),
+        df["quantity"].to_numpy(dtype=float), len(index), n_days, compensated=True,
+    )
+    return pd.DataFrame(daily_stats(indptr, days, values, n_days), index=index)
+
+
+def timed(fn, repeat: int = 3) -> tuple:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak / 1024 / 1024
+
+
+def main():
+    skus = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+
+    df = build_frame(skus, days)
+    print(f"\n  {len(df):,} rows, {skus:,} SKUs x {days} days "
+          f"({skus * days:,} calendar cells)")
+
+    print(f"\n  {'path':<12} {'seconds':>8} {'peak MB':>8}")
+    dense, dense_s, dense_mb = timed(lambda: cross_join_stats(df))
+    print(f"  {'cross join':<12} {dense_s:8.3f} {dense_mb:8.1f}")
+    sparse, sparse_s, sparse_mb = timed(lambda: sparse_stats(df))
+    print(f"  {'sparse':<12} {sparse_s:8.3f} {sparse_mb:8.1f}")
+
+    identical = all(
+        np.array_equal(dense[col].to_numpy(dtype=float), sparse[col].to_numpy(dtype=float), equal_nan=True)
+        for col in dense.columns
+    )
+    print(f"\n  identical: {identical}")
+
+
+if __name__ == "__main__":
+    main()
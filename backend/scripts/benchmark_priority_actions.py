@@ -0,0 +1,89 @@
+"""
+Benchmark: priority action rule engine
+Run: python scripts/benchmark_priority_actions.py [skus] [visible]
+
+Builds a synthetic inventory recommendation list (default 50,000 SKUs, half
+of them with current stock) and times action_service.priority_actions for
+the whole inventory and for a plan that shows only the first `visible`
+SKUs (default 500), where only the returned rows are formatted.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.action_service import ACTION_RULES, PRIORITY_ORDER, priority_actions
+
+
+def build_inventory(skus: int, seed: int = 7) -> list:
+    rng = np.random.default_rng(seed)
+    daily_avg = np.round(rng.gamma(1.5, 4.0, skus), 2)
+    recommended = np.round(daily_avg * rng.uniform(10, 20, skus), 1)
+    stock = rng.integers(0, 300, skus)
+    unit_cost = np.round(rng.uniform(5, 600, skus), 2)
+    unit_price = np.round(unit_cost * rng.uniform(1.05, 1.8, skus), 2)
+
+    inventory = []
+    for i in range(skus):
+        has_stock = i % 2 == 0
+        inventory.append({
+            "sku": f"SKU{i:05d}",
+            "item_name": f"PRODUCT {i}",
+            "has_current_stock": has_stock,
+            "current_stock": int(stock[i]) if has_stock else None,
+            "recommended_stock_7_days": round(float(recommended[i]) / 2, 1),
+            "recommended_stock_15_days": float(recommended[i]),
+            "safety_stock": round(float(daily_avg[i]) * 2, 1),
+            "lead_time_days": 3,
+            "daily_sales_avg": float(daily_avg[i]),
+            "daily_sales_std": round(float(daily_avg[i]) * 0.6, 2),
+            "unit_cost": float(unit_cost[i]),
+            "unit_price": float(unit_price[i]),
+            "investment_required": round(float(recommended[i] * unit_cost[i]), 2),
+            "expected_revenue": round(float(recommended[i] * unit_price[i]), 2),
+            "expected_profit": round(float(recommended[i] * (unit_price[i] - unit_cost[i])), 2),
+            "roi_percent": round(float((unit_price[i] - unit_cost[i]) / unit_cost[i] * 100), 1),
+            "demand_classification": "MEDIUM",
+            "volatility_classification": "STABLE",
+        })
+    return inventory
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    skus = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    visible = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    inventory = build_inventory(skus)
+    visible_skus = set(item["sku"] for item in inventory[:visible])
+
+    actions = priority_actions(inventory)
+    priorities = {priority: 0 for priority in PRIORITY_ORDER}
+    for action in actions:
+        priorities[action["priority"]] += 1
+    print(f"\n  {skus:,} SKUs, {len(ACTION_RULES)} rules, actions per priority: {priorities}\n")
+
+    runs = [
+        ("all SKUs", lambda: priority_actions(inventory)),
+        (f"{visible:,} visible SKUs", lambda: priority_actions(inventory, skus=visible_skus)),
+    ]
+    for name, fn in runs:
+        seconds = timed(fn)
+        print(f"  {name:<20} {seconds * 1000:8.1f} ms {seconds / skus * 1e6:6.2f} us/SKU")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: per-SKU Prophet fit + predict, full vs fast profile
+Run: python scripts/benchmark_prophet_profiles.py [skus]
+
+Builds synthetic daily SKU histories (default 20 SKUs x 180 days, weekly
+pattern + trend + Poisson noise) and times the Prophet path of
+forecast_product under each PROPHET_PROFILES entry. Also reports how many
+forecast cells (prediction / CI) differ between profiles after clamping.
+"""
+
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.forecasting_service import PROPHET_PROFILES, _fit_predict_prophet, forecast_product
+
+logging.disable(logging.WARNING)
+
+
+def build_series(skus: int, days: int = 180, seed: int = 7) -> list:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D")
+    weekly = 1 + 0.35 * np.sin(np.arange(days) * 2 * np.pi / 7)
+    series = []
+    for _ in range(skus):
+        base = rng.uniform(5, 80)
+        trend = 1 + rng.uniform(-0.3, 0.3) * np.arange(days) / days
+        series.append(pd.DataFrame({"ds": dates, "y": rng.poisson(base * weekly * trend).astype(float)}))
+    return series
+
+
+def main():
+    n_skus = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    series = build_series(n_skus)
+
+    print(f"\n{n_skus} SKUs x {len(series[0])} days, horizon 15")
+    print(f"  {'profile':<8} {'fit ms':>9} {'predict ms':>11} {'total ms':>9}   (median per SKU)")
+
+    outputs = {}
+    for profile in PROPHET_PROFILES:
+        fit_ms, predict_ms = [], []
+        for daily in series:
+            _, timings, _ = _fit_predict_prophet(daily, 15, 0.75, profile)
+            fit_ms.append(timings["fit_ms"])
+            predict_ms.append(timings["predict_ms"])
+        fit, predict = np.median(fit_ms), np.median(predict_ms)
+        print(f"  {profile:<8} {fit:9.1f} {predict:11.1f} {fit + predict:9.1f}")
+
+        start = time.perf_counter()
+        outputs[profile] = [
+            forecast_product({"sku": f"SKU{i}", "itemname": f"ITEM {i}"}, daily, "sku", "itemname", None, None, 15, profile)
+            for i, daily in enumerate(series)
+        ]
+        print(f"  {'':<8} forecast_product end to end: {(time.perf_counter() - start) / n_skus * 1000:.1f} ms per SKU")
+
+    cells = changed = 0
+    for full, fast in zip(outputs["full"], outputs["fast"]):
+        for a, b in zip(full["forecast"], fast["forecast"]):
+            for key in ("predicted_units", "lower_ci", "upper_ci"):
+                cells += 1
+                changed += a[key] != b[key]
+    print(f"\n  forecast cells differing full vs fast: {changed} / {cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: shared per-request SalesCube
+Run: python scripts/benchmark_sales_cube.py [lines]
+
+Builds synthetic normalized line items (default 1,000,000 lines, 2,000
+SKUs, 3 stores, 180 days, invoice ids and unit prices), rolls them up like
+the full-ingest route and computes the analytics aggregates two ways: each
+stage grouping the frame on its own (previous implementation: daily
+summary, history, raw history, inventory cells and unit prices, invoice
+metrics and product revenue on frame copies) and one build_sales_cube read
+by every stage. Reports time and the number of pandas groupby / copy calls.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.demand_matrix_service import csr_cells, daily_stats
+from app.services.history_service import historical_raw, historical_summary
+from app.services.ingestion_service import rollup_sales_frame
+from app.services.sales_cube_service import build_sales_cube
+
+
+def build_frame(lines: int, skus: int = 2_000, days: int = 180, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D")
+    sku_ids = rng.integers(0, skus, lines)
+    quantity = rng.integers(1, 6, lines).astype(float)
+    unit_price = np.round(rng.uniform(10, 900, skus), 2)[sku_ids]
+
+    return pd.DataFrame({
+        "date": dates[rng.integers(0, days, lines)] + pd.to_timedelta(rng.integers(8, 20, lines), unit="h"),
+        "sku": np.array([f"SKU{i:05d}" for i in range(skus)], dtype=object)[sku_ids],
+        "itemname": np.array([f"PRODUCT {i}" for i in range(skus)], dtype=object)[sku_ids],
+        "quantity": quantity,
+        "store": np.array(["Store A", "Store B", "Store C"], dtype=object)[rng.integers(0, 3, lines)],
+        "unit_price": unit_price,
+        "line_revenue": quantity * unit_price,
+        "invoice_id": np.char.add("INV", (np.arange(lines) // 4).astype(str)).astype(object),
+    })
+
+
+class PandasCalls:
+    """Counts DataFrame / Series groupby and copy calls inside the block."""
+
+    METHODS = ("groupby", "copy")
+
+    def __enter__(self):
+        self.counts = dict.fromkeys(self.METHODS, 0)
+        self._saved = []
+        for cls in (pd.DataFrame, pd.Series):
+            for name in self.METHODS:
+                original = getattr(cls, name)
+                self._saved.append((cls, name, original))
+                setattr(cls, name, self._counting(name, original))
+        return self
+
+    def _counting(self, name, original):
+        def method(obj, *args, **kwargs):
+            self.counts[name] += 1
+            return original(obj, *args, **kwargs)
+        return method
+
+    def __exit__(self, *exc):
+        for cls, name, original in self._saved:
+            setattr(cls, name, original)
+
+
+def per_stage(df: pd.DataFrame, lines: pd.DataFrame) -> None:
+    # Request summary
+    df.groupby(df["date"].dt.date)["quantity"].sum()
+
+    # History: daily totals, top items, raw rows
+    day = df["date"].dt.normalize().rename("date")
+    df.groupby(day).agg(total_qty=("quantity", "sum"), transaction_count=("line_count", "sum"))
+    items = df.groupby([day, df["sku"], df["itemname"]], observed=True)["quantity"].sum().reset_index()
+    items.groupby("date", sort=False).cumcount()
+    df.groupby(["date", "sku", "itemname", "store"], dropna=False, observed=True)["quantity"].sum().reset_index()
+
+    # Inventory: pair x day cells and last unit price
+    calendar_start = df["date"].min()
+    n_days = len(pd.date_range(calendar_start, df["date"].max(), freq="D"))
+    pair_groups = df.groupby(["sku", "itemname"], dropna=False, observed=True)
+    pair_index = pair_groups.size().index
+    offset = (df["date"] - calendar_start).to_numpy() // np.timedelta64(1, "D")
+    daily_stats(*csr_cells(
+        pair_groups.ngroup().to_numpy(), offset.astype(np.int64), df["quantity"].to_numpy(dtype=float),
+        len(pair_index), n_days, compensated=True,
+    ), n_days)
+    pd.to_numeric(df["unit_price"], errors="coerce").groupby(df["sku"], observed=True).last()
+
+    # Business metrics: invoices and product revenue on copies of the lines
+    temp_txn = lines.copy()
+    temp_txn["computed_revenue"] = lines["line_revenue"]
+    temp_txn["invoice_id_clean"] = temp_txn["invoice_id"].astype(str).str.strip().str.upper()
+    temp_txn.groupby("invoice_id_clean").agg(
+        transaction_revenue=("computed_revenue", "sum"), transaction_date=("date", "min"),
+    )
+    temp_df = lines.copy()
+    temp_df["computed_revenue"] = lines["line_revenue"]
+    temp_df.groupby(["sku", "itemname"], observed=True)["computed_revenue"].sum()
+
+
+def shared_cube(df: pd.DataFrame, lines: pd.DataFrame) -> None:
+    cube = build_sales_cube(df, lines=lines)
+    historical_summary(cube)
+    historical_raw(cube)
+    daily_stats(*cube.pair_day_cells(), cube.n_days)
+    cube.product_revenue()
+
+
+def timed(fn, repeat: int = 3) -> tuple:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    with PandasCalls() as calls:
+        fn()
+    return best, calls.counts
+
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    lines = build_frame(line_count)
+    df = rollup_sales_frame(lines)
+    print(f"\n  {len(lines):,} line items -> {len(df):,} rollup rows")
+
+    print(f"\n  {'path':<12} {'seconds':>8} {'groupby':>8} {'copy':>6}")
+    for name, fn in (("per stage", per_stage), ("shared cube", shared_cube)):
+        seconds, counts = timed(lambda: fn(df, lines))
+        print(f"  {name:<12} {seconds:8.3f} {counts['groupby']:8} {counts['copy']:6}")
+
+
+if __name__ == "__main__":
+    main()